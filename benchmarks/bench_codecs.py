@@ -0,0 +1,46 @@
+"""Microbenchmark: serialization CPU and payload size per wire codec.
+
+Run with ``PYTHONPATH=src python benchmarks/bench_codecs.py``.
+"""
+import argparse
+import time
+
+from graph_server.serialization import CODECS
+
+MESSAGES = {
+    "compute request": {"command_type": "compute", "expression": "(30 + 10) * 5 + 1"},
+    "compute reply": {"given_math_expression": "(30 + 10) * 5 + 1", "result": "201"},
+    "batch request": {
+        "command_type": "compute",
+        "expression": "x * 2 + y",
+        "variables": {"x": [i * 0.5 for i in range(1000)], "y": [float(i) for i in range(1000)]},
+    },
+    "batch reply": {"given_math_expression": "x * 2 + y", "results": [i / 7 for i in range(1000)]},
+    "ls reply": {"given_os_command": "ls -l", "result": "\n".join(
+        f"-rw-r--r-- 1 user group {i * 37:>8} Jan  1 12:00 file_{i}.txt" for i in range(500)
+    )},
+}
+
+
+def measure(codec, message, iterations: int):
+    payload = codec.encode(message)
+    start = time.perf_counter()
+    for _ in range(iterations):
+        codec.decode(codec.encode(message))
+    return (time.perf_counter() - start) / iterations, len(payload)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=2000)
+    args = parser.parse_args()
+
+    print(f"{'message':<16} {'codec':<8} {'round trip':>12} {'bytes':>8}")
+    for label, message in MESSAGES.items():
+        for name, codec in CODECS.items():
+            seconds, size = measure(codec, message, args.iterations)
+            print(f"{label:<16} {name:<8} {seconds * 1e6:>10.1f}us {size:>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""Benchmark: wire bytes, client allocations and latency of multi-megabyte `ls` replies.
+
+Compares the legacy copying receive path with zero-copy receives, with and
+without zlib-compressed replies. The server runs in a separate process so
+only the client's allocations are traced.
+
+Run with ``PYTHONPATH=src python benchmarks/bench_compression.py``.
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import zmq
+
+from graph_server.serialization import JSON_CODEC, decode_reply
+
+ADDRESS = "tcp://127.0.0.1:5598"
+MODES = {
+    # name: (header frame, receive with copy)
+    "json, copying": (None, True),
+    "json, zero-copy": (b"json", False),
+    "json;zlib, zero-copy": (b"json;zlib", False),
+}
+
+
+def start_server(env: dict) -> subprocess.Popen:
+    server = subprocess.Popen([sys.executable, "-m", "graph_server.server"], env=env)
+    socket = zmq.Context.instance().socket(zmq.DEALER)
+    socket.linger = 0
+    socket.connect(ADDRESS)
+    try:
+        for _ in range(100):
+            socket.send_multipart([JSON_CODEC.encode({"command_type": "compute", "expression": "1"})])
+            if socket.poll(100):
+                socket.recv_multipart()
+                return server
+        raise RuntimeError("Server did not start")
+    finally:
+        socket.close()
+
+
+def measure(directory: str, header, copy: bool, rounds: int):
+    request = JSON_CODEC.encode({"command_type": "os", "command_name": "ls", "parameters": [directory]})
+    socket = zmq.Context.instance().socket(zmq.DEALER)
+    socket.connect(ADDRESS)
+    wire_bytes = 0
+    latencies = []
+    tracemalloc.start()
+    try:
+        for _ in range(rounds):
+            tracemalloc.reset_peak()
+            start = time.perf_counter()
+            socket.send_multipart([request] if header is None else [header, request])
+            if copy:
+                frames = socket.recv_multipart()
+                response = JSON_CODEC.decode(frames[-1])
+                wire_bytes = len(frames[-1])
+            else:
+                frames = socket.recv_multipart(copy=False)
+                response = decode_reply(frames)
+                wire_bytes = len(frames[-1].buffer)
+            latencies.append(time.perf_counter() - start)
+            assert "result" in response, response
+            del frames, response
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+        socket.close()
+    latencies.sort()
+    return wire_bytes, peak, latencies[len(latencies) // 2]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--files", type=int, default=40000, help="Entries in the listed directory")
+    parser.add_argument("--rounds", type=int, default=10)
+    args = parser.parse_args()
+
+    env = dict(
+        os.environ, ZMQ_SERVER_PORT=ADDRESS.rsplit(":", 1)[1], LOG_SAMPLE_RATES="INFO=0",
+        OS_RESULT_CACHE_TTL="0", COALESCE_REQUESTS="0"
+    )
+    with tempfile.TemporaryDirectory() as directory:
+        for i in range(args.files):
+            open(os.path.join(directory, f"report-{i:08d}-quarterly-revenue-by-region-and-product.csv"), "w").close()
+        server = start_server(env)
+        try:
+            print(f"{'mode':<22} {'wire MB':>8} {'client peak MB':>15} {'p50 ms':>8}")
+            for name, (header, copy) in MODES.items():
+                wire_bytes, peak, p50 = measure(directory, header, copy, args.rounds)
+                print(f"{name:<22} {wire_bytes / 1e6:>8.2f} {peak / 1e6:>15.2f} {p50 * 1000:>8.1f}")
+        finally:
+            server.terminate()
+            server.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""Microbenchmark: per-request cost of turning a decoded request into its command.
+
+Compares ``CommandRegistry.parse``, which validates and builds in one pass,
+with the two-stage path of ``JSONRequestValidator.validate`` followed by
+``CommandFactory.create_command``, for valid and malformed requests.
+
+Run with ``PYTHONPATH=src python benchmarks/bench_dispatch.py``.
+"""
+import argparse
+import time
+
+from graph_server.command_factory import CommandFactory
+from graph_server.exceptions import CommandError
+from graph_server.registry import CommandRegistry
+from graph_server.validators import JSONRequestValidator
+
+REQUESTS = {
+    "compute": {"command_type": "compute", "expression": "(30 + 10) * 5 + 1", "request_id": 7},
+    "os": {"command_type": "os", "command_name": "ls", "parameters": ["-l", "/tmp"], "timeout": 5},
+    "batch compute": {
+        "command_type": "compute", "expression": "x * 2",
+        "variables": {"x": [float(i) for i in range(100)]},
+    },
+    "batch of 50": {"command_type": "batch", "requests": [
+        {"command_type": "compute", "expression": f"{i} + 1"} for i in range(50)
+    ]},
+    "unknown type": {"command_type": "nope", "expression": "1"},
+    "bad batch item 1": {"command_type": "batch", "requests": [
+        {"command_type": "compute", "expression": "1"}, {"command_type": "compute"},
+    ] + [{"command_type": "compute", "expression": f"{i}"} for i in range(48)]},
+}
+
+
+def two_stage(validator: JSONRequestValidator):
+    def dispatch(request):
+        validator.validate(request)
+        if request["command_type"] not in ("stats", "ping"):
+            CommandFactory.create_command(request)
+    return dispatch
+
+
+def measure(dispatch, request, iterations: int) -> float:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        try:
+            dispatch(request)
+        except CommandError:
+            pass
+    return (time.perf_counter() - start) / iterations
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=20000)
+    args = parser.parse_args()
+
+    paths = {"two-stage": two_stage(JSONRequestValidator()), "single pass": CommandRegistry().parse}
+    print(f"{'request':<18} " + " ".join(f"{name + ' µs':>15}" for name in paths))
+    for label, request in REQUESTS.items():
+        timings = [measure(dispatch, request, args.iterations) for dispatch in paths.values()]
+        print(f"{label:<18} " + " ".join(f"{seconds * 1e6:>15.2f}" for seconds in timings))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""Microbenchmark: cached compiled expressions vs. parsing and walking the tree per request.
+
+Run with ``PYTHONPATH=src python benchmarks/bench_expression_cache.py``.
+"""
+import argparse
+import asyncio
+import random
+import time
+
+from graph_server.commands import ComputeCommand
+from graph_server.expression_cache import ExpressionCache
+
+
+def make_expressions(count: int, seed: int = 0):
+    rng = random.Random(seed)
+    ops = ["+", "-", "*", "/"]
+    expressions = []
+    for _ in range(count):
+        terms = [str(rng.randint(1, 1000)) for _ in range(rng.randint(3, 8))]
+        expression = terms[0]
+        for term in terms[1:]:
+            expression = f"({expression} {rng.choice(ops)} {term})"
+        expressions.append(expression)
+    return expressions
+
+
+async def run(workload, cache_size: int) -> float:
+    ComputeCommand.cache = ExpressionCache(cache_size)
+    start = time.perf_counter()
+    for expression in workload:
+        await ComputeCommand(expression).execute()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--distinct", type=int, default=2000, help="Distinct expressions in the workload")
+    parser.add_argument("--requests", type=int, default=200000, help="Total evaluations")
+    args = parser.parse_args()
+
+    expressions = make_expressions(args.distinct)
+    rng = random.Random(1)
+    workload = [rng.choice(expressions) for _ in range(args.requests)]
+
+    tree_walk = asyncio.run(run(workload, 0))
+    cached = asyncio.run(run(workload, args.distinct))
+    stats = ComputeCommand.cache.stats()
+
+    print(f"tree walk: {tree_walk:.3f}s ({args.requests / tree_walk:,.0f} eval/s)")
+    print(f"cached:    {cached:.3f}s ({args.requests / cached:,.0f} eval/s)")
+    print(f"speedup:   {tree_walk / cached:.1f}x  (hits={stats['hits']}, misses={stats['misses']})")
+
+
+if __name__ == "__main__":
+    main()
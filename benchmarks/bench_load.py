@@ -0,0 +1,264 @@
+"""Load test: throughput and tail latency of a local server under a request mix.
+
+Run with ``PYTHONPATH=src python benchmarks/bench_load.py``. Compare against the
+stored baseline with ``--baseline benchmarks/baseline.json``; the exit status is
+1 when throughput or p99 latency regressed by more than ``--tolerance``.
+Baselines are machine specific: refresh one with ``--save-baseline`` before
+comparing on a new host.
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import platform
+import random
+import socket
+import sys
+import time
+from typing import Any, Callable, Dict, List
+
+import zmq
+import zmq.asyncio
+
+ROWS = 1000
+
+# Request generators by kind; each takes a random source and returns a request
+KINDS: Dict[str, Callable[[random.Random], Dict[str, Any]]] = {
+    "compute-light": lambda rng: {
+        "command_type": "compute",
+        "expression": f"({rng.randint(0, 99)} + {rng.randint(0, 99)}) * 5 - 3 / 7",
+    },
+    "compute-heavy": lambda rng: {
+        "command_type": "compute",
+        "expression": "x ** 2 + y * 3 - x / (y + 1)",
+        "variables": {
+            "x": [rng.random() for _ in range(ROWS)],
+            "y": [rng.random() for _ in range(ROWS)],
+        },
+    },
+    "ls": lambda rng: {"command_type": "os", "command_name": "ls", "parameters": ["-l", "/etc"]},
+    "sleep": lambda rng: {"command_type": "os", "command_name": "sleep", "parameters": ["0.05"]},
+}
+
+MIXES = {
+    "default": {"compute-light": 70, "compute-heavy": 10, "ls": 15, "sleep": 5},
+    "compute-light": {"compute-light": 1},
+    "compute-heavy": {"compute-heavy": 1},
+    "ls": {"ls": 1},
+    "sleep": {"sleep": 1},
+}
+
+PERCENTILES = {"p50": 50, "p95": 95, "p99": 99, "p999": 99.9}
+
+
+def parse_mix(value: str) -> Dict[str, float]:
+    """Accept a preset name or ``kind=weight`` pairs, e.g. ``compute-light=9,ls=1``."""
+    if value in MIXES:
+        return MIXES[value]
+    mix = {}
+    for item in value.split(","):
+        kind, weight = item.split("=", 1)
+        if kind not in KINDS:
+            raise argparse.ArgumentTypeError(f"unknown request kind {kind!r}; choose from {', '.join(KINDS)}")
+        mix[kind] = float(weight)
+    return mix
+
+
+def percentile(ordered: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not ordered:
+        return 0.0
+    rank = max(1, -(-len(ordered) * pct // 100))
+    return ordered[int(rank) - 1]
+
+
+def summarize(latencies: List[float], errors: int, seconds: float) -> Dict[str, Any]:
+    ordered = sorted(latencies)
+    summary = {
+        "requests": len(ordered),
+        "errors": errors,
+        "req_per_s": len(ordered) / seconds if seconds else 0.0,
+    }
+    for label, pct in PERCENTILES.items():
+        summary[f"{label}_ms"] = percentile(ordered, pct) * 1000
+    return summary
+
+
+def serve(address: str, workers: int) -> None:
+    """Entry point of the server process."""
+    if workers:
+        from graph_server.broker import Broker
+        server = Broker(workers, log_level="ERROR", bind_address=address)
+    else:
+        from graph_server.server import ZMQServer
+        server = ZMQServer(log_level="ERROR", bind_address=address)
+    try:
+        asyncio.run(server.start())
+    except KeyboardInterrupt:
+        pass
+
+
+async def connection(context, address: str, mix: Dict[str, float], seed: int, deadline: float,
+                     warmup_until: float, samples: Dict[str, List[float]], errors: Dict[str, int]) -> None:
+    """Closed-loop DEALER client: one request outstanding at a time, like ZMQClient."""
+    rng = random.Random(seed)
+    kinds, weights = list(mix), list(mix.values())
+    dealer = context.socket(zmq.DEALER)
+    dealer.linger = 0
+    dealer.connect(address)
+    try:
+        while (now := time.perf_counter()) < deadline:
+            kind = rng.choices(kinds, weights)[0]
+            payload = json.dumps(KINDS[kind](rng)).encode()
+            start = time.perf_counter()
+            await dealer.send(payload)
+            reply = json.loads(await dealer.recv())
+            elapsed = time.perf_counter() - start
+            if now < warmup_until:
+                continue
+            if "error" in reply:
+                errors[kind] += 1
+            else:
+                samples[kind].append(elapsed)
+    finally:
+        dealer.close()
+
+
+async def drive(address: str, mix: Dict[str, float], connections: int, duration: float,
+                warmup: float, seed: int) -> Dict[str, Any]:
+    context = zmq.asyncio.Context()
+    samples = {kind: [] for kind in mix}
+    errors = {kind: 0 for kind in mix}
+    try:
+        await wait_until_serving(context, address)
+        start = time.perf_counter()
+        warmup_until = start + warmup
+        deadline = warmup_until + duration
+        await asyncio.gather(*(
+            connection(context, address, mix, seed + n, deadline, warmup_until, samples, errors)
+            for n in range(connections)
+        ))
+        # Measured from the end of warm-up; in-flight requests finish after the deadline
+        seconds = time.perf_counter() - warmup_until
+    finally:
+        context.term()
+
+    everything = [sample for kind_samples in samples.values() for sample in kind_samples]
+    return {
+        "overall": summarize(everything, sum(errors.values()), seconds),
+        "kinds": {kind: summarize(samples[kind], errors[kind], seconds) for kind in mix},
+    }
+
+
+async def wait_until_serving(context, address: str, timeout: float = 30.0) -> None:
+    dealer = context.socket(zmq.DEALER)
+    dealer.linger = 0
+    dealer.connect(address)
+    try:
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            await dealer.send(json.dumps({"command_type": "compute", "expression": "1"}).encode())
+            if await dealer.poll(500):
+                await dealer.recv()
+                return
+        raise RuntimeError(f"server at {address} did not answer within {timeout}s")
+    finally:
+        dealer.close()
+
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """Return a description of every metric that regressed beyond ``tolerance``."""
+    regressions = []
+    sections = [("overall", results["overall"], baseline["overall"])]
+    sections += [
+        (kind, summary, baseline["kinds"][kind])
+        for kind, summary in results["kinds"].items() if kind in baseline.get("kinds", {})
+    ]
+    for label, current, reference in sections:
+        if current["req_per_s"] < reference["req_per_s"] * (1 - tolerance):
+            regressions.append(
+                f"{label}: throughput {current['req_per_s']:.0f} req/s vs baseline {reference['req_per_s']:.0f}"
+            )
+        if current["p99_ms"] > reference["p99_ms"] * (1 + tolerance):
+            regressions.append(
+                f"{label}: p99 {current['p99_ms']:.2f}ms vs baseline {reference['p99_ms']:.2f}ms"
+            )
+    return regressions
+
+
+def print_report(results: Dict[str, Any]) -> None:
+    columns = ["requests", "errors", "req_per_s"] + [f"{label}_ms" for label in PERCENTILES]
+    print(f"{'kind':<14}" + "".join(f"{column:>12}" for column in columns))
+    rows = list(results["kinds"].items()) + [("overall", results["overall"])]
+    for kind, summary in rows:
+        print(f"{kind:<14}" + "".join(
+            f"{summary[column]:>12.2f}" if isinstance(summary[column], float) else f"{summary[column]:>12}"
+            for column in columns
+        ))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--mix", type=parse_mix, default="default",
+                        help=f"preset ({', '.join(MIXES)}) or kind=weight pairs")
+    parser.add_argument("--connections", type=int, default=32, help="concurrent DEALER connections")
+    parser.add_argument("--duration", type=float, default=10.0, help="measured seconds")
+    parser.add_argument("--warmup", type=float, default=2.0, help="seconds run before measuring")
+    parser.add_argument("--workers", type=int, default=0, help="run the server behind a broker with N workers")
+    parser.add_argument("--address", help="load an already running server instead of starting one")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    parser.add_argument("--baseline", help="compare against results stored in this file")
+    parser.add_argument("--save-baseline", metavar="PATH", help="store the results as a new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative regression")
+    args = parser.parse_args()
+    mix = args.mix
+
+    process = None
+    address = args.address
+    if address is None:
+        with socket.socket() as probe:
+            probe.bind(("127.0.0.1", 0))
+            address = f"tcp://127.0.0.1:{probe.getsockname()[1]}"
+        process = multiprocessing.get_context("spawn").Process(target=serve, args=(address, args.workers))
+        process.start()
+    try:
+        measured = asyncio.run(drive(address, mix, args.connections, args.duration, args.warmup, args.seed))
+    finally:
+        if process is not None:
+            process.terminate()
+            process.join()
+
+    results = {
+        "config": {
+            "mix": mix,
+            "connections": args.connections,
+            "duration": args.duration,
+            "workers": args.workers,
+            "python": platform.python_version(),
+            "cpus": os.cpu_count(),
+        },
+        **measured,
+    }
+    print_report(results)
+    for path in filter(None, (args.output, args.save_baseline)):
+        with open(path, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if (baseline["config"]["mix"], baseline["config"]["connections"]) != (mix, args.connections):
+            print(f"{args.baseline} was recorded with a different mix or connection count; not comparing")
+            sys.exit(2)
+        regressions = compare(results, baseline, args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+        print(f"No regressions beyond {args.tolerance:.0%} of {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
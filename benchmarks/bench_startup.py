@@ -0,0 +1,107 @@
+"""Benchmark: time to readiness and latency of the first requests, cold versus warm start.
+
+Each run starts the server as a fresh process, waits for its ready file and
+then sends the same sequence of requests one at a time. The warm run sets
+``WARM_START=1`` with a snapshot saved by an earlier run, so the compute
+workers, subprocess handling and expression cache are ready before it is.
+
+Run with ``PYTHONPATH=src python benchmarks/bench_startup.py``.
+"""
+import argparse
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+
+import zmq
+
+from graph_server.serialization import JSON_CODEC
+
+ADDRESS = "tcp://127.0.0.1:5597"
+EXPRESSIONS = [f"({n} + 1) * {n} ** 2 - {n} / 3" for n in range(20)]
+REQUESTS = {
+    "compute": [{"command_type": "compute", "expression": expression} for expression in EXPRESSIONS],
+    # Enough rows to be sent to a compute worker
+    "batch compute": [{"command_type": "compute", "expression": "x * 2 + 1", "variables": {"x": list(range(50000))}}],
+    "subprocess": [{"command_type": "os", "command_name": "sleep", "parameters": ["0"]}],
+}
+
+
+def start_server(env: dict, ready: str) -> subprocess.Popen:
+    server = subprocess.Popen([sys.executable, "-m", "graph_server.server"], env=env, stdout=subprocess.DEVNULL)
+    while not os.path.exists(ready):
+        if server.poll() is not None:
+            raise RuntimeError("Server exited during startup")
+        time.sleep(0.001)
+    return server
+
+
+def stop_server(server: subprocess.Popen) -> None:
+    server.send_signal(signal.SIGTERM)
+    server.wait()
+
+
+def measure(env: dict, ready: str, rounds: int):
+    started = time.perf_counter()
+    server = start_server(env, ready)
+    ready_at = time.perf_counter() - started
+    socket = zmq.Context.instance().socket(zmq.DEALER)
+    socket.linger = 0
+    socket.connect(ADDRESS)
+    latencies = {kind: [] for kind in REQUESTS}
+    try:
+        for _ in range(rounds):
+            for kind, requests in REQUESTS.items():
+                for request in requests:
+                    sent = time.perf_counter()
+                    socket.send_multipart([JSON_CODEC.encode(request)])
+                    response = JSON_CODEC.decode(socket.recv_multipart()[-1])
+                    latencies[kind].append(time.perf_counter() - sent)
+                    assert "error" not in response, response
+        finished = time.perf_counter() - started
+    finally:
+        socket.close()
+        stop_server(server)
+    overall = sorted(latency for values in latencies.values() for latency in values)
+    return {
+        "ready": ready_at,
+        "first compute": latencies["compute"][0],
+        "first batch": latencies["batch compute"][0],
+        "first subprocess": latencies["subprocess"][0],
+        "p99": overall[min(len(overall) - 1, int(len(overall) * 0.99))],
+        "all done": finished,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rounds", type=int, default=3, help="Times the request sequence is sent after startup")
+    parser.add_argument("--runs", type=int, default=5, help="Server starts per mode; medians are reported")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        ready = os.path.join(directory, "ready")
+        snapshot = os.path.join(directory, "snapshot.json")
+        base = dict(
+            os.environ, ZMQ_SERVER_PORT=ADDRESS.rsplit(":", 1)[1], LOG_SAMPLE_RATES="INFO=0",
+            READY_FILE=ready, COALESCE_REQUESTS="0"
+        )
+        modes = {
+            "cold": base,
+            "warm": dict(base, WARM_START="1", WARM_SNAPSHOT=snapshot),
+        }
+        # Record a snapshot for the warm runs
+        measure(modes["warm"], ready, 1)
+
+        results = {name: [measure(env, ready, args.rounds) for _ in range(args.runs)] for name, env in modes.items()}
+        columns = list(results["cold"][0])
+        print(f"{'ms':<6} " + " ".join(f"{column:>16}" for column in columns))
+        for name, runs in results.items():
+            medians = [sorted(run[column] for run in runs)[len(runs) // 2] for column in columns]
+            print(f"{name:<6} " + " ".join(f"{median * 1000:>16.1f}" for median in medians))
+
+
+if __name__ == "__main__":
+    main()
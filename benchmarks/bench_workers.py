@@ -0,0 +1,61 @@
+"""Benchmark: compute-bound throughput through the broker with 1..N worker processes.
+
+Run with ``PYTHONPATH=src python benchmarks/bench_workers.py --workers 1 2 4``.
+"""
+import argparse
+import asyncio
+import os
+import time
+
+from graph_server.async_client import AsyncZMQClient
+from graph_server.broker import Broker
+
+ADDRESS = "tcp://127.0.0.1:5599"
+# Unique, uncached big-integer expressions evaluated on the worker's event loop
+EXPRESSION = "({i} + 12345) ** 900 - ({i} + 12344) ** 900"
+
+
+async def measure(workers: int, requests: int, clients: int) -> float:
+    broker = Broker(workers, log_level="ERROR", bind_address=ADDRESS)
+    task = asyncio.create_task(broker.start())
+    while broker.stats()["ready"] < workers:
+        await asyncio.sleep(0.05)
+
+    connections = [AsyncZMQClient(ADDRESS, timeout=60) for _ in range(clients)]
+    counter = iter(range(requests))
+
+    async def drive(client: AsyncZMQClient) -> None:
+        for i in counter:
+            response = await client.send_command({"command_type": "compute", "expression": EXPRESSION.format(i=i)})
+            assert "result" in response, response
+
+    try:
+        start = time.perf_counter()
+        await asyncio.gather(*(drive(client) for client in connections for _ in range(16)))
+        return requests / (time.perf_counter() - start)
+    finally:
+        for client in connections:
+            await client.close()
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--requests", type=int, default=4000)
+    parser.add_argument("--clients", type=int, default=4)
+    args = parser.parse_args()
+
+    # Evaluate inline in each worker so the measurement is of the workers themselves
+    os.environ.update({"COMPUTE_WORKERS": "0", "COMPUTE_CACHE_SIZE": "0"})
+    baseline = None
+    print(f"{'workers':>8} {'req/s':>10} {'speedup':>8}")
+    for workers in args.workers:
+        rate = asyncio.run(measure(workers, args.requests, args.clients))
+        baseline = baseline or rate
+        print(f"{workers:>8} {rate:>10.0f} {rate / baseline:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
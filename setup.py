@@ -12,6 +12,10 @@ setup(
     packages=find_packages(where="src"),
     package_dir={"": "src"},
     install_requires=required,
+    extras_require={
+        'numpy': ['numpy>=1.26'],
+        'msgpack': ['msgpack>=1.0'],
+    },
     python_requires=">=3.12",
     entry_points={
         'console_scripts': [
@@ -0,0 +1,172 @@
+import asyncio
+import concurrent.futures
+import itertools
+import logging
+import threading
+import uuid
+from typing import Any, Dict, List, Optional
+
+import zmq
+import zmq.asyncio
+
+from graph_server.client import REPLY_GRACE, batch_request
+from graph_server.peers import configure_heartbeat
+from graph_server.serialization import CODECS, COMPRESSORS, JSON_CODEC, NegotiatedCodec, decode_reply
+
+
+class AsyncZMQClient:
+    """Asyncio client that keeps many requests in flight on a single DEALER socket.
+
+    Every request is tagged with a ``request_id`` that the server echoes back,
+    so replies can be matched to their requests in whatever order they arrive.
+    """
+
+    def __init__(self, server_address: str = "tcp://localhost:5555", hwm: int = 1000,
+                 codec: Optional[str] = None, timeout: Optional[float] = None,
+                 compression: Optional[str] = None, heartbeat_interval: float = 5.0,
+                 heartbeat_timeout: float = 15.0):
+        self.codec = CODECS[codec] if codec else None
+        if compression:
+            self.codec = NegotiatedCodec(self.codec or JSON_CODEC, accept=COMPRESSORS[compression])
+        # Default per-request timeout in seconds, sent to the server; None waits indefinitely
+        self.timeout = timeout
+        self.context = zmq.asyncio.Context()
+        self.socket = self.context.socket(zmq.DEALER)
+        self.socket.sndhwm = hwm
+        self.socket.rcvhwm = hwm
+        self.socket.linger = 0
+        self.client_id = str(uuid.uuid4()).encode()
+        self.socket.identity = self.client_id
+        # Lets the server notice if this process dies without closing the connection
+        configure_heartbeat(self.socket, heartbeat_interval, heartbeat_timeout)
+        self.socket.connect(server_address)
+        self._request_ids = itertools.count()
+        self._pending: Dict[int, asyncio.Future] = {}
+        self._receiver: Optional[asyncio.Task] = None
+        self.logger = logging.getLogger(__name__)
+        self.logger.info(f"Connected to server at {server_address}")
+
+    async def send_command(self, request: Dict[str, Any], timeout: Optional[float] = None) -> Dict[str, Any]:
+        """Send a command and wait for its response; other requests may be in flight meanwhile."""
+        timeout = self.timeout if timeout is None else timeout
+        try:
+            return await self.request(request, timeout)
+        except TimeoutError:
+            return {"error": f"Client error: request timed out after {timeout}s"}
+        except Exception as e:
+            return {"error": f"Client error: {str(e)}"}
+
+    async def request(self, request: Dict[str, Any], timeout: Optional[float] = None) -> Dict[str, Any]:
+        """Like ``send_command``, but raise TimeoutError or socket errors instead of replying with an error."""
+        if self._receiver is None:
+            self._receiver = asyncio.create_task(self._receive_loop())
+
+        request_id = next(self._request_ids)
+        future = asyncio.get_running_loop().create_future()
+        self._pending[request_id] = future
+        timeout = self.timeout if timeout is None else timeout
+        request = dict(request, request_id=request_id)
+        if timeout is not None:
+            # Let the server abandon the work too, and give its timeout error time to arrive
+            request.setdefault("timeout", timeout)
+        try:
+            await self._send(request)
+            return await asyncio.wait_for(future, None if timeout is None else timeout + REPLY_GRACE)
+        finally:
+            self._pending.pop(request_id, None)
+
+    async def send_batch(self, requests: List[Dict[str, Any]], concurrency: Optional[int] = None,
+                         ordered: bool = True, timeout: Optional[float] = None) -> Dict[str, Any]:
+        """Send several commands as one batch request; see ``ZMQClient.send_batch``."""
+        return await self.send_command(batch_request(requests, concurrency, ordered), timeout)
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._pending)
+
+    async def close(self) -> None:
+        """Cancel outstanding requests and close the connection."""
+        if self._receiver is not None:
+            self._receiver.cancel()
+            await asyncio.gather(self._receiver, return_exceptions=True)
+            self._receiver = None
+        for future in self._pending.values():
+            future.cancel()
+        self.socket.close()
+        self.context.term()
+
+    async def _send(self, request: Dict[str, Any]) -> None:
+        if self.codec is None:
+            await self.socket.send_multipart([JSON_CODEC.encode(request)])
+        else:
+            await self.socket.send_multipart([self.codec.header, self.codec.encode(request)])
+
+    async def _receive_loop(self) -> None:
+        try:
+            while True:
+                self._dispatch(await self.socket.recv_multipart(copy=False))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # Nothing will answer the outstanding requests any more
+            for future in self._pending.values():
+                if not future.done():
+                    future.set_exception(e)
+            self._receiver = None
+
+    def _dispatch(self, frames) -> None:
+        try:
+            message = decode_reply(frames)
+        except Exception as e:
+            self.logger.warning(f"Discarding undecodable reply: {str(e)}")
+            return
+
+        future = self._pending.get(message.get("request_id"))
+        if future is None:
+            # Late reply to a request that timed out, or one without an ID
+            self.logger.debug(f"Discarding uncorrelated reply: {message}")
+        elif not future.done():
+            future.set_result(message)
+
+
+class ThreadedZMQClient:
+    """Thread-safe synchronous wrapper running an AsyncZMQClient on a background event loop.
+
+    Any number of threads may call ``send_command`` concurrently; their requests
+    share one socket and are pipelined rather than serialized.
+    """
+
+    def __init__(self, *args: Any, client_class: type = AsyncZMQClient, **kwargs: Any):
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="zmq-client", daemon=True)
+        self._thread.start()
+        # client_class=BalancedZMQClient spreads the requests over several servers
+        self._client = self._run(self._create(client_class, *args, **kwargs)).result()
+
+    def submit(self, request: Dict[str, Any], timeout: Optional[float] = None) -> concurrent.futures.Future:
+        """Send a command without waiting; the returned future resolves to the response."""
+        return self._run(self._client.send_command(request, timeout))
+
+    def send_command(self, request: Dict[str, Any], timeout: Optional[float] = None) -> Dict[str, Any]:
+        """Send a command and block until its response arrives."""
+        return self.submit(request, timeout).result()
+
+    def send_batch(self, requests: List[Dict[str, Any]], concurrency: Optional[int] = None,
+                   ordered: bool = True, timeout: Optional[float] = None) -> Dict[str, Any]:
+        """Send several commands as one batch request and block until its response arrives."""
+        return self._run(self._client.send_batch(requests, concurrency, ordered, timeout)).result()
+
+    def close(self) -> None:
+        """Close the connection and stop the background loop."""
+        self._run(self._client.close()).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+
+    @staticmethod
+    async def _create(client_class: type, *args: Any, **kwargs: Any) -> AsyncZMQClient:
+        # Created on the background loop, which the client's sockets and tasks belong to
+        return client_class(*args, **kwargs)
+
+    def _run(self, coroutine) -> concurrent.futures.Future:
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop)
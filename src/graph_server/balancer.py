@@ -0,0 +1,231 @@
+import asyncio
+import hashlib
+import json
+import logging
+import random
+from bisect import bisect
+from typing import Any, Dict, List, Optional, Set
+
+import zmq
+
+from graph_server.async_client import AsyncZMQClient
+from graph_server.client import batch_request
+
+# Commands whose repeated execution is harmless, so they may be resent to another server
+RETRY_SAFE_COMMAND_TYPES = {"compute", "ping", "stats"}
+RETRY_SAFE_OS_COMMANDS = {"ls", "dir"}
+# Fields that differ between repeats of the same request
+_VOLATILE_FIELDS = {"request_id", "timeout", "deadline"}
+
+
+class _Node:
+    """Client-side state of one server endpoint."""
+
+    def __init__(self, address: str, client: AsyncZMQClient):
+        self.address = address
+        self.client = client
+        self.healthy = True
+        # Consecutive failed requests or pings while healthy; consecutive good pings while ejected
+        self.failures = 0
+        self.successes = 0
+        # Requests sent through this node and not yet answered or abandoned
+        self.outstanding = 0
+        self.dispatched = 0
+        self.ejections = 0
+        # Set when the node is ejected, so requests waiting on it can fail over
+        self.ejected = asyncio.Event()
+
+
+class BalancedZMQClient:
+    """Spreads requests over several servers, each reached through its own AsyncZMQClient.
+
+    Requests go to the healthy server with the fewest requests in flight, or,
+    with ``hash_requests``, to the server the request body hashes to on a
+    consistent-hash ring, so repeats of a request find that server's caches
+    warm. A server is ejected after ``max_failures`` consecutive timed out
+    requests or pings and re-admitted after ``readmit_after`` consecutive
+    successful pings.
+
+    When a server fails with a request in flight, retry-safe requests (compute,
+    ``ls``/``dir``, ``ping`` and ``stats``, and batches of those) are resent to
+    another server; other requests fail rather than risk running twice. Either
+    way the caller gets exactly one reply.
+    """
+
+    def __init__(self, endpoints: List[str], hwm: int = 1000, codec: Optional[str] = None,
+                 timeout: Optional[float] = None, compression: Optional[str] = None,
+                 hash_requests: bool = False, health_interval: float = 1.0, ping_timeout: float = 1.0,
+                 max_failures: int = 2, readmit_after: int = 2, retries: int = 2, replicas: int = 64):
+        if not endpoints:
+            raise ValueError("At least one endpoint is required")
+        self.nodes = [
+            _Node(address, AsyncZMQClient(address, hwm=hwm, codec=codec, compression=compression))
+            for address in endpoints
+        ]
+        # Default timeout in seconds of each attempt at a request; None waits indefinitely
+        self.timeout = timeout
+        self.hash_requests = hash_requests
+        self.health_interval = health_interval
+        self.ping_timeout = ping_timeout
+        self.max_failures = max_failures
+        self.readmit_after = readmit_after
+        self.retries = retries
+        self.failovers = 0
+        # Consistent-hash ring: sorted points, each owned by a node
+        ring = sorted(
+            (_hash(f"{node.address}#{replica}".encode()), index)
+            for index, node in enumerate(self.nodes) for replica in range(replicas)
+        )
+        self._ring_points = [point for point, _ in ring]
+        self._ring_nodes = [self.nodes[index] for _, index in ring]
+        self._health: Optional[asyncio.Task] = None
+        self.logger = logging.getLogger(__name__)
+
+    async def send_command(self, request: Dict[str, Any], timeout: Optional[float] = None) -> Dict[str, Any]:
+        """Send a command to the best available server and wait for its response."""
+        if self._health is None and self.health_interval:
+            self._health = asyncio.create_task(self._check_health())
+
+        timeout = self.timeout if timeout is None else timeout
+        key = _hash(_canonical(request)) if self.hash_requests else None
+        tried: Set[_Node] = set()
+        error = "no server available"
+        for _ in range(self.retries + 1):
+            node = self._select(key, tried)
+            if node is None:
+                break
+            tried.add(node)
+            try:
+                return await self._attempt(node, request, timeout)
+            except (TimeoutError, zmq.ZMQError, ConnectionError) as e:
+                error = f"{node.address} failed: {str(e) or type(e).__name__}"
+            if not _retry_safe(request):
+                return {"error": f"Client error: {error}; the request was not retried as it may not be safe to repeat"}
+            self.failovers += 1
+        return {"error": f"Client error: {error}"}
+
+    async def send_batch(self, requests: List[Dict[str, Any]], concurrency: Optional[int] = None,
+                         ordered: bool = True, timeout: Optional[float] = None) -> Dict[str, Any]:
+        """Send several commands as one batch request; see ``ZMQClient.send_batch``."""
+        return await self.send_command(batch_request(requests, concurrency, ordered), timeout)
+
+    @property
+    def in_flight(self) -> int:
+        return sum(node.outstanding for node in self.nodes)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return per-server routing and health counters."""
+        return {
+            "failovers": self.failovers,
+            "nodes": {
+                node.address: {
+                    "healthy": node.healthy,
+                    "in_flight": node.outstanding,
+                    "dispatched": node.dispatched,
+                    "failures": node.failures,
+                    "ejections": node.ejections,
+                }
+                for node in self.nodes
+            },
+        }
+
+    async def close(self) -> None:
+        """Stop health checks and close every connection."""
+        if self._health is not None:
+            self._health.cancel()
+            await asyncio.gather(self._health, return_exceptions=True)
+            self._health = None
+        for node in self.nodes:
+            await node.client.close()
+
+    def _select(self, key: Optional[int], tried: Set[_Node]) -> Optional[_Node]:
+        """Pick a node not tried yet, preferring healthy ones."""
+        candidates = [node for node in self.nodes if node.healthy and node not in tried]
+        if not candidates:
+            # Better a server that may have recovered than no attempt at all
+            candidates = [node for node in self.nodes if node not in tried]
+        if not candidates:
+            return None
+        if key is None:
+            return min(candidates, key=lambda node: (node.outstanding, random.random()))
+        start = bisect(self._ring_points, key)
+        for offset in range(len(self._ring_nodes)):
+            node = self._ring_nodes[(start + offset) % len(self._ring_nodes)]
+            if node in candidates:
+                return node
+        return None
+
+    async def _attempt(self, node: _Node, request: Dict[str, Any], timeout: Optional[float]) -> Dict[str, Any]:
+        """Send ``request`` to ``node``; raise TimeoutError if the node is ejected before replying."""
+        node.dispatched += 1
+        node.outstanding += 1
+        reply = asyncio.ensure_future(node.client.request(request, timeout))
+        ejected = asyncio.ensure_future(node.ejected.wait())
+        try:
+            await asyncio.wait({reply, ejected}, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            node.outstanding -= 1
+            ejected.cancel()
+            abandoned = not reply.done()
+            if abandoned:
+                # Dropping our interest also discards a late reply
+                reply.cancel()
+        if abandoned:
+            raise TimeoutError("server ejected while the request was in flight")
+        try:
+            response = reply.result()
+        except (TimeoutError, zmq.ZMQError):
+            self._failed(node)
+            raise
+        node.failures = 0
+        return response
+
+    def _failed(self, node: _Node) -> None:
+        node.successes = 0
+        node.failures += 1
+        if node.healthy and node.failures >= self.max_failures:
+            self.logger.warning(f"Ejecting {node.address} after {node.failures} consecutive failures")
+            node.healthy = False
+            node.ejections += 1
+            node.ejected.set()
+
+    def _recovered(self, node: _Node) -> None:
+        node.failures = 0
+        node.successes += 1
+        if not node.healthy and node.successes >= self.readmit_after:
+            self.logger.info(f"Re-admitting {node.address}")
+            node.healthy = True
+            node.ejected = asyncio.Event()
+
+    async def _check_health(self) -> None:
+        """Ping every node periodically, ejecting and re-admitting them."""
+        while True:
+            results = await asyncio.gather(
+                *(node.client.request({"command_type": "ping"}, self.ping_timeout) for node in self.nodes),
+                return_exceptions=True
+            )
+            for node, result in zip(self.nodes, results):
+                if isinstance(result, dict) and result.get("pong"):
+                    self._recovered(node)
+                else:
+                    self._failed(node)
+            await asyncio.sleep(self.health_interval)
+
+
+def _canonical(request: Dict[str, Any]) -> bytes:
+    """Request body without per-attempt fields, so repeats of a request hash alike."""
+    body = {key: value for key, value in request.items() if key not in _VOLATILE_FIELDS}
+    return json.dumps(body, sort_keys=True, separators=(',', ':')).encode()
+
+
+def _hash(data: bytes) -> int:
+    return int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), 'big')
+
+
+def _retry_safe(request: Dict[str, Any]) -> bool:
+    command_type = request.get("command_type")
+    if command_type == "os":
+        return request.get("command_name") in RETRY_SAFE_OS_COMMANDS and not request.get("stream")
+    if command_type == "batch":
+        return all(_retry_safe(item) for item in request.get("requests", []))
+    return command_type in RETRY_SAFE_COMMAND_TYPES
@@ -0,0 +1,386 @@
+import asyncio
+import contextlib
+import itertools
+import json
+import logging
+import multiprocessing
+import os
+import shutil
+import struct
+import tempfile
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional
+
+import zmq
+import zmq.asyncio
+
+from graph_server.log import configure_logging
+from graph_server.peers import configure_heartbeat
+from graph_server.serialization import JSON_CODEC, get_codec
+from graph_server.server import Reply, ZMQServer, read_request_id, write_atomically, run
+
+# Worker control messages start with an empty frame, which is never a valid
+# ZMQ routing identity and so cannot be confused with a reply to a client
+CONTROL = b""
+READY = b"READY"
+DONE = b"DONE"
+# Sequence number the broker prefixes to the client identity of each request it
+# forwards; the worker's replies and DONE carry it back, naming the exact request
+TAG = struct.Struct("!Q")
+
+
+class WorkerServer(ZMQServer):
+    """ZMQServer that receives requests from a broker instead of binding its own socket.
+
+    After each request it reports back to the broker so the broker can track how
+    busy every worker is.
+    """
+
+    def __init__(self, broker_address: str, identity: bytes, log_level=logging.INFO):
+        super().__init__(log_level, bind_address=broker_address)
+        self.identity = identity
+        # Workers can't share one metrics port; the stats command still works per worker
+        self.metrics_port = 0
+        # Clients are not connected to the worker, so it cannot tell when they leave
+        self.peers.interval = 0
+        # The broker writes the ready file once every worker is ready
+        self.ready_file = ''
+        self._socket: Optional[zmq.asyncio.Socket] = None
+
+    def _client_id(self, msg_id: bytes) -> bytes:
+        return msg_id[TAG.size:]
+
+    async def handle_request(self, msg_id, request_data, socket, codec=None, received_at=None, request=None) -> None:
+        try:
+            await super().handle_request(msg_id, request_data, socket, codec, received_at, request)
+        finally:
+            await socket.send_multipart([CONTROL, DONE, msg_id])
+
+    async def _refuse(self, socket, msg_id, codec, request, reason) -> None:
+        try:
+            await super()._refuse(socket, msg_id, codec, request, reason)
+        finally:
+            await socket.send_multipart([CONTROL, DONE, msg_id])
+
+    async def _open_socket(self, context: zmq.asyncio.Context) -> zmq.asyncio.Socket:
+        socket = context.socket(zmq.DEALER)
+        socket.identity = self.identity
+        socket.rcvhwm = self.rcvhwm
+        socket.sndhwm = self.sndhwm
+        socket.linger = 0
+        socket.connect(self.bind_address)
+        # Kept for _signal_ready, which announces the worker on it
+        self._socket = socket
+        return socket
+
+    async def _signal_ready(self) -> None:
+        # Sent once warmed up, so the broker holds requests back from a cold worker
+        await self._socket.send_multipart([CONTROL, READY])
+
+
+def run_worker(broker_address: str, identity: bytes, log_level) -> None:
+    """Entry point of a worker process."""
+    server = WorkerServer(broker_address, identity, log_level)
+    try:
+        run(server)
+    except KeyboardInterrupt:
+        pass
+
+
+class _Worker:
+    """Broker-side state of one worker process."""
+
+    def __init__(self, identity: bytes, process: multiprocessing.Process):
+        self.identity = identity
+        self.process = process
+        self.ready = False
+        # Frames of the requests dispatched to this worker and not yet done, by tag
+        self.requests: Dict[int, List[bytes]] = {}
+
+    @property
+    def in_flight(self) -> int:
+        return len(self.requests)
+
+    def add(self, tag: int, frames: List[bytes]) -> None:
+        self.requests[tag] = frames
+
+    def done(self, tag: int) -> None:
+        self.requests.pop(tag, None)
+
+    def orphaned(self) -> List[List[bytes]]:
+        """Remove and return every request the worker will no longer answer."""
+        frames = list(self.requests.values())
+        self.requests.clear()
+        return frames
+
+
+class Broker:
+    """Front-end ROUTER that spreads client requests over a pool of worker processes.
+
+    Each worker runs the normal request pipeline in its own process and event
+    loop. Requests go to the ready worker with the fewest requests in progress,
+    and a worker that dies is replaced; requests it was handling get an error.
+    """
+
+    def __init__(self, workers: Optional[int] = None, log_level=logging.INFO,
+                 bind_address: Optional[str] = None, backend_address: Optional[str] = None,
+                 restart_delay: float = 0.5):
+        host = os.getenv('ZMQ_SERVER_HOST', '127.0.0.1')
+        port = os.getenv('ZMQ_SERVER_PORT', '5555')
+        self.bind_address = bind_address or f"tcp://{host}:{port}"
+        self.worker_count = workers or os.cpu_count() or 1
+        # Workers connect here; defaults to an ipc:// socket in a private directory
+        self.backend_address = backend_address
+        # Requests a single worker may hold before it stops receiving more
+        self.max_inflight = int(os.getenv('MAX_INFLIGHT_REQUESTS', '1024'))
+        self.rcvhwm = int(os.getenv('ZMQ_RCVHWM', '1000'))
+        self.sndhwm = int(os.getenv('ZMQ_SNDHWM', '1000'))
+        self.heartbeat_interval = float(os.getenv('HEARTBEAT_INTERVAL', '5'))
+        self.heartbeat_timeout = float(os.getenv('HEARTBEAT_TIMEOUT', '15'))
+        self.restart_delay = restart_delay
+        # Written once all workers are ready for requests and removed on shutdown
+        self.ready_file = os.getenv('READY_FILE', '')
+        self.log_level = log_level
+        self.workers: Dict[bytes, _Worker] = {}
+        self.dispatched = 0
+        self.restarts = 0
+        self._tags = itertools.count()
+        # Replies held for clients whose queue is full, oldest first
+        self._backlog: Dict[bytes, Deque[List[Any]]] = {}
+        self._backlogged = asyncio.Event()
+        self._generation = 0
+        self._available = asyncio.Event()
+        self._runtime_dir: Optional[str] = None
+        self._started: Optional[float] = None
+
+        configure_logging(
+            log_level,
+            log_format=os.getenv('LOG_FORMAT', 'text'),
+            queue_size=int(os.getenv('LOG_QUEUE_SIZE', '10000'))
+        )
+        self.logger = logging.getLogger(__name__)
+
+    async def start(self) -> None:
+        """Start the workers and route requests until cancelled."""
+        self.logger.info(f"Broker starting on {self.bind_address} with {self.worker_count} workers")
+        self._started = time.perf_counter()
+        context = zmq.asyncio.Context()
+        frontend = context.socket(zmq.ROUTER)
+        frontend.rcvhwm = self.rcvhwm
+        frontend.sndhwm = self.sndhwm
+        configure_heartbeat(frontend, self.heartbeat_interval, self.heartbeat_timeout)
+        # Raise on a slow client's full queue so its replies are held rather than dropped
+        frontend.router_mandatory = 1
+        frontend.bind(self.bind_address)
+        backend = context.socket(zmq.ROUTER)
+        # Fail loudly rather than drop requests routed to a worker that just died
+        backend.router_mandatory = 1
+        backend.bind(self._backend_endpoint())
+        self.backend_address = backend.last_endpoint.decode()
+
+        loops = []
+        try:
+            for _ in range(self.worker_count):
+                self._spawn()
+            loops = [
+                asyncio.create_task(self._route_requests(frontend, backend)),
+                asyncio.create_task(self._route_replies(frontend, backend)),
+                asyncio.create_task(self._flush_backlog(frontend)),
+                asyncio.create_task(self._supervise(frontend)),
+            ]
+            await asyncio.gather(*loops)
+        except asyncio.CancelledError:
+            self.logger.info("Broker shutdown initiated")
+        finally:
+            for loop in loops:
+                loop.cancel()
+            await asyncio.gather(*loops, return_exceptions=True)
+            self._stop_workers()
+            frontend.close(linger=0)
+            backend.close(linger=0)
+            context.term()
+            if self._runtime_dir is not None:
+                shutil.rmtree(self._runtime_dir, ignore_errors=True)
+            if self.ready_file:
+                with contextlib.suppress(FileNotFoundError):
+                    os.remove(self.ready_file)
+            self.logger.info("Broker shut down")
+
+    def stats(self) -> Dict[str, Any]:
+        """Return a snapshot of the broker counters."""
+        return {
+            "workers": len(self.workers),
+            "ready": sum(worker.ready for worker in self.workers.values()),
+            "in_flight": sum(worker.in_flight for worker in self.workers.values()),
+            "dispatched": self.dispatched,
+            "restarts": self.restarts,
+            "backlogged": sum(map(len, self._backlog.values())),
+        }
+
+    def _backend_endpoint(self) -> str:
+        if self.backend_address:
+            return self.backend_address
+        if zmq.has('ipc'):
+            self._runtime_dir = tempfile.mkdtemp(prefix='graph-server-')
+            return f"ipc://{os.path.join(self._runtime_dir, 'workers')}"
+        return "tcp://127.0.0.1:*"
+
+    def _spawn(self) -> None:
+        self._generation += 1
+        identity = f"worker-{self._generation}".encode()
+        # Spawned rather than forked: the broker's ZMQ context must not be shared
+        process = multiprocessing.get_context("spawn").Process(
+            target=run_worker,
+            args=(self.backend_address, identity, self.log_level),
+            name=identity.decode()
+        )
+        process.start()
+        self.workers[identity] = _Worker(identity, process)
+
+    def _select(self) -> Optional[_Worker]:
+        """Return the ready worker with the fewest requests in progress, if any has room."""
+        candidates = [
+            worker for worker in self.workers.values()
+            if worker.ready and worker.in_flight < self.max_inflight
+        ]
+        return min(candidates, key=lambda worker: worker.in_flight, default=None)
+
+    async def _route_requests(self, frontend, backend) -> None:
+        while True:
+            worker = self._select()
+            if worker is None:
+                # Leave requests queued in ZMQ until a worker can take them
+                self._available.clear()
+                await self._available.wait()
+                continue
+
+            frames = await frontend.recv_multipart()
+            if len(frames) not in (2, 3):
+                continue
+            if len(frames) == 3 and get_codec(frames[1]) is None:
+                reply = Reply(frontend, frames[0], JSON_CODEC)
+                reply.request_id = read_request_id(frames[2])
+                await self._forward(frontend, reply.frames({
+                    "error": f"Unsupported codec: {frames[1].decode('ascii', errors='replace')}"
+                }))
+                continue
+
+            # The worker may have been lost while we waited for the request
+            worker = self._select() or worker
+            tag = next(self._tags)
+            try:
+                await backend.send_multipart([worker.identity, TAG.pack(tag) + frames[0]] + frames[1:])
+            except zmq.ZMQError as e:
+                self.logger.warning(f"Could not reach {worker.identity!r}: {str(e)}")
+                worker.ready = False
+                await self._fail(frontend, [frames])
+                continue
+            worker.add(tag, frames)
+            self.dispatched += 1
+
+    async def _route_replies(self, frontend, backend) -> None:
+        while True:
+            # Replies pass through without their payloads being copied
+            frames = await backend.recv_multipart(copy=False)
+            worker = self.workers.get(frames[0].bytes)
+            if frames[1].bytes != CONTROL:
+                await self._forward(frontend, [frames[1].bytes[TAG.size:]] + frames[2:])
+            elif worker is None:
+                continue
+            elif frames[2].bytes == DONE:
+                worker.done(TAG.unpack_from(frames[3].bytes)[0])
+                self._available.set()
+            elif frames[2].bytes == READY:
+                self.logger.info(f"Worker {worker.identity.decode()} ready")
+                worker.ready = True
+                self._available.set()
+                if self._started is not None and all(worker.ready for worker in self.workers.values()):
+                    self._signal_ready()
+
+    async def _forward(self, frontend, frames: List[Any]) -> None:
+        """Send a reply to its client, or hold it behind the client's earlier replies if they are still held.
+
+        Waiting for one slow client would hold up the replies to every other.
+        """
+        backlog = self._backlog.get(frames[0])
+        if backlog is None:
+            if await self._try_send(frontend, frames):
+                return
+            backlog = self._backlog[frames[0]] = deque()
+            self._backlogged.set()
+        backlog.append(frames)
+
+    async def _try_send(self, frontend, frames: List[Any]) -> bool:
+        """Send ``frames`` unless the client's queue is full; replies to clients that left are discarded."""
+        try:
+            await frontend.send_multipart(frames, flags=zmq.NOBLOCK, copy=False)
+        except zmq.Again:
+            return False
+        except zmq.ZMQError as e:
+            if e.errno != zmq.EHOSTUNREACH:
+                raise
+        return True
+
+    async def _flush_backlog(self, frontend) -> None:
+        """Retry held replies; a ROUTER can't report when one client's queue has room, so poll."""
+        while True:
+            if not self._backlog:
+                self._backlogged.clear()
+                await self._backlogged.wait()
+            await asyncio.sleep(0.005)
+            for client, backlog in list(self._backlog.items()):
+                while backlog and await self._try_send(frontend, backlog[0]):
+                    backlog.popleft()
+                if not backlog:
+                    del self._backlog[client]
+
+    def _signal_ready(self) -> None:
+        """Report the time until every worker first became ready and write the ready file."""
+        elapsed = round((time.perf_counter() - self._started) * 1000, 3)
+        self._started = None
+        self.logger.info(f"Broker ready in {elapsed:.1f}ms", extra={"total_ms": elapsed})
+        if self.ready_file:
+            write_atomically(self.ready_file, json.dumps({"pid": os.getpid(), "startup_ms": {"total": elapsed}}))
+
+    async def _supervise(self, frontend) -> None:
+        """Replace workers whose process has exited."""
+        while True:
+            await asyncio.sleep(0.1)
+            for worker in [worker for worker in self.workers.values() if not worker.process.is_alive()]:
+                self.logger.error(
+                    f"Worker {worker.identity.decode()} exited with code {worker.process.exitcode}; restarting"
+                )
+                del self.workers[worker.identity]
+                await self._fail(frontend, worker.orphaned())
+                if not worker.ready:
+                    # It died before starting up; don't respawn in a tight loop
+                    await asyncio.sleep(self.restart_delay)
+                self._spawn()
+                self.restarts += 1
+
+    async def _fail(self, frontend, requests: List[List[bytes]]) -> None:
+        """Answer requests whose worker is gone, in the framing and codec they arrived in."""
+        for frames in requests:
+            codec = get_codec(frames[1]) if len(frames) == 3 else None
+            reply = Reply(frontend, frames[0], codec)
+            try:
+                request = (codec or JSON_CODEC).decode(frames[-1])
+            except Exception:
+                request = None
+            message = {"error": "Worker process crashed while handling the request"}
+            if isinstance(request, dict):
+                reply.request_id = request.get("request_id")
+                if request.get("stream"):
+                    message["end"] = True
+            await self._forward(frontend, reply.frames(message))
+
+    def _stop_workers(self) -> None:
+        for worker in self.workers.values():
+            worker.process.terminate()
+        for worker in self.workers.values():
+            worker.process.join(timeout=5)
+            if worker.process.is_alive():
+                worker.process.kill()
+                worker.process.join()
+        self.workers.clear()
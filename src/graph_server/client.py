@@ -1,50 +1,161 @@
 import argparse
+import itertools
 import json
 import logging
+import time
 import uuid
-from typing import Any, Dict
+from typing import Any, Dict, Iterator, List, Optional
 
 import zmq
 
+from graph_server.exceptions import CommandExecutionError
+from graph_server.peers import configure_heartbeat
+from graph_server.serialization import CODECS, COMPRESSORS, JSON_CODEC, NegotiatedCodec, decode_reply
+
+
+# Extra time allowed for the server's own timeout error to arrive
+REPLY_GRACE = 1.0
+
 
 class ZMQClient:
-    def __init__(self, server_address: str = "tcp://localhost:5555"):
+    def __init__(self, server_address: str = "tcp://localhost:5555", hwm: int = 1000,
+                 codec: Optional[str] = None, timeout: Optional[float] = None,
+                 compression: Optional[str] = None, heartbeat_interval: float = 5.0,
+                 heartbeat_timeout: float = 15.0):
+        # Without a codec, requests use the legacy framing understood by every server
+        self.codec = CODECS[codec] if codec else None
+        if compression:
+            # Let the server compress large replies; advertised in the header frame
+            self.codec = NegotiatedCodec(self.codec or JSON_CODEC, accept=COMPRESSORS[compression])
+        # Default per-request timeout in seconds, sent to the server; None waits indefinitely
+        self.timeout = timeout
+        self._request_ids = itertools.count()
         self.context = zmq.Context()
         self.socket = self.context.socket(zmq.DEALER)
+        # Sends block once this many messages are queued for a busy server
+        self.socket.sndhwm = hwm
+        self.socket.rcvhwm = hwm
         # Generate a unique client ID
         self.client_id = str(uuid.uuid4()).encode()
         self.socket.identity = self.client_id
+        # Lets the server notice if this process dies without closing the connection
+        configure_heartbeat(self.socket, heartbeat_interval, heartbeat_timeout)
         self.socket.connect(server_address)
         logging.info(f"Connected to server at {server_address}")
 
-    def send_command(self, request: Dict[str, Any]) -> Dict[str, Any]:
-        """Send a command to the server and return the response."""
+    def send_command(self, request: Dict[str, Any], timeout: Optional[float] = None) -> Dict[str, Any]:
+        """Send a command to the server and return the response.
+        
+        With a timeout the server abandons the command once it expires, and this
+        call gives up shortly after if no reply arrived.
+        """
+        request = self._prepare(request, timeout)
         try:
-            # Send message frames
-            message = json.dumps(request).encode()
-            self.socket.send_multipart([message])
-            
-            # Receive response
-            response = self.socket.recv_multipart()
-            return json.loads(response[0].decode())
+            self._send(request)
+            return self._receive(request)
+        except TimeoutError:
+            return {"error": f"Client error: request timed out after {request['timeout']:g}s"}
         except Exception as e:
             return {"error": f"Client error: {str(e)}"}
 
+    def send_batch(self, requests: List[Dict[str, Any]], concurrency: Optional[int] = None,
+                   ordered: bool = True, timeout: Optional[float] = None) -> Dict[str, Any]:
+        """Send several commands in one round trip and return their outcomes together.
+        
+        The response's ``results`` has one entry per command, tagged with its
+        ``index`` in ``requests``: the command's response, or its ``error``.
+        """
+        return self.send_command(batch_request(requests, concurrency, ordered), timeout)
+
+    def stream_command(self, request: Dict[str, Any], timeout: Optional[float] = None) -> Iterator[str]:
+        """Send an OS command in streaming mode and yield its output as it arrives.
+        
+        Raises CommandExecutionError if the server reports an error, including
+        one that happens after part of the output was received.
+        """
+        request = self._prepare(dict(request, stream=True), timeout)
+        self._send(request)
+        
+        expected = 0
+        while True:
+            try:
+                message = self._receive(request)
+            except TimeoutError:
+                raise CommandExecutionError(f"Client error: request timed out after {request['timeout']:g}s")
+            if "seq" not in message:
+                # Rejected before streaming started
+                raise CommandExecutionError(message.get("error", "Unexpected response"), message.get("command"))
+            if message["seq"] != expected:
+                raise CommandExecutionError(f"Stream chunk {message['seq']} received, expected {expected}")
+            expected += 1
+            
+            if message.get("end"):
+                if "error" in message:
+                    raise CommandExecutionError(message["error"], message.get("command"))
+                return
+            yield message["chunk"]
+
+    def _send(self, request: Dict[str, Any]) -> None:
+        if self.codec is None:
+            self.socket.send_multipart([JSON_CODEC.encode(request)])
+        else:
+            self.socket.send_multipart([self.codec.header, self.codec.encode(request)])
+
+    def _prepare(self, request: Dict[str, Any], timeout: Optional[float]) -> Dict[str, Any]:
+        """Tag the request with an ID, to skip late replies to earlier requests, and its timeout."""
+        request = dict(request)
+        request.setdefault("request_id", next(self._request_ids))
+        timeout = self.timeout if timeout is None else timeout
+        if timeout is not None:
+            request.setdefault("timeout", timeout)
+        return request
+
+    def _receive(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        """Return the next reply to ``request``, raising TimeoutError once its timeout has passed."""
+        timeout = request.get("timeout")
+        deadline = time.monotonic() + timeout + REPLY_GRACE if timeout is not None else None
+        while True:
+            if deadline is not None and not self.socket.poll(max(0, deadline - time.monotonic()) * 1000):
+                raise TimeoutError
+            message = decode_reply(self.socket.recv_multipart(copy=False))
+            # Every request carries an ID, so a reply without one is an error the
+            # server could not attribute, such as an unsupported codec
+            if message.get("request_id") == request["request_id"] or "request_id" not in message:
+                return message
+            logging.debug(f"Discarding reply to another request: {message}")
+
     def close(self):
         """Close the client connection."""
         self.socket.close()
         self.context.term()
 
+def batch_request(requests: List[Dict[str, Any]], concurrency: Optional[int] = None,
+                  ordered: bool = True) -> Dict[str, Any]:
+    """Build a batch request running ``requests`` at most ``concurrency`` at a time.
+    
+    With ``ordered`` false, results are listed in the order the commands finish.
+    """
+    request = {"command_type": "batch", "requests": list(requests), "ordered": ordered}
+    if concurrency is not None:
+        request["concurrency"] = concurrency
+    return request
+
 def main():
     parser = argparse.ArgumentParser(description='ZMQ Client')
     parser.add_argument('--type', choices=['os', 'compute'], required=True, help='Command type (os or compute)')
     parser.add_argument('--cmd', help='Command name for OS commands')
     parser.add_argument('--params', nargs=argparse.REMAINDER, help='Parameters for OS commands')
     parser.add_argument('--expr', help='Expression for compute commands')
+    parser.add_argument('--stream', action='store_true', help='Print OS command output as it arrives')
+    parser.add_argument('--codec', choices=sorted(CODECS), help='Wire codec (default: legacy JSON framing)')
+    parser.add_argument('--compression', choices=sorted(COMPRESSORS), help='Accept compressed replies')
+    parser.add_argument('--timeout', type=float, help='Seconds the server may spend on the command')
+    parser.add_argument('--var', action='append', metavar='NAME=V1,V2,...',
+                        help='Variable values for batch compute commands (repeatable)')
     
     args = parser.parse_args()
     
-    client = ZMQClient()
+    client = ZMQClient(codec=args.codec, timeout=args.timeout, compression=args.compression)
     
     try:
         if args.type == 'os':
@@ -62,6 +173,19 @@ def main():
                 "command_type": "compute",
                 "expression": args.expr
             }
+            if args.var:
+                request["variables"] = {
+                    name: [float(value) for value in values.split(',')]
+                    for name, values in (var.split('=', 1) for var in args.var)
+                }
+        
+        if args.stream and args.type == 'os':
+            try:
+                for chunk in client.stream_command(request):
+                    print(chunk, end='', flush=True)
+            except CommandExecutionError as e:
+                print(json.dumps({"error": str(e), "command": e.command}, indent=2))
+            return
         
         response = client.send_command(request)
         print(json.dumps(response, indent=2))
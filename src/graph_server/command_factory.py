@@ -1,20 +1,25 @@
 from typing import Any, Dict
 
-from graph_server.commands import Command, ComputeCommand, OSCommand
+from graph_server.commands import Command
+from graph_server.registry import BUILDERS, CommandRegistry
 
 
 class CommandFactory:
     """Factory for creating command instances."""
     
-    @staticmethod
-    def create_command(request: Dict[str, Any]) -> Command:
-        """Create appropriate command instance based on request type."""
-        command_type = request["command_type"]
+    registry = CommandRegistry()
+    
+    @classmethod
+    def create_command(cls, request: Dict[str, Any]) -> Command:
+        """Create appropriate command instance based on request type.
         
-        if command_type == "os":
-            return OSCommand(request["command_name"], request.get("parameters", []))
-        elif command_type == "compute":
-            return ComputeCommand(request["expression"])
-        else:
+        Only executable commands are built; ``stats`` and ``ping`` requests are
+        answered by the server itself and raise ValueError here.
+        """
+        command_type = request["command_type"]
+        if command_type not in BUILDERS:
             raise ValueError(f"Unknown command type: {command_type}")
-        
\ No newline at end of file
+        command = cls.registry.parse(request)
+        if command is None:
+            raise ValueError(f"Command type {command_type} is answered by the server, not executed")
+        return command
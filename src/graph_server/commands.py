@@ -1,10 +1,51 @@
 import ast
 import asyncio
+import math
 import operator
 from abc import ABC, abstractmethod
-from typing import Dict, List
+from concurrent.futures import BrokenExecutor
+from typing import Any, AsyncIterator, Dict, Hashable, Iterable, List, Optional, Set
 
-from graph_server.exceptions import CommandExecutionError
+from graph_server.cost import CostEstimator
+from graph_server.exceptions import CommandError, CommandExecutionError, ExpressionRejectedError
+from graph_server.executor import ComputeExecutor
+from graph_server.expression_cache import CompiledExpression, ExpressionCache
+from graph_server.native import NATIVE_COMMANDS, NativeCommand
+from graph_server.result_cache import ResultCache
+from graph_server.scheduler import SubprocessScheduler
+
+_UNLOADED = object()
+# Imported on first use, as it takes longer to import than the rest of the server;
+# None if it is not installed, in which case batch evaluation falls back to a per-row loop
+numpy: Any = _UNLOADED
+
+
+def preload() -> None:
+    """Import the modules batch evaluation needs now rather than on the first batch request."""
+    _numpy()
+
+
+def _numpy() -> Any:
+    global numpy
+    if numpy is _UNLOADED:
+        try:
+            import numpy as module
+        except ImportError:
+            module = None
+        numpy = module
+    return numpy
+
+
+async def _read_capped(reader: asyncio.StreamReader, limit: int) -> bytes:
+    """Read ``reader`` to the end, keeping only its first ``limit`` bytes.
+    
+    Reading on keeps the writer from blocking on a full pipe.
+    """
+    kept = bytearray()
+    while chunk := await reader.read(65536):
+        if len(kept) < limit:
+            kept += chunk[:limit - len(kept)]
+    return bytes(kept)
 
 
 class Command(ABC):
@@ -14,11 +55,38 @@ class Command(ABC):
     async def execute(self) -> Dict[str, str]:
         """Execute the command and return the result."""
         pass
+    
+    def coalesce_key(self) -> Optional[Hashable]:
+        """Key under which concurrent identical executions may be shared, or None if they may not."""
+        return None
 
 class OSCommand(Command):
     """Handles system command execution."""
     
     SAFE_COMMANDS = {'ls', 'dir', 'cp', 'copy', 'sleep'}
+    COPY_COMMANDS = {'cp', 'copy'}
+    # Side-effect free commands whose concurrent identical requests share one run
+    COALESCE_COMMANDS = {'ls', 'dir'}
+    # Most stderr kept for the error of a failed streamed command; the rest is discarded
+    STREAM_STDERR_MAX = 64 * 1024
+    
+    # Shared by every OSCommand; replaced by the server with its configured limits
+    scheduler = SubprocessScheduler()
+    # In-process implementations tried before forking
+    native_commands: Dict[str, NativeCommand] = dict(NATIVE_COMMANDS)
+    # Output of read-only commands; disabled until the server sets a TTL
+    result_cache = ResultCache()
+    
+    @classmethod
+    async def warm(cls) -> None:
+        """Run a throwaway subprocess so the first request doesn't pay for the event loop's child handling setup."""
+        try:
+            process = await asyncio.create_subprocess_exec(
+                'sleep', '0', stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.DEVNULL
+            )
+        except OSError:
+            return
+        await process.wait()
     
     def __init__(self, command_name: str, parameters: List[str]):
         self._validate_command(command_name)
@@ -32,18 +100,58 @@ class OSCommand(Command):
                 command_name
             )
     
+    def coalesce_key(self) -> Optional[Hashable]:
+        if self.command_name not in self.COALESCE_COMMANDS:
+            return None
+        return ("os", self.command_name, tuple(self.parameters))
+    
     async def execute(self) -> Dict[str, str]:
+        if not self.result_cache.cacheable(self.command_name):
+            try:
+                return await self._run()
+            finally:
+                if self.command_name in self.COPY_COMMANDS:
+                    self.result_cache.invalidate_copy(self.parameters)
+        
+        output = self.result_cache.get(self.command_name, self.parameters)
+        if output is not None:
+            return {
+                "given_os_command": " ".join([self.command_name] + self.parameters),
+                "result": output
+            }
+        validators = self.result_cache.snapshot(self.parameters)
+        response = await self._run()
+        self.result_cache.put(self.command_name, self.parameters, response["result"], validators)
+        return response
+    
+    async def _run(self) -> Dict[str, str]:
         command = [self.command_name] + self.parameters
         command_str = " ".join(command)
         
+        native = self.native_commands.get(self.command_name)
+        if native is not None and native.supports(self.parameters):
+            output = await native.run(self.parameters)
+            if output is not None:
+                return {
+                    "given_os_command": command_str,
+                    "result": output.strip()
+                }
+        
         try:
-            process = await asyncio.create_subprocess_exec(
-                *command,
-                stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.PIPE
-            )
-            
-            stdout, stderr = await process.communicate()
+            async with self.scheduler.slot(self.command_name):
+                process = await asyncio.create_subprocess_exec(
+                    *command,
+                    stdout=asyncio.subprocess.PIPE,
+                    stderr=asyncio.subprocess.PIPE
+                )
+                
+                try:
+                    stdout, stderr = await process.communicate()
+                except asyncio.CancelledError:
+                    # Abandoned, e.g. because its deadline passed; don't leave the child running
+                    process.kill()
+                    await process.wait()
+                    raise
             
             if process.returncode != 0:
                 raise CommandExecutionError(
@@ -61,6 +169,46 @@ class OSCommand(Command):
                 f"Command not found: {self.command_name}",
                 command_str
             )
+    
+    async def stream(self, chunk_size: int) -> AsyncIterator[bytes]:
+        """Yield stdout in chunks of at most ``chunk_size`` bytes as the command produces it."""
+        command = [self.command_name] + self.parameters
+        command_str = " ".join(command)
+        
+        async with self.scheduler.slot(self.command_name):
+            try:
+                process = await asyncio.create_subprocess_exec(
+                    *command,
+                    stdout=asyncio.subprocess.PIPE,
+                    stderr=asyncio.subprocess.PIPE,
+                    limit=chunk_size
+                )
+            except FileNotFoundError:
+                raise CommandExecutionError(
+                    f"Command not found: {self.command_name}",
+                    command_str
+                )
+            
+            stderr = asyncio.create_task(_read_capped(process.stderr, self.STREAM_STDERR_MAX))
+            try:
+                while chunk := await process.stdout.read(chunk_size):
+                    yield chunk
+                await process.wait()
+                if process.returncode != 0:
+                    raise CommandExecutionError(
+                        f"Command failed: {(await stderr).decode(errors='replace').strip()}",
+                        command_str
+                    )
+            finally:
+                if process.returncode is None:
+                    process.kill()
+                    await process.wait()
+                # Read to the end so that the pipe closes now, not when garbage collected
+                await process.stdout.read()
+                stderr.cancel()
+                if self.command_name in self.COPY_COMMANDS:
+                    self.result_cache.invalidate_copy(self.parameters)
+
 
 class ComputeCommand(Command):
     """Handles mathematical expression evaluation."""
@@ -71,48 +219,269 @@ class ComputeCommand(Command):
         ast.Mult: operator.mul,
         ast.Div: operator.truediv,
         ast.Pow: operator.pow,
+        ast.USub: operator.neg,
+        ast.UAdd: operator.pos,
     }
     
-    def __init__(self, expression: str):
+    # Constant folding stops once an integer result would exceed this many bits
+    FOLD_MAX_BITS = 4096
+
+    # Shared by every ComputeCommand; a size of 0 falls back to the tree walk
+    cache = ExpressionCache()
+    # Shared admission control applied before any evaluation
+    estimator = CostEstimator()
+    # Set by the server to move heavy evaluations off the event loop
+    executor: Optional[ComputeExecutor] = None
+    
+    @classmethod
+    def configure(cls, cache_size: int, estimator: CostEstimator) -> None:
+        """Apply shared settings; also run in compute worker processes."""
+        cls.cache.resize(cache_size)
+        cls.estimator = estimator
+    
+    @classmethod
+    def precompile(cls, expressions: Iterable[str]) -> int:
+        """Compile ``expressions`` into the cache ahead of their requests and return how many it holds."""
+        expressions = list(expressions)
+        for expression in expressions:
+            try:
+                cls(expression)._try_compile()
+            except ExpressionRejectedError:
+                pass
+        return sum(expression in cls.cache for expression in expressions)
+    
+    def __init__(self, expression: str, variables: Optional[Dict[str, List[float]]] = None):
         self.expression = expression
+        self.variables = variables
     
-    async def execute(self) -> Dict[str, str]:
+    def coalesce_key(self) -> Optional[Hashable]:
+        variables = tuple(sorted((name, tuple(values)) for name, values in (self.variables or {}).items()))
+        return ("compute", self.expression, variables)
+    
+    async def execute(self) -> Dict[str, Any]:
+        compiled = None
+        if self.executor is not None:
+            compiled = self._try_compile()
+            if compiled is not None and self._is_heavy(compiled):
+                return await self._offload()
+        return self.evaluate(compiled)
+    
+    def evaluate(self, compiled: Optional[CompiledExpression] = None) -> Dict[str, Any]:
+        """Evaluate the expression synchronously on the calling thread or process."""
         try:
-            parsed = ast.parse(self.expression, mode='eval')
-            result = self._eval_expr(parsed.body)
+            if self.variables is not None:
+                return {
+                    "given_math_expression": self.expression,
+                    "results": self._evaluate_rows(compiled)
+                }
+            
+            if self.cache.maxsize:
+                result = (compiled or self._compile({})).evaluate()
+            else:
+                parsed = ast.parse(self.expression, mode='eval')
+                self.estimator.check(parsed.body, self.expression)
+                result = self._eval_expr(parsed.body)
             
             return {
                 "given_math_expression": self.expression,
                 "result": str(result)
             }
             
+        except ExpressionRejectedError:
+            raise
         except Exception as e:
             raise CommandExecutionError(
                 f"Expression evaluation failed: {str(e)}",
                 self.expression
             )
     
-    def _eval_expr(self, node: ast.AST) -> float:
+    async def _offload(self) -> Dict[str, Any]:
+        try:
+            return await self.executor.run(self.evaluate)
+        except TimeoutError:
+            raise CommandExecutionError(
+                f"Expression evaluation timed out after {self.executor.task_timeout}s",
+                self.expression
+            )
+        except BrokenExecutor:
+            raise CommandExecutionError(
+                "Expression evaluation failed: compute worker crashed",
+                self.expression
+            )
+    
+    def _try_compile(self) -> Optional[CompiledExpression]:
+        """Compile for cost inspection; invalid expressions are left for ``evaluate`` to report."""
+        try:
+            return self._compile(self.variables or {})
+        except ExpressionRejectedError:
+            raise
+        except Exception:
+            return None
+    
+    def _is_heavy(self, compiled: CompiledExpression) -> bool:
+        """Whether evaluation is costly enough to leave the event loop."""
+        rows = len(next(iter(self.variables.values()))) if self.variables else 1
+        return compiled.cost.work * rows > self.executor.inline_max_work
+    
+    def _evaluate_rows(self, compiled: Optional[CompiledExpression]) -> List[float]:
+        """Evaluate the expression once per row of ``variables``, vectorized when NumPy is available."""
+        if self.cache.maxsize:
+            evaluate = (compiled or self._compile(self.variables)).evaluate
+        else:
+            body = ast.parse(self.expression, mode='eval').body
+            self.estimator.check(body, self.expression)
+            evaluate = lambda variables: self._eval_expr(body, variables)
+        
+        rows = len(next(iter(self.variables.values())))
+        np = _numpy()
+        if np is not None:
+            columns = {name: np.asarray(values, dtype=float) for name, values in self.variables.items()}
+            with np.errstate(all='raise'):
+                result = np.asarray(evaluate(columns), dtype=float)
+            return np.broadcast_to(result, (rows,)).tolist()
+        
+        names = list(self.variables)
+        results = []
+        for row in zip(*self.variables.values()):
+            value = float(evaluate({name: float(v) for name, v in zip(names, row)}))
+            if not math.isfinite(value):
+                raise OverflowError("Result out of range")
+            results.append(value)
+        return results
+    
+    def _compile(self, variables: Dict[str, Any]) -> CompiledExpression:
+        """Return the compiled expression, parsing and validating it only on a cache miss."""
+        compiled = self.cache.get(self.expression)
+        if compiled is None:
+            parsed = ast.parse(self.expression, mode='eval')
+            cost = self.estimator.check(parsed.body, self.expression)
+            names = set()
+            body = ast.fix_missing_locations(ast.Expression(self._fold(parsed.body, names)))
+            compiled = CompiledExpression(compile(body, '<expression>', 'eval'), frozenset(names), cost)
+            self.cache.put(self.expression, compiled)
+        if compiled.names:
+            unknown = compiled.names.difference(variables)
+            if unknown:
+                raise CommandExecutionError(f"Unknown variable: {min(unknown)}", self.expression)
+        return compiled
+    
+    def _fold(self, node: ast.AST, names: Set[str]) -> ast.AST:
+        """Validate the tree and replace cheap constant sub-expressions by their value.
+
+        Variable names referenced by the expression are collected into ``names``.
+        """
         if isinstance(node, ast.Constant):
-            if isinstance(node.value, (int, float)):
-                return node.value
-            else:
-                raise CommandExecutionError(
-                    f"Unsupported constant type: {type(node.value).__name__}",
-                    self.expression
-                )
+            self._check_constant(node)
+            return node
+        elif isinstance(node, ast.Name):
+            names.add(node.id)
+            return ast.Name(id=node.id, ctx=ast.Load())
+        elif isinstance(node, ast.UnaryOp):
+            self._check_operator(node.op)
+            operand = self._fold(node.operand, names)
+            if isinstance(operand, ast.Constant):
+                return ast.Constant(self.OPERATORS[type(node.op)](operand.value))
+            return ast.UnaryOp(op=node.op, operand=operand)
         elif isinstance(node, ast.BinOp):
-            if type(node.op) not in self.OPERATORS:
-                raise CommandExecutionError(
-                    f"Unsupported operator: {type(node.op).__name__}",
-                    self.expression
-                )
-            
-            left = self._eval_expr(node.left)
-            right = self._eval_expr(node.right)
+            self._check_operator(node.op)
+            left = self._fold(node.left, names)
+            right = self._fold(node.right, names)
+            if (isinstance(left, ast.Constant) and isinstance(right, ast.Constant)
+                    and self._is_cheap(node.op, left.value, right.value)):
+                try:
+                    return ast.Constant(self.OPERATORS[type(node.op)](left.value, right.value))
+                except (ArithmeticError, ValueError):
+                    # Leave it to evaluation so the error is raised per request
+                    pass
+            return ast.BinOp(left=left, op=node.op, right=right)
+        else:
+            raise CommandExecutionError(
+                f"Unsupported expression type: {type(node).__name__}",
+                self.expression
+            )
+    
+    def _is_cheap(self, op: ast.operator, left, right) -> bool:
+        """Whether folding ``left op right`` is bounded in time and memory."""
+        if not isinstance(left, int) or not isinstance(right, int):
+            return True
+        if isinstance(op, ast.Pow):
+            return right <= 0 or left.bit_length() * right <= self.FOLD_MAX_BITS
+        if isinstance(op, ast.Mult):
+            return left.bit_length() + right.bit_length() <= self.FOLD_MAX_BITS
+        return True
+    
+    def _check_constant(self, node: ast.Constant) -> None:
+        if not isinstance(node.value, (int, float)):
+            raise CommandExecutionError(
+                f"Unsupported constant type: {type(node.value).__name__}",
+                self.expression
+            )
+    
+    def _check_operator(self, op: ast.AST) -> None:
+        if type(op) not in self.OPERATORS:
+            raise CommandExecutionError(
+                f"Unsupported operator: {type(op).__name__}",
+                self.expression
+            )
+    
+    def _eval_expr(self, node: ast.AST, variables: Optional[Dict[str, Any]] = None) -> float:
+        if isinstance(node, ast.Constant):
+            self._check_constant(node)
+            return node.value
+        elif isinstance(node, ast.Name):
+            if variables is None or node.id not in variables:
+                raise CommandExecutionError(f"Unknown variable: {node.id}", self.expression)
+            return variables[node.id]
+        elif isinstance(node, ast.UnaryOp):
+            self._check_operator(node.op)
+            return self.OPERATORS[type(node.op)](self._eval_expr(node.operand, variables))
+        elif isinstance(node, ast.BinOp):
+            self._check_operator(node.op)
+            left = self._eval_expr(node.left, variables)
+            right = self._eval_expr(node.right, variables)
             return self.OPERATORS[type(node.op)](left, right)
         else:
             raise CommandExecutionError(
                 f"Unsupported expression type: {type(node).__name__}",
                 self.expression
-            )
\ No newline at end of file
+            )
+
+class BatchCommand(Command):
+    """Runs independent commands concurrently and gathers their outcomes in one response."""
+    
+    # Commands of one batch running at once when the request sets no limit; 0 for no limit
+    max_concurrency = 16
+    
+    def __init__(self, commands: List[Command], concurrency: Optional[int] = None, ordered: bool = True):
+        self.commands = commands
+        limits = [limit for limit in (concurrency, self.max_concurrency) if limit]
+        self.concurrency = min(limits) if limits else None
+        # Report items in request order, or in the order they finish
+        self.ordered = ordered
+    
+    async def execute(self) -> Dict[str, Any]:
+        slots = asyncio.Semaphore(self.concurrency) if self.concurrency else None
+        
+        async def run(index: int, command: Command) -> Dict[str, Any]:
+            try:
+                if slots is None:
+                    return {"index": index, **await command.execute()}
+                async with slots:
+                    return {"index": index, **await command.execute()}
+            except CommandError as e:
+                return {"index": index, "error": str(e), "command": getattr(e, 'command', None)}
+        
+        tasks = [asyncio.ensure_future(run(index, command)) for index, command in enumerate(self.commands)]
+        try:
+            if self.ordered:
+                results = await asyncio.gather(*tasks)
+            else:
+                results = [await task for task in asyncio.as_completed(tasks)]
+        finally:
+            # Stop the rest if the batch is abandoned or an item failed unexpectedly
+            for task in tasks:
+                task.cancel()
+        return {
+            "results": results,
+            "failed": sum("error" in result for result in results)
+        }
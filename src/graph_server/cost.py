@@ -0,0 +1,170 @@
+import ast
+import math
+import sys
+from typing import Any, Dict, Optional, Tuple
+
+from graph_server.exceptions import ExpressionRejectedError
+
+WORD_BITS = 64
+# Growth exponent of CPython's Karatsuba multiplication
+KARATSUBA_EXPONENT = 1.585
+# Floats overflow (cheaply) beyond this magnitude
+FLOAT_MAX_LOG2 = 1024.0
+
+
+class ExpressionCost:
+    """Static estimate of the size of an expression and of the work to evaluate it."""
+    
+    def __init__(self, nodes: int, depth: int, result_bits: float, work: float):
+        self.nodes = nodes
+        self.depth = depth
+        # Upper bound on the bit length of any integer produced during evaluation
+        self.result_bits = result_bits
+        self.work = work
+
+
+class CostEstimator:
+    """Admission control for compute expressions, decided from the AST alone.
+    
+    Work is counted in units of roughly one word-sized multiplication (~10ns on
+    current hardware). Every node costs one unit; big-integer products and powers
+    cost ``(bits / 64) ** 1.585``, which tracks CPython's Karatsuba multiplication.
+    
+    Results are returned as decimal text, so by default no integer may grow
+    beyond what ``str()`` converts under the interpreter's digit limit.
+    """
+    
+    def __init__(self, max_nodes: int = 10_000, max_depth: int = 200,
+                 max_result_bits: Optional[float] = None, max_work: float = 10_000_000):
+        self.max_nodes = max_nodes
+        self.max_depth = max_depth
+        self.max_result_bits = max_result_bits if max_result_bits is not None else printable_bits()
+        self.max_work = max_work
+        self.checked = 0
+        self.rejected = 0
+    
+    def check(self, node: ast.AST, expression: str) -> ExpressionCost:
+        """Estimate ``node`` and raise ExpressionRejectedError if any limit is exceeded."""
+        self.checked += 1
+        cost = self.estimate(node)
+        reason = self._violation(cost)
+        if reason:
+            self.rejected += 1
+            raise ExpressionRejectedError(f"Expression rejected: {reason}", expression)
+        return cost
+    
+    def estimate(self, node: ast.AST) -> ExpressionCost:
+        """Return the estimated cost of evaluating ``node``."""
+        nodes, depth = self._shape(node)
+        if nodes > self.max_nodes or depth > self.max_depth:
+            # Too large to bother estimating magnitudes; the shape alone rejects it
+            return ExpressionCost(nodes, depth, 0.0, float(nodes))
+        
+        totals = {"work": float(nodes), "bits": 0.0}
+        self._magnitude(node, totals)
+        return ExpressionCost(nodes, depth, totals["bits"], totals["work"])
+    
+    def stats(self) -> Dict[str, int]:
+        """Return a snapshot of the admission counters."""
+        return {"checked": self.checked, "rejected": self.rejected}
+    
+    def _violation(self, cost: ExpressionCost) -> Optional[str]:
+        if cost.nodes > self.max_nodes:
+            return f"{cost.nodes} nodes exceeds limit of {self.max_nodes}"
+        if cost.depth > self.max_depth:
+            return f"nesting depth {cost.depth} exceeds limit of {self.max_depth}"
+        if cost.result_bits > self.max_result_bits:
+            return f"estimated result of {cost.result_bits:.3g} bits exceeds limit of {self.max_result_bits:.3g}"
+        if cost.work > self.max_work:
+            return f"estimated work of {cost.work:.3g} units exceeds limit of {self.max_work:.3g}"
+        return None
+    
+    @staticmethod
+    def _shape(node: ast.AST) -> Tuple[int, int]:
+        """Count expression nodes and nesting depth without recursion."""
+        nodes = depth = 0
+        stack = [(node, 1)]
+        while stack:
+            current, level = stack.pop()
+            nodes += 1
+            depth = max(depth, level)
+            stack.extend(
+                (child, level + 1) for child in ast.iter_child_nodes(current)
+                if isinstance(child, ast.expr)
+            )
+        return nodes, depth
+    
+    def _magnitude(self, node: ast.AST, totals: Dict[str, float]) -> Tuple[bool, float, Any]:
+        """Return ``(is_int, log2 bound of |value|, exact value or None)`` for ``node``."""
+        if isinstance(node, ast.Constant):
+            value = node.value
+            if isinstance(value, int):
+                return True, float(abs(value).bit_length()), value
+            if isinstance(value, float) and value:
+                return False, min(abs(math.log2(abs(value))), FLOAT_MAX_LOG2), None
+            return False, 0.0, None
+        elif isinstance(node, ast.UnaryOp):
+            is_int, bits, value = self._magnitude(node.operand, totals)
+            if value is not None and isinstance(node.op, ast.USub):
+                value = -value
+            return is_int, bits, value
+        elif isinstance(node, ast.BinOp):
+            left = self._magnitude(node.left, totals)
+            right = self._magnitude(node.right, totals)
+            return self._binop(node.op, left, right, totals)
+        # Variables are bound to float columns
+        return False, FLOAT_MAX_LOG2, None
+    
+    def _binop(self, op: ast.operator, left: Tuple[bool, float, Any],
+               right: Tuple[bool, float, Any], totals: Dict[str, float]) -> Tuple[bool, float, Any]:
+        left_int, left_bits, left_value = left
+        right_int, right_bits, right_value = right
+        if not (left_int and right_int) or isinstance(op, ast.Div):
+            # Float arithmetic is constant time and overflows instead of growing
+            return False, FLOAT_MAX_LOG2, None
+        
+        if isinstance(op, ast.Pow):
+            if right_value is not None and right_value < 0:
+                return False, FLOAT_MAX_LOG2, None
+            exponent = right_value if right_value is not None else _exp2(right_bits)
+            if left_value is not None and abs(left_value) <= 1:
+                bits = 1.0
+            else:
+                base_bits = math.log2(abs(left_value)) if left_value is not None else left_bits
+                bits = base_bits * exponent if base_bits else 1.0
+            self._account(totals, bits, _multiplication_work(bits))
+        elif isinstance(op, ast.Mult):
+            bits = left_bits + right_bits
+            self._account(totals, bits, _multiplication_work(max(left_bits, right_bits)))
+        else:
+            bits = max(left_bits, right_bits) + 1
+            self._account(totals, bits, bits / WORD_BITS)
+        return True, bits, None
+    
+    @staticmethod
+    def _account(totals: Dict[str, float], bits: float, work: float) -> None:
+        totals["bits"] = max(totals["bits"], bits)
+        totals["work"] += work
+
+
+def printable_bits() -> float:
+    """Bit length of the largest integer ``str()`` converts, or 10 million if it is unlimited."""
+    digits = sys.get_int_max_str_digits()
+    return digits * math.log2(10) if digits else 10_000_000.0
+
+
+def _exp2(bits: float) -> float:
+    try:
+        return 2.0 ** bits
+    except OverflowError:
+        return math.inf
+
+
+def _multiplication_work(bits: float) -> float:
+    words = bits / WORD_BITS
+    if words <= 1:
+        return 1.0
+    try:
+        return words ** KARATSUBA_EXPONENT
+    except OverflowError:
+        return math.inf
@@ -9,8 +9,32 @@ class ValidationError(CommandError):
     """Raised when request validation fails."""
     pass
 
+class DecodeError(Exception):
+    """Raised when a message payload cannot be deserialized."""
+    pass
+
 class CommandExecutionError(CommandError):
     """Raised when command execution fails."""
     def __init__(self, message: str, command: Optional[str] = None):
         self.command = command
-        super().__init__(message)
\ No newline at end of file
+        super().__init__(message)
+
+    def __reduce__(self):
+        # Keep ``command`` when the error crosses a process boundary
+        return (self.__class__, (str(self), self.command))
+
+class ServerBusyError(CommandExecutionError):
+    """Raised when a command is refused because its wait queue is full."""
+    pass
+
+class ExpressionRejectedError(CommandExecutionError):
+    """Raised when an expression is refused before evaluation because it is too costly."""
+    pass
+
+class DeadlineExceededError(CommandExecutionError):
+    """Raised when a request's deadline passes before it completes."""
+    pass
+
+class ReplyStalledError(CommandExecutionError):
+    """Raised when a client stops reading a stream and its replies are dropped."""
+    pass
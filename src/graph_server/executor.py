@@ -0,0 +1,136 @@
+import asyncio
+import logging
+import os
+import time
+# Executor and BrokenExecutor come with asyncio; the process pool machinery is
+# imported with the first pool, so servers without compute workers never load it
+from concurrent.futures import BrokenExecutor, Executor
+from typing import Any, Callable, Dict, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class ComputeExecutor:
+    """Runs CPU-heavy work in a pool of worker processes, off the event loop."""
+    
+    def __init__(self, max_workers: Optional[int] = None, task_timeout: float = 10.0,
+                 max_tasks_per_child: Optional[int] = 100, inline_max_work: int = 100_000,
+                 initializer: Optional[Callable[..., None]] = None, initargs: Tuple[Any, ...] = ()):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.task_timeout = task_timeout
+        self.max_tasks_per_child = max_tasks_per_child
+        # Work estimates at or below this run inline on the event loop
+        self.inline_max_work = inline_max_work
+        # Run in every new worker process, e.g. to replicate the server's configuration
+        self.initializer = initializer
+        self.initargs = initargs
+        self._pool: Optional[Executor] = None
+        # One per worker; a task holds its slot until it finishes or is killed
+        self._slots = asyncio.Semaphore(self.max_workers)
+        self._abandoned: Set[asyncio.Task] = set()
+        self.submitted = 0
+        self.abandoned = 0
+        self.timeouts = 0
+        self.recycles = 0
+    
+    async def run(self, fn: Callable[..., Any], *args: Any) -> Any:
+        """Run ``fn(*args)`` in a worker process, raising TimeoutError after ``task_timeout``.
+        
+        At most one task per worker is handed to the pool, so each starts as soon
+        as it is submitted and ``task_timeout`` counts from then; the rest wait
+        here. If the call is cancelled, e.g. because its request's deadline
+        passed, the task runs on in the background and its result is discarded.
+        """
+        self.submitted += 1
+        await self._slots.acquire()
+        release = True
+        try:
+            for attempt in range(2):
+                pool = self._get_pool()
+                try:
+                    started = time.monotonic()
+                    result = asyncio.wrap_future(pool.submit(fn, *args))
+                    # Shielded so that cancelling the call leaves the task to _discard
+                    return await asyncio.wait_for(asyncio.shield(result), self.task_timeout)
+                except TimeoutError:
+                    self.timeouts += 1
+                    result.cancel()
+                    self._recycle(pool)
+                    raise
+                except asyncio.CancelledError:
+                    remaining = self.task_timeout - (time.monotonic() - started)
+                    task = asyncio.create_task(self._discard(pool, result, remaining))
+                    self._abandoned.add(task)
+                    task.add_done_callback(self._abandoned.discard)
+                    release = False
+                    raise
+                except BrokenExecutor:
+                    # The pool was recycled because of another task; retry once on a fresh one
+                    self._recycle(pool)
+                    if attempt:
+                        raise
+        finally:
+            if release:
+                self._slots.release()
+    
+    async def _discard(self, pool: Executor, result: asyncio.Future, timeout: float) -> None:
+        """Wait out an abandoned task, holding its slot, and recycle the pool if it overruns."""
+        self.abandoned += 1
+        try:
+            await asyncio.wait_for(result, max(timeout, 0))
+        except TimeoutError:
+            self.timeouts += 1
+            self._recycle(pool)
+        except Exception:
+            pass
+        finally:
+            self._slots.release()
+    
+    async def warm(self, fn: Callable[[], Any] = os.getpid) -> None:
+        """Start every worker process now, running ``fn`` in each, rather than on the first heavy request."""
+        loop = asyncio.get_running_loop()
+        pool = self._get_pool()
+        # The pool starts a process per task submitted while none is idle
+        await asyncio.gather(*(loop.run_in_executor(pool, fn) for _ in range(self.max_workers)))
+    
+    def shutdown(self) -> None:
+        """Stop all worker processes."""
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+    
+    def stats(self) -> Dict[str, Any]:
+        """Return a snapshot of the executor counters."""
+        return {
+            "max_workers": self.max_workers,
+            "submitted": self.submitted,
+            "timeouts": self.timeouts,
+            "abandoned": self.abandoned,
+            "recycles": self.recycles,
+        }
+    
+    def _get_pool(self) -> Executor:
+        if self._pool is None:
+            import multiprocessing
+            from concurrent.futures import ProcessPoolExecutor
+            
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                max_tasks_per_child=self.max_tasks_per_child,
+                initializer=self.initializer,
+                initargs=self.initargs
+            )
+        return self._pool
+    
+    def _recycle(self, pool: Executor) -> None:
+        """Kill the workers of ``pool`` so a runaway task stops consuming CPU."""
+        if pool is not self._pool:
+            return
+        self._pool = None
+        self.recycles += 1
+        logger.warning("Recycling compute worker pool")
+        # ProcessPoolExecutor cannot cancel a running task; killing its workers is the only way
+        for process in list((getattr(pool, "_processes", None) or {}).values()):
+            process.kill()
+        pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,86 @@
+from collections import OrderedDict
+from types import CodeType
+from typing import Any, Dict, FrozenSet, List, Optional
+
+from graph_server.cost import ExpressionCost
+
+
+class CompiledExpression:
+    """Validated, constant-folded and compiled form of a compute expression."""
+
+    def __init__(self, code: CodeType, names: FrozenSet[str] = frozenset(),
+                 cost: Optional[ExpressionCost] = None):
+        self.code = code
+        self.names = names
+        self.cost = cost
+
+    def evaluate(self, variables: Optional[Dict[str, Any]] = None):
+        """Evaluate the compiled expression without any builtins in scope."""
+        return eval(self.code, {"__builtins__": {}}, variables or {})
+
+
+class ExpressionCache:
+    """Bounded LRU cache mapping expression text to its compiled form."""
+
+    def __init__(self, maxsize: int = 4096):
+        self._entries: "OrderedDict[str, CompiledExpression]" = OrderedDict()
+        self.maxsize = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.resize(maxsize)
+
+    def get(self, expression: str) -> Optional[CompiledExpression]:
+        """Return the cached entry for ``expression`` and mark it recently used."""
+        compiled = self._entries.get(expression)
+        if compiled is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(expression)
+        self.hits += 1
+        return compiled
+
+    def put(self, expression: str, compiled: CompiledExpression) -> None:
+        """Store ``compiled``, evicting the least recently used entries if full."""
+        if not self.maxsize:
+            return
+        self._entries[expression] = compiled
+        self._entries.move_to_end(expression)
+        self._evict()
+
+    def resize(self, maxsize: int) -> None:
+        """Change the cache capacity, evicting entries that no longer fit."""
+        if maxsize < 0:
+            raise ValueError("Cache size must be non-negative")
+        self.maxsize = maxsize
+        self._evict()
+
+    def expressions(self) -> List[str]:
+        """Cached expression texts, least recently used first."""
+        return list(self._entries)
+
+    def clear(self) -> None:
+        """Drop all entries and reset the counters."""
+        self._entries.clear()
+        self.hits = self.misses = self.evictions = 0
+
+    def stats(self) -> Dict[str, int]:
+        """Return a snapshot of the cache counters."""
+        return {
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+    def _evict(self) -> None:
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, expression: str) -> bool:
+        return expression in self._entries
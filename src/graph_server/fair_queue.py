@@ -0,0 +1,177 @@
+import heapq
+import itertools
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+# Lower index runs first
+PRIORITY_CLASSES = ("interactive", "bulk")
+
+
+class TokenBucket:
+    """Allows ``rate`` events per second on average, in bursts of up to ``burst``."""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def take(self, now: float) -> bool:
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+    def full(self, now: float) -> bool:
+        return self.tokens + (now - self.updated) * self.rate >= self.burst
+
+
+class _Client:
+    """Scheduling state of one ROUTER identity."""
+
+    def __init__(self, weight: float, bucket: Optional[TokenBucket]):
+        self.weight = weight
+        self.bucket = bucket
+        # Finish tag of this client's last queued request, per priority class
+        self.last_tag = [0.0] * len(PRIORITY_CLASSES)
+        self.queued = 0
+        self.throttled = 0
+        self.rejected = 0
+
+
+class FairScheduler:
+    """Orders queued requests by priority class, then fairly across clients.
+
+    Within a class requests are served by weighted fair queuing: each gets a
+    virtual finish tag ``max(now, client's previous tag) + 1 / weight``, and the
+    smallest tag runs next. A client that floods the server therefore only
+    delays itself, while a client with a single request is served almost
+    immediately. Classes are strict: ``bulk`` runs only when no ``interactive``
+    request is waiting, and ``pop`` can be limited to some classes, e.g. to keep
+    capacity free for interactive work.
+
+    Clients may also be rate limited with a token bucket and have a cap on
+    their queued requests; both cause ``admit`` to refuse the request.
+    """
+
+    def __init__(self, max_queue_per_client: int = 256, rate: float = 0.0, burst: float = 0.0,
+                 weights: Optional[Dict[bytes, float]] = None):
+        self.max_queue_per_client = max_queue_per_client
+        # Requests per second allowed to each client; 0 disables rate limiting
+        self.rate = rate
+        self.burst = burst or max(rate, 1.0)
+        self.weights = dict(weights or {})
+        self._clients: Dict[bytes, _Client] = {}
+        self._heaps: List[List[Tuple[float, int, bytes, Any]]] = [[] for _ in PRIORITY_CLASSES]
+        self._virtual_time = [0.0] * len(PRIORITY_CLASSES)
+        self._sequence = itertools.count()
+        self._admitted = 0
+        self.throttled = 0
+        self.rejected = 0
+
+    def admit(self, client_id: bytes, item: Any, priority: str = "interactive") -> Optional[str]:
+        """Queue ``item`` for ``client_id``; return the reason if it is refused instead."""
+        now = time.monotonic()
+        client = self._client(client_id)
+        if client.bucket is not None and not client.bucket.take(now):
+            client.throttled += 1
+            self.throttled += 1
+            return "Rate limit exceeded"
+        if client.queued >= self.max_queue_per_client:
+            client.rejected += 1
+            self.rejected += 1
+            return "Server busy: too many queued requests from this client"
+
+        index = PRIORITY_CLASSES.index(priority)
+        tag = max(self._virtual_time[index], client.last_tag[index]) + 1 / client.weight
+        client.last_tag[index] = tag
+        client.queued += 1
+        heapq.heappush(self._heaps[index], (tag, next(self._sequence), client_id, item))
+
+        self._admitted += 1
+        if self._admitted % 1024 == 0:
+            self._prune(now)
+        return None
+
+    def pop(self, classes: Tuple[str, ...] = PRIORITY_CLASSES) -> Optional[Any]:
+        """Remove and return the next request from the given classes, or None if none is queued."""
+        for index, name in enumerate(PRIORITY_CLASSES):
+            heap = self._heaps[index]
+            if name not in classes or not heap:
+                continue
+            tag, _, client_id, item = heapq.heappop(heap)
+            self._virtual_time[index] = tag
+            client = self._clients[client_id]
+            client.queued -= 1
+            return item
+        return None
+
+    def drop(self, client_id: bytes) -> int:
+        """Remove every queued request of ``client_id`` and return how many there were."""
+        client = self._clients.get(client_id)
+        if client is None or not client.queued:
+            return 0
+        dropped = client.queued
+        for index, heap in enumerate(self._heaps):
+            kept = [entry for entry in heap if entry[2] != client_id]
+            if len(kept) != len(heap):
+                heapq.heapify(kept)
+                self._heaps[index] = kept
+        client.queued = 0
+        return dropped
+
+    def waiting_clients(self) -> List[bytes]:
+        """Clients with at least one queued request."""
+        return [client_id for client_id, client in self._clients.items() if client.queued]
+
+    def queued(self, priority: Optional[str] = None) -> int:
+        if priority is None:
+            return sum(len(heap) for heap in self._heaps)
+        return len(self._heaps[PRIORITY_CLASSES.index(priority)])
+
+    def stats(self, top: int = 20) -> Dict[str, Any]:
+        """Return queue depths and throttling counters, with the ``top`` deepest client queues."""
+        deepest = sorted(self._clients.items(), key=lambda pair: pair[1].queued, reverse=True)[:top]
+        return {
+            "queued": {name: len(heap) for name, heap in zip(PRIORITY_CLASSES, self._heaps)},
+            "clients": len(self._clients),
+            "throttled": self.throttled,
+            "rejected": self.rejected,
+            "queued_by_client": {
+                _label(client_id): client.queued for client_id, client in deepest if client.queued
+            },
+            "throttled_by_client": {
+                _label(client_id): client.throttled + client.rejected
+                for client_id, client in sorted(
+                    self._clients.items(), key=lambda pair: pair[1].throttled + pair[1].rejected, reverse=True
+                )[:top]
+                if client.throttled + client.rejected
+            },
+        }
+
+    def __len__(self) -> int:
+        return self.queued()
+
+    def _client(self, client_id: bytes) -> _Client:
+        client = self._clients.get(client_id)
+        if client is None:
+            bucket = TokenBucket(self.rate, self.burst) if self.rate > 0 else None
+            client = self._clients[client_id] = _Client(self.weights.get(client_id, 1.0), bucket)
+        return client
+
+    def _prune(self, now: float) -> None:
+        """Forget idle clients whose state no longer affects scheduling or rate limiting."""
+        for client_id, client in list(self._clients.items()):
+            if client.queued:
+                continue
+            if client.bucket is not None and not client.bucket.full(now):
+                continue
+            if any(tag > virtual for tag, virtual in zip(client.last_tag, self._virtual_time)):
+                continue
+            del self._clients[client_id]
+
+
+def _label(client_id: bytes) -> str:
+    return client_id.decode('ascii', errors='backslashreplace')
@@ -0,0 +1,128 @@
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import time
+from typing import Any, Dict, Optional
+
+TEXT_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+# Attributes every LogRecord has; anything else was passed through ``extra``
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+_handler: Optional["NonBlockingQueueHandler"] = None
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per line, with ``extra`` fields as top-level keys."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(record.created)) + f".{int(record.msecs):03d}Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        entry.update((key, value) for key, value in vars(record).items() if key not in _RECORD_ATTRIBUTES)
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """Hands records to a background thread without formatting them or ever blocking.
+
+    Records that arrive while the queue is full are dropped and counted.
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # The stock handler formats here, on the caller's thread; leave that to the listener
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class Sampler:
+    """Decides which hot-path records to keep, by level and by command type.
+
+    The kept fraction is the product of the rate for the record's level and the
+    rate for its command type; both default to 1.
+    """
+
+    def __init__(self, rates: Optional[Dict[str, float]] = None):
+        self.level_rates: Dict[int, float] = {}
+        self.command_rates: Dict[str, float] = {}
+        for key, rate in (rates or {}).items():
+            level = logging.getLevelName(key.upper())
+            if isinstance(level, int):
+                self.level_rates[level] = rate
+            else:
+                self.command_rates[key] = rate
+
+    def sample(self, level: int, command_type: str) -> bool:
+        rate = self.level_rates.get(level, 1.0) * self.command_rates.get(command_type, 1.0)
+        return rate >= 1.0 or random.random() < rate
+
+
+def parse_rates(value: str) -> Dict[str, float]:
+    """Parse ``key=rate`` pairs, e.g. ``INFO=0.01,compute=0.5``; keys are levels or command types."""
+    rates = {}
+    for item in filter(None, (part.strip() for part in value.split(','))):
+        key, rate = item.split('=', 1)
+        rates[key.strip()] = float(rate)
+    return rates
+
+
+def truncate(payload: Any, limit: int) -> str:
+    """Printable preview of a request payload of at most ``limit`` characters."""
+    if isinstance(payload, bytes):
+        text = payload[:limit + 1].decode('utf-8', errors='replace')
+        size = f"{len(payload)} bytes"
+    else:
+        payload = str(payload)
+        text = payload[:limit + 1]
+        size = f"{len(payload)} characters"
+    if len(text) > limit:
+        return f"{text[:limit]}... ({size})"
+    return text
+
+
+def configure_logging(level=logging.INFO, log_format: str = 'text', queue_size: int = 10000) -> None:
+    """Route the root logger through a queue drained by a background thread.
+
+    Like ``logging.basicConfig`` this leaves an application's own handlers in
+    place; calling it again only changes the level and format.
+    """
+    global _handler, _listener
+    root = logging.getLogger()
+    root.setLevel(level)
+    formatter = JSONFormatter() if log_format == 'json' else logging.Formatter(TEXT_FORMAT)
+    if _listener is not None:
+        for handler in _listener.handlers:
+            handler.setFormatter(formatter)
+        return
+    if root.handlers:
+        return
+
+    output = logging.StreamHandler()
+    output.setFormatter(formatter)
+    _handler = NonBlockingQueueHandler(queue.Queue(queue_size))
+    _listener = logging.handlers.QueueListener(_handler.queue, output, respect_handler_level=True)
+    root.addHandler(_handler)
+    _listener.start()
+    atexit.register(_listener.stop)
+
+
+def dropped_records() -> int:
+    """Records discarded because the logging queue was full."""
+    return _handler.dropped if _handler is not None else 0
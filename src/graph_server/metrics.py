@@ -0,0 +1,200 @@
+import asyncio
+import logging
+from bisect import bisect_left
+from collections import defaultdict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds in seconds, from 50us to 10s; slower observations land in +Inf
+LATENCY_BUCKETS = (
+    0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+    0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+PHASES = ("parse", "validate", "execute")
+
+Labels = Tuple[str, str]
+
+
+class Histogram:
+    """Fixed-bucket histogram; observing a value is a bisect and two additions."""
+
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket holding the ``q`` quantile (the largest bound for +Inf)."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return self.buckets[-1]
+
+    def cumulative(self) -> List[Tuple[str, int]]:
+        """``(le, count)`` pairs as Prometheus expects them."""
+        pairs = []
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            pairs.append((repr(bound), seen))
+        pairs.append(("+Inf", self.count))
+        return pairs
+
+
+class Metrics:
+    """In-process counters and latency histograms for one server.
+
+    Gauges are callables evaluated when a snapshot is taken, so keeping them
+    costs nothing on the request path.
+    """
+
+    def __init__(self):
+        # (command_type, command) -> phase -> histogram
+        self.latency: Dict[Labels, Dict[str, Histogram]] = defaultdict(
+            lambda: {phase: Histogram() for phase in PHASES}
+        )
+        self.requests: Dict[Labels, int] = defaultdict(int)
+        self.errors: Dict[str, int] = defaultdict(int)
+        self.bytes_in = 0
+        self.bytes_out = 0
+        # Replies dropped because their client stopped reading
+        self.replies_dropped = 0
+        self.gauges: Dict[str, Callable[[], float]] = {}
+        # Component name -> stats() of a cache, scheduler, executor, ...
+        self.components: Dict[str, Callable[[], Optional[Dict[str, Any]]]] = {}
+
+    def observe(self, labels: Labels, phase: str, seconds: float) -> None:
+        self.latency[labels][phase].observe(seconds)
+
+    def count_request(self, labels: Labels) -> None:
+        self.requests[labels] += 1
+
+    def count_error(self, error: BaseException) -> None:
+        self.errors[type(error).__name__] += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Return every metric as plain JSON-serializable data, latencies in milliseconds."""
+        latency = {}
+        for (command_type, command), phases in self.latency.items():
+            latency[f"{command_type}/{command}"] = {
+                phase: {
+                    "count": histogram.count,
+                    "avg_ms": histogram.sum / histogram.count * 1000 if histogram.count else 0.0,
+                    "p50_ms": histogram.quantile(0.5) * 1000,
+                    "p95_ms": histogram.quantile(0.95) * 1000,
+                    "p99_ms": histogram.quantile(0.99) * 1000,
+                }
+                for phase, histogram in phases.items()
+            }
+        snapshot = {
+            "requests": {f"{command_type}/{command}": count for (command_type, command), count in self.requests.items()},
+            "errors": dict(self.errors),
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+            "replies_dropped": self.replies_dropped,
+            "latency": latency,
+        }
+        snapshot.update({name: gauge() for name, gauge in self.gauges.items()})
+        for name, stats in self.components.items():
+            value = stats()
+            if value is not None:
+                snapshot[name] = value
+        return snapshot
+
+    def prometheus(self) -> str:
+        """Render the metrics in the Prometheus text exposition format."""
+        lines = [
+            "# TYPE graph_server_requests_total counter",
+            *(
+                f'graph_server_requests_total{{command_type="{_escape(command_type)}",command="{_escape(command)}"}} {count}'
+                for (command_type, command), count in self.requests.items()
+            ),
+            "# TYPE graph_server_errors_total counter",
+            *(f'graph_server_errors_total{{error="{_escape(error)}"}} {count}' for error, count in self.errors.items()),
+            "# TYPE graph_server_received_bytes_total counter",
+            f"graph_server_received_bytes_total {self.bytes_in}",
+            "# TYPE graph_server_sent_bytes_total counter",
+            f"graph_server_sent_bytes_total {self.bytes_out}",
+            "# TYPE graph_server_dropped_replies_total counter",
+            f"graph_server_dropped_replies_total {self.replies_dropped}",
+            "# TYPE graph_server_request_phase_seconds histogram",
+        ]
+        for (command_type, command), phases in self.latency.items():
+            for phase, histogram in phases.items():
+                labels = f'command_type="{_escape(command_type)}",command="{_escape(command)}",phase="{phase}"'
+                lines.extend(
+                    f'graph_server_request_phase_seconds_bucket{{{labels},le="{le}"}} {count}'
+                    for le, count in histogram.cumulative()
+                )
+                lines.append(f"graph_server_request_phase_seconds_sum{{{labels}}} {histogram.sum}")
+                lines.append(f"graph_server_request_phase_seconds_count{{{labels}}} {histogram.count}")
+        for name, gauge in self.gauges.items():
+            lines.append(f"# TYPE graph_server_{name} gauge")
+            lines.append(f"graph_server_{name} {gauge()}")
+        for component, stats in self.components.items():
+            for key, samples in _flatten(stats() or {}):
+                lines.append(f"# TYPE graph_server_{component}_{key} gauge")
+                lines.extend(f"graph_server_{component}_{key}{labels} {value}" for labels, value in samples)
+        return "\n".join(lines) + "\n"
+
+
+async def serve_prometheus(metrics: Metrics, host: str, port: int) -> asyncio.AbstractServer:
+    """Answer every HTTP request on ``host:port`` with the metrics in Prometheus format."""
+
+    async def respond(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            # Only the request line and headers matter; the path is ignored
+            while (await reader.readline()).strip():
+                pass
+            body = metrics.prometheus().encode()
+            writer.write(
+                b"HTTP/1.1 200 OK\r\n"
+                b"Content-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+                b"Content-Length: " + str(len(body)).encode() + b"\r\n"
+                b"Connection: close\r\n\r\n" + body
+            )
+            await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError) as e:
+            logger.debug(f"Metrics request failed: {str(e)}")
+        finally:
+            writer.close()
+
+    return await asyncio.start_server(respond, host, port)
+
+
+def _flatten(stats: Dict[str, Any]) -> List[Tuple[str, List[Tuple[str, Any]]]]:
+    """Numeric values of a stats() dict as ``(name, [(labels, value), ...])`` families.
+
+    Keys of nested dicts become ``name`` labels, except per-client breakdowns:
+    one series per client would grow without bound, so those stay in the JSON stats.
+    """
+    families = []
+    for key, value in stats.items():
+        if _numeric(value):
+            families.append((key, [("", value)]))
+        elif isinstance(value, dict) and not key.endswith("_by_client"):
+            samples = [(f'{{name="{_escape(name)}"}}', nested) for name, nested in value.items() if _numeric(nested)]
+            if samples:
+                families.append((key, samples))
+    return families
+
+
+def _escape(value: Any) -> str:
+    """Escape a label value for the Prometheus text format."""
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _numeric(value: Any) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
@@ -0,0 +1,255 @@
+import asyncio
+import errno
+import os
+import stat
+import time
+from abc import ABC, abstractmethod
+from typing import Dict, List, Optional, Tuple
+
+try:
+    import grp
+    import pwd
+except ImportError:  # Not POSIX; ls always runs as a subprocess
+    grp = pwd = None
+
+# Locales whose collation is plain byte order, so Python's sort matches ls
+C_LOCALES = {'', 'C', 'POSIX', 'C.UTF-8', 'C.utf8'}
+# Extended attributes that make ls print an ACL/security-context marker
+ACL_XATTRS = {'system.posix_acl_access', 'system.posix_acl_default', 'security.selinux'}
+# GNU ls shows the time of day for files modified within the last half Gregorian year
+SIX_MONTHS = 31556952 / 2
+COPY_CHUNK = 1 << 30
+
+
+class NativeCommand(ABC):
+    """In-process implementation of a whitelisted OS command.
+
+    ``run`` returns the text the external binary would print, or None when the
+    request turns out to need the binary after all (e.g. to report an error in
+    the binary's own words); the caller then falls back to a subprocess.
+    """
+
+    @abstractmethod
+    def supports(self, parameters: List[str]) -> bool:
+        """Whether these parameters can be handled without forking."""
+        pass
+
+    @abstractmethod
+    async def run(self, parameters: List[str]) -> Optional[str]:
+        """Run the command and return its standard output."""
+        pass
+
+
+class NativeLs(NativeCommand):
+    """``ls`` built on ``os.scandir`` for the ``-a``, ``-A``, ``-l`` and ``-1`` flags."""
+
+    FLAGS = set('aAl1')
+
+    def supports(self, parameters: List[str]) -> bool:
+        return pwd is not None and _c_collation() and self._parse(parameters) is not None
+
+    async def run(self, parameters: List[str]) -> Optional[str]:
+        show, long_format, operand = self._parse(parameters)
+        return await asyncio.to_thread(self._list, show, long_format, operand)
+
+    def _parse(self, parameters: List[str]) -> Optional[Tuple[str, bool, Optional[str]]]:
+        show = 'visible'
+        long_format = False
+        operands = []
+        for parameter in parameters:
+            if parameter.startswith('-') and parameter != '-':
+                if parameter.startswith('--') or not set(parameter[1:]) <= self.FLAGS:
+                    return None
+                for flag in parameter[1:]:
+                    if flag == 'a':
+                        show = 'all'
+                    elif flag == 'A':
+                        show = 'almost-all'
+                    elif flag == 'l':
+                        long_format = True
+            else:
+                operands.append(parameter)
+        if len(operands) > 1:
+            return None
+        return show, long_format, operands[0] if operands else None
+
+    def _list(self, show: str, long_format: bool, operand: Optional[str]) -> Optional[str]:
+        path = operand if operand is not None else '.'
+        try:
+            path_stat = os.lstat(path)
+            if stat.S_ISLNK(path_stat.st_mode):
+                return None
+            if not stat.S_ISDIR(path_stat.st_mode):
+                if long_format:
+                    return self._long_format([(operand, path, path_stat)], total=False)
+                return operand
+
+            entries = []
+            with os.scandir(path) as scan:
+                for entry in scan:
+                    if show == 'visible' and entry.name.startswith('.'):
+                        continue
+                    entries.append((entry.name, entry.path, entry.stat(follow_symlinks=False) if long_format else None))
+            if show == 'all':
+                for name in ('.', '..'):
+                    entry_path = os.path.join(path, name)
+                    entries.append((name, entry_path, os.lstat(entry_path) if long_format else None))
+
+            entries.sort(key=lambda entry: os.fsencode(entry[0]))
+            if long_format:
+                return self._long_format(entries, total=True)
+            return '\n'.join(name for name, _, _ in entries)
+        except (OSError, UnicodeError):
+            return None
+
+    def _long_format(self, entries: List[Tuple[str, str, os.stat_result]], total: bool) -> Optional[str]:
+        now = time.time()
+        users: Dict[int, Tuple[str, bool]] = {}
+        groups: Dict[int, Tuple[str, bool]] = {}
+        rows = []
+        for name, path, entry_stat in entries:
+            mode = entry_stat.st_mode
+            if stat.S_ISCHR(mode) or stat.S_ISBLK(mode) or _has_acl(path):
+                return None
+            if entry_stat.st_mtime > now:
+                now = time.time()
+            if name in ('.', '..') or not stat.S_ISLNK(mode):
+                display = name
+            else:
+                display = f"{name} -> {os.readlink(path)}"
+            rows.append((
+                stat.filemode(mode),
+                str(entry_stat.st_nlink),
+                _lookup(users, entry_stat.st_uid, lambda uid: pwd.getpwuid(uid).pw_name),
+                _lookup(groups, entry_stat.st_gid, lambda gid: grp.getgrgid(gid).gr_name),
+                str(entry_stat.st_size),
+                _format_time(entry_stat.st_mtime, now),
+                display,
+            ))
+
+        links_width = max((len(row[1]) for row in rows), default=0)
+        owner_width = max((len(row[2][0]) for row in rows), default=0)
+        group_width = max((len(row[3][0]) for row in rows), default=0)
+        size_width = max((len(row[4]) for row in rows), default=0)
+        lines = [f"total {-(-sum(entry[2].st_blocks for entry in entries) // 2)}"] if total else []
+        for mode, links, owner, group, size, mtime, display in rows:
+            lines.append(
+                f"{mode} {links:>{links_width}} {_pad(owner, owner_width)} "
+                f"{_pad(group, group_width)} {size:>{size_width}} {mtime} {display}"
+            )
+        return '\n'.join(lines)
+
+
+class NativeCp(NativeCommand):
+    """``cp SOURCE DEST`` for regular files, copied in the kernel on a worker thread."""
+
+    def supports(self, parameters: List[str]) -> bool:
+        return len(parameters) == 2 and not any(parameter.startswith('-') for parameter in parameters)
+
+    async def run(self, parameters: List[str]) -> Optional[str]:
+        source, destination = parameters
+        return await asyncio.to_thread(self._copy, source, destination)
+
+    def _copy(self, source: str, destination: str) -> Optional[str]:
+        try:
+            source_stat = os.stat(source)
+            if not stat.S_ISREG(source_stat.st_mode):
+                return None
+            if os.path.isdir(destination):
+                destination = os.path.join(destination, os.path.basename(source))
+            if os.path.islink(destination):
+                return None
+            if os.path.exists(destination):
+                destination_stat = os.stat(destination)
+                if not stat.S_ISREG(destination_stat.st_mode) or os.path.samestat(source_stat, destination_stat):
+                    return None
+
+            source_fd = os.open(source, os.O_RDONLY)
+            try:
+                # Like cp without -p: new files get the source permissions minus the umask
+                destination_fd = os.open(
+                    destination,
+                    os.O_WRONLY | os.O_CREAT | os.O_TRUNC,
+                    stat.S_IMODE(source_stat.st_mode) & 0o777
+                )
+                try:
+                    _kernel_copy(source_fd, destination_fd)
+                finally:
+                    os.close(destination_fd)
+            finally:
+                os.close(source_fd)
+        except OSError:
+            return None
+        return ''
+
+
+NATIVE_COMMANDS: Dict[str, NativeCommand] = {
+    'ls': NativeLs(),
+    'cp': NativeCp(),
+}
+
+
+def _c_collation() -> bool:
+    """Whether ls run with our environment would sort names in byte order."""
+    for variable in ('LC_ALL', 'LC_COLLATE', 'LANG'):
+        value = os.environ.get(variable)
+        if value:
+            return value in C_LOCALES
+    return True
+
+
+def _has_acl(path: str) -> bool:
+    try:
+        return not ACL_XATTRS.isdisjoint(os.listxattr(path, follow_symlinks=False))
+    except OSError:
+        return False
+
+
+def _lookup(cache: Dict[int, Tuple[str, bool]], ident: int, resolve) -> Tuple[str, bool]:
+    """Return ``(text, numeric)`` for a user or group id, as ls prints it."""
+    if ident not in cache:
+        try:
+            cache[ident] = (resolve(ident), False)
+        except KeyError:
+            cache[ident] = (str(ident), True)
+    return cache[ident]
+
+
+def _pad(value: Tuple[str, bool], width: int) -> str:
+    text, numeric = value
+    return text.rjust(width) if numeric else text.ljust(width)
+
+
+def _format_time(mtime: float, now: float) -> str:
+    if now - SIX_MONTHS < mtime < now:
+        return time.strftime('%b %e %H:%M', time.localtime(mtime))
+    return time.strftime('%b %e  %Y', time.localtime(mtime))
+
+
+def _kernel_copy(source_fd: int, destination_fd: int) -> None:
+    """Copy between descriptors with copy_file_range, then sendfile, then plain reads."""
+    if hasattr(os, 'copy_file_range'):
+        try:
+            while os.copy_file_range(source_fd, destination_fd, COPY_CHUNK):
+                pass
+            return
+        except OSError as e:
+            if e.errno not in (errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP, errno.EPERM):
+                raise
+
+    offset = os.lseek(source_fd, 0, os.SEEK_CUR)
+    try:
+        while True:
+            sent = os.sendfile(destination_fd, source_fd, offset, COPY_CHUNK)
+            if not sent:
+                return
+            offset += sent
+    except OSError as e:
+        if e.errno not in (errno.EINVAL, errno.ENOSYS, errno.ENOTSOCK):
+            raise
+
+    os.lseek(source_fd, offset, os.SEEK_SET)
+    while chunk := os.read(source_fd, 1 << 20):
+        view = memoryview(chunk)
+        while view:
+            view = view[os.write(destination_fd, view):]
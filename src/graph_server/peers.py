@@ -0,0 +1,125 @@
+import asyncio
+import functools
+import logging
+from typing import Any, Dict, List, Optional, Set
+
+import zmq
+
+from graph_server.fair_queue import FairScheduler
+from graph_server.serialization import JSON_CODEC, Codec
+
+# Sent to probe a client that tags its requests with IDs; such clients discard
+# it like any reply to a request they are not waiting for
+HEARTBEAT = {"heartbeat": True}
+
+logger = logging.getLogger(__name__)
+
+
+def configure_heartbeat(socket: zmq.Socket, interval: float, timeout: float) -> None:
+    """Have ZMQ ping the peers of ``socket`` every ``interval`` seconds and drop connections quiet for ``timeout``.
+
+    The timeout is also sent to the other side, which drops the connection if
+    this socket goes quiet. An interval of 0 leaves heartbeats off.
+    """
+    if interval <= 0:
+        return
+    socket.heartbeat_ivl = int(interval * 1000)
+    socket.heartbeat_timeout = int(timeout * 1000)
+    socket.heartbeat_ttl = int(timeout * 1000)
+
+
+class PeerMonitor:
+    """Tracks the work of each client, by ROUTER identity, and reclaims it once the client is gone.
+
+    A client is gone when the ROUTER socket, which must be in mandatory mode,
+    no longer has a route to its identity: ZMQ removes the route when the
+    connection closes or its heartbeats time out. A reply that cannot be
+    delivered reclaims the client's work straight away. Clients whose latest
+    request carried a ``request_id`` are also probed every ``interval`` seconds
+    while they have work queued or running; other clients would take a probe
+    for the reply to their request, so they are left alone.
+    """
+
+    def __init__(self, interval: float = 1.0):
+        self.interval = interval
+        self.tasks: Dict[bytes, Set[asyncio.Task]] = {}
+        # Frames each client that may be probed is sent, in the framing of its requests
+        self.probes: Dict[bytes, List[bytes]] = {}
+        self.departed = 0
+        self.dropped = 0
+        self.cancelled = 0
+
+    def track(self, client_id: bytes, task: asyncio.Task) -> None:
+        """Record ``task`` as work done for ``client_id`` until it finishes."""
+        self.tasks.setdefault(client_id, set()).add(task)
+        task.add_done_callback(lambda _: self._untrack(client_id, task))
+
+    def seen(self, client_id: bytes, codec: Optional[Codec], request: Any) -> None:
+        """Note whether ``client_id`` may be probed, judging by its latest request."""
+        if isinstance(request, dict) and "request_id" in request:
+            self.probes[client_id] = _probe(codec)
+        else:
+            self.probes.pop(client_id, None)
+
+    def reclaim(self, client_id: bytes, scheduler: FairScheduler) -> None:
+        """Drop the queued requests of a departed client and cancel its running ones."""
+        self.probes.pop(client_id, None)
+        dropped = scheduler.drop(client_id)
+        running = [
+            task for task in self.tasks.pop(client_id, ())
+            if not task.done() and task is not asyncio.current_task()
+        ]
+        for task in running:
+            task.cancel()
+        if dropped or running:
+            self.departed += 1
+            self.dropped += dropped
+            self.cancelled += len(running)
+            logger.info(
+                f"Client {client_id.decode('ascii', errors='backslashreplace')} disconnected; "
+                f"dropped {dropped} queued and cancelled {len(running)} running requests"
+            )
+
+    async def run(self, socket, scheduler: FairScheduler) -> None:
+        """Probe the clients that have work, reclaiming the work of those that are gone."""
+        while True:
+            await asyncio.sleep(self.interval)
+            busy = set(self.tasks).union(scheduler.waiting_clients())
+            for client_id in busy:
+                probe = self.probes.get(client_id)
+                if probe is not None and not await self.reachable(socket, client_id, probe):
+                    self.reclaim(client_id, scheduler)
+            # The next request of an idle client records its framing again
+            for client_id in set(self.probes).difference(busy):
+                del self.probes[client_id]
+
+    async def reachable(self, socket, client_id: bytes, probe: List[bytes]) -> bool:
+        try:
+            await socket.send_multipart([client_id] + probe, flags=zmq.NOBLOCK)
+        except zmq.ZMQError as e:
+            # EAGAIN only means the client is slow to read
+            return e.errno != zmq.EHOSTUNREACH
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        """Return the number of clients with work and the work reclaimed from departed ones."""
+        return {
+            "clients": len(self.tasks),
+            "departed": self.departed,
+            "dropped_requests": self.dropped,
+            "cancelled_requests": self.cancelled,
+        }
+
+    def _untrack(self, client_id: bytes, task: asyncio.Task) -> None:
+        tasks = self.tasks.get(client_id)
+        if tasks is not None:
+            tasks.discard(task)
+            if not tasks:
+                del self.tasks[client_id]
+
+
+@functools.lru_cache(maxsize=None)
+def _probe(codec: Optional[Codec]) -> List[bytes]:
+    if codec is None:
+        return [JSON_CODEC.encode(HEARTBEAT)]
+    return list(codec.encode_reply(HEARTBEAT, 0))
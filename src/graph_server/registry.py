@@ -0,0 +1,150 @@
+import keyword
+import math
+from typing import Any, Callable, Dict, Optional, Set
+
+from graph_server.commands import BatchCommand, Command, ComputeCommand, OSCommand
+from graph_server.exceptions import ValidationError
+
+# Validates a request of one command type and builds its command in the same
+# pass; None means the server answers the request itself
+Builder = Callable[[Dict[str, Any], "CommandRegistry"], Optional[Command]]
+
+# Filled in at import time by ``register``
+BUILDERS: Dict[str, Builder] = {}
+# Command types a batch may contain
+BATCHABLE: Set[str] = set()
+# Optional fields every request may carry, in seconds
+_TIME_FIELDS = ("timeout", "deadline")
+
+
+def register(command_type: str, batchable: bool = False) -> Callable[[Builder], Builder]:
+    """Register the decorated function as the builder of ``command_type`` requests.
+
+    The builder raises ValidationError on the first malformed field it finds.
+    Registering a type again replaces its builder.
+    """
+    def decorator(builder: Builder) -> Builder:
+        BUILDERS[command_type] = builder
+        if batchable:
+            BATCHABLE.add(command_type)
+        else:
+            BATCHABLE.discard(command_type)
+        return builder
+    return decorator
+
+
+class CommandRegistry:
+    """Turns a decoded request into its command, validating it on the way.
+
+    The command type is looked up first, so a request of an unknown type is
+    rejected before any of its other fields are looked at, and a batch stops
+    at its first malformed request without building the rest.
+    """
+
+    def __init__(self, max_batch_size: int = 256):
+        self.max_batch_size = max_batch_size
+
+    def parse(self, request: Any) -> Optional[Command]:
+        """Validate ``request`` and return its command, or None for requests the server answers itself."""
+        if not isinstance(request, dict):
+            raise ValidationError("Request must be a JSON object")
+        if "command_type" not in request:
+            raise ValidationError("Missing 'command_type' in request")
+        command_type = request["command_type"]
+        builder = BUILDERS.get(command_type) if isinstance(command_type, str) else None
+        if builder is None:
+            raise ValidationError(f"Invalid command_type: {request['command_type']}")
+        # bool is an int, but True is no request id
+        if "request_id" in request and type(request["request_id"]) not in (str, int):
+            raise ValidationError("'request_id' must be a string or an integer")
+        for field in _TIME_FIELDS:
+            value = request.get(field)
+            # json.loads accepts NaN and Infinity, which every comparison lets through
+            if field in request and (type(value) not in (int, float) or not math.isfinite(value) or value <= 0):
+                raise ValidationError(f"'{field}' must be a positive number of seconds")
+        return builder(request, self)
+
+
+@register("os", batchable=True)
+def _os_command(request: Dict[str, Any], registry: CommandRegistry) -> Command:
+    if "command_name" not in request:
+        raise ValidationError("Missing 'command_name' for OS command")
+    if not isinstance(request["command_name"], str):
+        raise ValidationError("'command_name' must be a string")
+    parameters = request.get("parameters", [])
+    if not isinstance(parameters, list):
+        raise ValidationError("'parameters' must be a list")
+    if not all(isinstance(parameter, str) for parameter in parameters):
+        raise ValidationError("'parameters' must contain only strings")
+    if not isinstance(request.get("stream", False), bool):
+        raise ValidationError("'stream' must be a boolean")
+    return OSCommand(request["command_name"], parameters)
+
+
+@register("compute", batchable=True)
+def _compute_command(request: Dict[str, Any], registry: CommandRegistry) -> Command:
+    if "expression" not in request:
+        raise ValidationError("Missing 'expression' for compute command")
+    if not isinstance(request["expression"], str):
+        raise ValidationError("'expression' must be a string")
+    if request.get("stream"):
+        raise ValidationError("'stream' is only supported for OS commands")
+    variables = request.get("variables")
+    if "variables" in request:
+        _validate_variables(variables)
+    return ComputeCommand(request["expression"], variables)
+
+
+@register("batch")
+def _batch_command(request: Dict[str, Any], registry: CommandRegistry) -> Command:
+    items = request.get("requests")
+    if not isinstance(items, list) or not items:
+        raise ValidationError("'requests' must be a non-empty list for batch command")
+    if len(items) > registry.max_batch_size:
+        raise ValidationError(f"A batch may hold at most {registry.max_batch_size} requests")
+    concurrency = request.get("concurrency", 1)
+    if type(concurrency) is not int or concurrency <= 0:
+        raise ValidationError("'concurrency' must be a positive integer")
+    ordered = request.get("ordered", True)
+    if not isinstance(ordered, bool):
+        raise ValidationError("'ordered' must be a boolean")
+    if request.get("stream"):
+        raise ValidationError("'stream' is only supported for OS commands")
+
+    commands = []
+    for index, item in enumerate(items):
+        try:
+            if isinstance(item, dict) and isinstance(item.get("command_type"), str) \
+                    and item["command_type"] not in BATCHABLE:
+                raise ValidationError(f"Invalid command_type: {item['command_type']}")
+            command = registry.parse(item)
+            if item.get("stream"):
+                raise ValidationError("'stream' is not supported in a batch")
+        except ValidationError as e:
+            raise ValidationError(f"Invalid batch request {index}: {str(e)}")
+        commands.append(command)
+    return BatchCommand(commands, request.get("concurrency"), ordered)
+
+
+@register("stats")
+@register("ping")
+def _server_command(request: Dict[str, Any], registry: CommandRegistry) -> None:
+    # Answered by the server from its own state
+    return None
+
+
+def _validate_variables(variables: Any) -> None:
+    if not isinstance(variables, dict) or not variables:
+        raise ValidationError("'variables' must be a non-empty object")
+    rows = None
+    for name, values in variables.items():
+        if not isinstance(name, str) or not name.isidentifier() or keyword.iskeyword(name):
+            raise ValidationError(f"Invalid variable name: {name}")
+        if not isinstance(values, list) or not values:
+            raise ValidationError(f"Variable '{name}' must be a non-empty list")
+        if rows is None:
+            rows = len(values)
+        elif len(values) != rows:
+            raise ValidationError("All variables must have the same number of values")
+        if not all(type(value) in (int, float) for value in values):
+            raise ValidationError(f"Variable '{name}' must contain only numbers")
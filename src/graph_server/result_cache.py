@@ -0,0 +1,164 @@
+import os
+import sys
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+# Commands that only read the filesystem; anything else is never cached
+READ_ONLY_COMMANDS = frozenset({'ls', 'dir'})
+# Changes this close to the listing may share its mtime, so such listings aren't cached
+RACY_WINDOW_NS = 10_000_000
+
+CacheKey = Tuple[str, Tuple[str, ...]]
+
+
+class CachedResult:
+    """Output of a read-only command and the mtimes of the paths it listed."""
+
+    def __init__(self, result: str, validators: Dict[str, int], expires: float):
+        self.result = result
+        self.validators = validators
+        self.expires = expires
+        self.size = sys.getsizeof(result)
+
+
+class ResultCache:
+    """Bounded TTL cache of read-only OS command output.
+
+    An entry is dropped when it expires, when the mtime of a path it listed
+    changes, or when a copy writes into one of those paths. Changes that don't
+    touch a listed path's own mtime, such as a file inside a listed directory
+    growing, are only picked up once the entry expires.
+    """
+
+    def __init__(self, ttl: float = 0.0, max_bytes: int = 16 * 1024 * 1024):
+        # Seconds an entry stays valid; 0 disables the cache
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[CacheKey, CachedResult]" = OrderedDict()
+        # Absolute path -> keys of the entries that listed it
+        self._paths: Dict[str, Set[CacheKey]] = {}
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.expirations = 0
+        self.invalidations = 0
+        self.evictions = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0 and self.max_bytes > 0
+
+    def cacheable(self, command_name: str) -> bool:
+        return self.enabled and command_name in READ_ONLY_COMMANDS
+
+    def get(self, command_name: str, parameters: List[str]) -> Optional[str]:
+        """Return the cached output of the command if it is still valid."""
+        key = (command_name, tuple(parameters))
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        if entry.expires <= time.monotonic():
+            self.expirations += 1
+            self._remove(key)
+            self.misses += 1
+            return None
+        if _mtimes(entry.validators) != entry.validators:
+            self.invalidations += 1
+            self._remove(key)
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry.result
+
+    def snapshot(self, parameters: List[str]) -> Dict[str, int]:
+        """Record the mtimes of the paths a command will list; call before running it."""
+        return _mtimes(os.path.abspath(path) for path in _operands(parameters) or ['.'])
+
+    def put(self, command_name: str, parameters: List[str], result: str, validators: Dict[str, int]) -> None:
+        """Store the output of a command run after ``snapshot`` returned ``validators``."""
+        # A path that changed while the command ran, or might still change within
+        # its mtime granularity, could make the output stale without changing its mtime
+        racy = time.time_ns() - RACY_WINDOW_NS
+        if any(mtime < 0 or mtime > racy for mtime in validators.values()) or _mtimes(validators) != validators:
+            return
+        entry = CachedResult(result, validators, time.monotonic() + self.ttl)
+        if entry.size > self.max_bytes:
+            return
+        key = (command_name, tuple(parameters))
+        self._remove(key)
+        self._entries[key] = entry
+        self.bytes += entry.size
+        for path in validators:
+            self._paths.setdefault(path, set()).add(key)
+        while self.bytes > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+
+    def invalidate_copy(self, parameters: List[str]) -> None:
+        """Drop entries listing the destination of ``cp``/``copy`` with these parameters."""
+        operands = _operands(parameters)
+        if len(operands) < 2:
+            return
+        destination = os.path.abspath(operands[-1])
+        affected = {destination, os.path.dirname(destination)}
+        affected.update(os.path.join(destination, os.path.basename(source)) for source in operands[:-1])
+        for path in affected:
+            for key in list(self._paths.get(path, ())):
+                self.invalidations += 1
+                self._remove(key)
+
+    def clear(self) -> None:
+        """Drop all entries and reset the counters."""
+        self._entries.clear()
+        self._paths.clear()
+        self.bytes = 0
+        self.hits = self.misses = self.expirations = self.invalidations = self.evictions = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """Return a snapshot of the cache counters."""
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "bytes": self.bytes,
+            "max_bytes": self.max_bytes,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+            "evictions": self.evictions,
+        }
+
+    def _remove(self, key: CacheKey) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        self.bytes -= entry.size
+        for path in entry.validators:
+            keys = self._paths.get(path)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._paths[path]
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+def _operands(parameters: List[str]) -> List[str]:
+    return [parameter for parameter in parameters if not parameter.startswith('-')]
+
+
+def _mtimes(paths: Iterable[str]) -> Dict[str, int]:
+    """Map each path to its mtime in nanoseconds, or -1 if it can't be stat'ed."""
+    mtimes = {}
+    for path in paths:
+        try:
+            mtimes[path] = os.stat(path).st_mtime_ns
+        except OSError:
+            mtimes[path] = -1
+    return mtimes
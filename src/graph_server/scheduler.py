@@ -0,0 +1,96 @@
+import asyncio
+from collections import defaultdict, deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Deque, Dict, Optional
+
+from graph_server.exceptions import ServerBusyError
+
+
+class SubprocessScheduler:
+    """Bounds concurrent subprocesses per command name, with a bounded wait queue.
+    
+    Requests beyond a command's limit wait in FIFO order; once ``max_queue`` of
+    them are waiting, further requests are rejected with ServerBusyError instead
+    of being accepted.
+    """
+    
+    def __init__(self, default_limit: int = 8, limits: Optional[Dict[str, int]] = None,
+                 max_queue: int = 64):
+        self.default_limit = default_limit
+        self.limits = dict(limits or {})
+        self.max_queue = max_queue
+        self._running: Dict[str, int] = defaultdict(int)
+        self._waiters: Dict[str, Deque[asyncio.Future]] = defaultdict(deque)
+        self.started = 0
+        self.rejected = 0
+        self.queued = 0
+        self.queue_time_total = 0.0
+        self.queue_time_max = 0.0
+    
+    def limit_for(self, command_name: str) -> int:
+        return self.limits.get(command_name, self.default_limit)
+    
+    @asynccontextmanager
+    async def slot(self, command_name: str) -> AsyncIterator[None]:
+        """Hold one of ``command_name``'s subprocess slots for the duration of the block."""
+        await self.acquire(command_name)
+        try:
+            yield
+        finally:
+            self.release(command_name)
+    
+    async def acquire(self, command_name: str) -> None:
+        waiters = self._waiters[command_name]
+        if not waiters and self._running[command_name] < self.limit_for(command_name):
+            self._running[command_name] += 1
+            self.started += 1
+            return
+        
+        if len(waiters) >= self.max_queue:
+            self.rejected += 1
+            raise ServerBusyError(
+                f"Server busy: too many pending '{command_name}' commands",
+                command_name
+            )
+        
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        waiters.append(future)
+        queued_at = loop.time()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # The slot was handed over just before cancellation; pass it on
+                self.release(command_name)
+            elif future in waiters:
+                waiters.remove(future)
+            raise
+        
+        waited = loop.time() - queued_at
+        self.started += 1
+        self.queued += 1
+        self.queue_time_total += waited
+        self.queue_time_max = max(self.queue_time_max, waited)
+    
+    def release(self, command_name: str) -> None:
+        waiters = self._waiters[command_name]
+        while waiters:
+            future = waiters.popleft()
+            if not future.done():
+                # Hand the slot over directly; the running count stays the same
+                future.set_result(None)
+                return
+        self._running[command_name] -= 1
+    
+    def stats(self) -> Dict[str, Any]:
+        """Return a snapshot of running/waiting counts and queue-time metrics."""
+        return {
+            "running": {name: count for name, count in self._running.items() if count},
+            "waiting": {name: len(waiters) for name, waiters in self._waiters.items() if waiters},
+            "started": self.started,
+            "rejected": self.rejected,
+            "queued": self.queued,
+            "queue_time_avg": self.queue_time_total / self.queued if self.queued else 0.0,
+            "queue_time_max": self.queue_time_max,
+        }
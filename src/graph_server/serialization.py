@@ -0,0 +1,197 @@
+import json
+import zlib
+from abc import ABC, abstractmethod
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+
+from graph_server.exceptions import DecodeError
+
+try:
+    import msgpack
+except ImportError:  # Only the JSON codec is available
+    msgpack = None
+
+
+class Compressor(ABC):
+    """Compresses payloads; named in header frames after the codec."""
+    
+    name: str
+    
+    @abstractmethod
+    def compress(self, payload: bytes) -> bytes:
+        pass
+    
+    @abstractmethod
+    def decompress(self, payload: bytes) -> bytes:
+        """Restore ``payload``, raising DecodeError if it is malformed or too large."""
+        pass
+
+
+class ZlibCompressor(Compressor):
+    """zlib (deflate) at a fast level; repetitive output such as listings shrinks several times."""
+    
+    name = "zlib"
+    
+    def __init__(self, level: int = 1, max_size: int = 256 * 1024 * 1024):
+        self.level = level
+        # Refuse payloads that would expand beyond this, e.g. compression bombs
+        self.max_size = max_size
+    
+    def compress(self, payload: bytes) -> bytes:
+        return zlib.compress(payload, self.level)
+    
+    def decompress(self, payload: bytes) -> bytes:
+        decompressor = zlib.decompressobj()
+        try:
+            data = decompressor.decompress(payload, self.max_size)
+        except zlib.error as e:
+            raise DecodeError(str(e)) from e
+        if decompressor.unconsumed_tail:
+            raise DecodeError(f"Decompressed payload exceeds {self.max_size} bytes")
+        return data
+
+
+COMPRESSORS: Dict[str, Compressor] = {ZlibCompressor.name: ZlibCompressor()}
+
+
+class Codec(ABC):
+    """Serializes messages to and from wire payloads.
+    
+    Clients pick a codec by sending its ``name`` in a header frame before the
+    payload; messages without a header frame are plain JSON.
+    """
+    
+    name: str
+    label: str
+    # Compression the sender accepts on replies; see NegotiatedCodec
+    accept: Optional[Compressor] = None
+    
+    @property
+    def header(self) -> bytes:
+        return self.name.encode()
+    
+    @abstractmethod
+    def encode(self, message: Any) -> bytes:
+        """Serialize ``message`` into a payload."""
+        pass
+    
+    @abstractmethod
+    def decode(self, payload: bytes) -> Any:
+        """Deserialize ``payload``, which may be any bytes-like object, raising DecodeError if it is malformed."""
+        pass
+    
+    def encode_reply(self, message: Any, compress_min_size: int = 0) -> Tuple[bytes, bytes]:
+        """Header frame and payload of a reply to a request that used this codec."""
+        return self.header, self.encode(message)
+
+
+class JSONCodec(Codec):
+    """UTF-8 JSON, the default and legacy codec."""
+    
+    name = "json"
+    label = "JSON"
+    
+    def encode(self, message: Any) -> bytes:
+        return json.dumps(message).encode()
+    
+    def decode(self, payload: bytes) -> Any:
+        if not isinstance(payload, (str, bytes, bytearray)):
+            # Straight from the buffer to text, rather than through a bytes copy
+            try:
+                payload = str(payload, 'utf-8')
+            except UnicodeDecodeError as e:
+                raise DecodeError(str(e)) from e
+        try:
+            return json.loads(payload)
+        except (ValueError, RecursionError) as e:
+            # RecursionError: nested deeper than the interpreter can parse
+            raise DecodeError(str(e) or type(e).__name__) from e
+
+
+class MsgpackCodec(Codec):
+    """MessagePack, a compact binary encoding of the same message structure."""
+    
+    name = "msgpack"
+    label = "MessagePack"
+    
+    def encode(self, message: Any) -> bytes:
+        return msgpack.packb(message, use_bin_type=True)
+    
+    def decode(self, payload: bytes) -> Any:
+        try:
+            return msgpack.unpackb(payload, raw=False)
+        except (ValueError, TypeError, RecursionError, msgpack.UnpackException) as e:
+            raise DecodeError(str(e)) from e
+
+
+class NegotiatedCodec(Codec):
+    """A codec combined with compression, as named by a header frame.
+    
+    ``json+zlib`` marks a zlib-compressed payload, and ``json;zlib`` a request
+    whose sender accepts zlib-compressed replies; the two combine as
+    ``json+zlib;zlib``. Replies at least ``compress_min_size`` bytes long are
+    compressed with the accepted compression.
+    """
+    
+    def __init__(self, codec: Codec, compression: Optional[Compressor] = None,
+                 accept: Optional[Compressor] = None):
+        self.codec = codec
+        self.compression = compression
+        self.accept = accept
+        self.name = codec.name
+        self.label = codec.label
+    
+    @property
+    def header(self) -> bytes:
+        header = self.name
+        if self.compression is not None:
+            header += f"+{self.compression.name}"
+        if self.accept is not None:
+            header += f";{self.accept.name}"
+        return header.encode()
+    
+    def encode(self, message: Any) -> bytes:
+        payload = self.codec.encode(message)
+        return payload if self.compression is None else self.compression.compress(payload)
+    
+    def decode(self, payload: bytes) -> Any:
+        if self.compression is not None:
+            payload = self.compression.decompress(payload)
+        return self.codec.decode(payload)
+    
+    def encode_reply(self, message: Any, compress_min_size: int = 0) -> Tuple[bytes, bytes]:
+        payload = self.codec.encode(message)
+        if self.accept is None or not compress_min_size or len(payload) < compress_min_size:
+            return self.codec.header, payload
+        return f"{self.name}+{self.accept.name}".encode(), self.accept.compress(payload)
+
+
+JSON_CODEC = JSONCodec()
+
+CODECS: Dict[str, Codec] = {JSON_CODEC.name: JSON_CODEC}
+if msgpack is not None:
+    CODECS[MsgpackCodec.name] = MsgpackCodec()
+
+
+@lru_cache(maxsize=64)
+def get_codec(header: bytes) -> Optional[Codec]:
+    """Return the codec named by a header frame, or None if it or its compression is not available."""
+    name, _, accept = header.decode('ascii', errors='replace').partition(';')
+    name, _, compression = name.partition('+')
+    codec = CODECS.get(name)
+    if codec is None or not (compression or accept):
+        return codec
+    if any(part and part not in COMPRESSORS for part in (compression, accept)):
+        return None
+    return NegotiatedCodec(codec, COMPRESSORS.get(compression), COMPRESSORS.get(accept))
+
+
+def decode_reply(frames: List[Any]) -> Any:
+    """Decode a reply received as ZMQ frames with ``copy=False``, reading the payload in place.
+    
+    Replies are ``[payload]`` in the legacy JSON framing, else ``[header, payload]``.
+    """
+    codec = JSON_CODEC if len(frames) == 1 else get_codec(frames[0].bytes)
+    if codec is None:
+        raise DecodeError(f"Unsupported codec: {frames[0].bytes.decode('ascii', errors='replace')}")
+    return codec.decode(frames[-1].buffer)
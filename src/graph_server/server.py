@@ -1,116 +1,758 @@
 import asyncio
+import codecs
+import contextlib
 import json
 import logging
 import os
+import signal
+import tempfile
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
 
 import zmq.asyncio
-from dotenv import load_dotenv
 
-from graph_server.command_factory import CommandFactory
-from graph_server.exceptions import CommandError
-from graph_server.validators import JSONRequestValidator
+from graph_server.commands import BatchCommand, ComputeCommand, OSCommand, preload
+from graph_server.cost import CostEstimator
+from graph_server.exceptions import CommandError, DeadlineExceededError, DecodeError, ReplyStalledError
+from graph_server.executor import ComputeExecutor
+from graph_server.fair_queue import PRIORITY_CLASSES, FairScheduler
+from graph_server.log import Sampler, configure_logging, dropped_records, parse_rates, truncate
+from graph_server.metrics import Metrics, serve_prometheus
+from graph_server.native import NATIVE_COMMANDS
+from graph_server.peers import PeerMonitor, configure_heartbeat
+from graph_server.registry import BUILDERS, CommandRegistry
+from graph_server.result_cache import ResultCache
+from graph_server.scheduler import SubprocessScheduler
+from graph_server.serialization import JSON_CODEC, Codec, get_codec
+from graph_server.single_flight import SingleFlight
 
-load_dotenv()
+class Reply:
+    """Sends the replies to one request, framed and encoded the way the request was."""
+    
+    # Payloads at least this long are compressed if the requester accepts it; 0 never compresses
+    compress_min_size = 65536
+    # Longest a reply waits while the requester's queue is full before it is dropped; 0 never waits
+    send_timeout = 5.0
+    
+    def __init__(self, socket, msg_id: bytes, codec: Optional[Codec] = None,
+                 send_timeout: Optional[float] = None):
+        self.socket = socket
+        self.msg_id = msg_id
+        self.codec = codec
+        if send_timeout is not None:
+            self.send_timeout = send_timeout
+        # Echoed in every reply once the request has been decoded
+        self.request_id = None
+        self.sent_bytes = 0
+        # Set once a reply could not be routed because the client has gone
+        self.unreachable = False
+        # Replies dropped because the requester stopped reading
+        self.dropped = 0
+    
+    def frames(self, message: Dict[str, Any]) -> List[bytes]:
+        """Encode ``message`` into the frames of a reply to the requester."""
+        if self.request_id is not None:
+            message = {**message, "request_id": self.request_id}
+        if self.codec is None:
+            return [self.msg_id, JSON_CODEC.encode(message)]
+        header, payload = self.codec.encode_reply(message, self.compress_min_size)
+        return [self.msg_id, header, payload]
+    
+    async def send(self, message: Dict[str, Any]) -> None:
+        """Send ``message``, waiting up to ``send_timeout`` while the requester's queue is full.
+        
+        A message that still doesn't fit is dropped, and so is every later one
+        to the same request: the requester has stopped reading.
+        """
+        if self.dropped:
+            self.dropped += 1
+            return
+        frames = self.frames(message)
+        loop = asyncio.get_running_loop()
+        give_up = loop.time() + self.send_timeout
+        delay = 0.001
+        while True:
+            try:
+                # Hand the payload to ZMQ without copying it; pyzmq still copies frames
+                # below the socket's copy_threshold, where that is cheaper
+                await self.socket.send_multipart(frames, flags=zmq.NOBLOCK, copy=False)
+                break
+            except zmq.Again:
+                if loop.time() >= give_up:
+                    self.dropped += 1
+                    return
+                # A ROUTER can't wait for one client's queue to drain, so poll it
+                await asyncio.sleep(min(delay, give_up - loop.time()))
+                delay = min(delay * 2, 0.05)
+            except zmq.ZMQError as e:
+                if e.errno != zmq.EHOSTUNREACH:
+                    raise
+                self.unreachable = True
+                return
+        self.sent_bytes += len(frames[-1])
 
 class ZMQServer:
     """Main server class"""
     
-    def __init__(self, log_level=logging.INFO):
+    def __init__(self, log_level=logging.INFO, bind_address: Optional[str] = None):
+        # Startup phases are timed from here
+        self._created = time.perf_counter()
         host = os.getenv('ZMQ_SERVER_HOST', '127.0.0.1')
         port = os.getenv('ZMQ_SERVER_PORT', '5555')
-        self.bind_address = f"tcp://{host}:{port}"
-        self.validator = JSONRequestValidator()
-        self.command_factory = CommandFactory()
+        self.bind_address = bind_address or f"tcp://{host}:{port}"
+        self.compute_executor = self._configure_compute()
+        self._configure_os_commands()
+        # Stop reading frames beyond this many in-flight requests so ZMQ's
+        # high-water marks push back on clients
+        self.max_inflight = int(os.getenv('MAX_INFLIGHT_REQUESTS', '1024'))
+        self.rcvhwm = int(os.getenv('ZMQ_RCVHWM', '1000'))
+        self.sndhwm = int(os.getenv('ZMQ_SNDHWM', '1000'))
+        self._configure_fair_queue()
+        # ZMQ heartbeats close connections to clients that vanished without closing them
+        self.heartbeat_interval = float(os.getenv('HEARTBEAT_INTERVAL', '5'))
+        self.heartbeat_timeout = float(os.getenv('HEARTBEAT_TIMEOUT', '15'))
+        # How often clients with work are checked for having disconnected; 0 disables it
+        self.peers = PeerMonitor(float(os.getenv('PEER_CHECK_INTERVAL', '1')))
+        Reply.compress_min_size = int(os.getenv('COMPRESS_MIN_SIZE', '65536'))
+        Reply.send_timeout = float(os.getenv('REPLY_SEND_TIMEOUT', '5'))
+        self.stream_chunk_size = int(os.getenv('STREAM_CHUNK_SIZE', '65536'))
+        # Timeout for requests that don't set one, and the longest any request may run (0: no limit)
+        self.default_timeout = float(os.getenv('REQUEST_TIMEOUT', '60'))
+        self.max_timeout = float(os.getenv('REQUEST_TIMEOUT_MAX', '600'))
+        # How long shutdown waits for requests in progress before cancelling them
+        self.shutdown_grace = float(os.getenv('SHUTDOWN_GRACE_PERIOD', '10'))
+        # Share one execution among concurrent identical side-effect free requests
+        self.coalesce_requests = os.getenv('COALESCE_REQUESTS', '1') != '0'
+        self.single_flight = SingleFlight()
+        # Serve Prometheus metrics over HTTP on this port; 0 disables it
+        self.metrics_host = os.getenv('METRICS_HOST', '127.0.0.1')
+        self.metrics_port = int(os.getenv('METRICS_PORT', '0'))
+        # Start the compute workers, a first subprocess and the expression cache before reporting ready
+        self.warm_start = os.getenv('WARM_START', '0') != '0'
+        # Expressions compiled while warming up, saved again on shutdown
+        self.warm_snapshot = os.getenv('WARM_SNAPSHOT', '')
+        # Written once the server is ready for requests and removed on shutdown
+        self.ready_file = os.getenv('READY_FILE', '')
+        # Milliseconds spent in each startup phase
+        self.startup: Dict[str, float] = {}
+        # Largest batch request accepted, and how many of its commands run at once (0: all)
+        self.registry = CommandRegistry(max_batch_size=int(os.getenv('BATCH_MAX_SIZE', '256')))
+        BatchCommand.max_concurrency = int(os.getenv('BATCH_MAX_CONCURRENCY', '16'))
         self.is_running = False
         self.tasks = set()  # Track running tasks
+        self.bulk_tasks = set()
+        self.metrics = self._create_metrics()
         
-        # Configure logging
-        logging.basicConfig(
-            level=log_level,
-            format='%(asctime)s - %(levelname)s - %(message)s'
+        # Configure logging; records are written by a background thread
+        configure_logging(
+            log_level,
+            log_format=os.getenv('LOG_FORMAT', 'text'),
+            queue_size=int(os.getenv('LOG_QUEUE_SIZE', '10000'))
         )
         self.logger = logging.getLogger(__name__)
+        # One record per request, sampled by level and command type
+        self.request_logger = logging.getLogger('graph_server.requests')
+        self.log_sampler = Sampler(parse_rates(os.getenv('LOG_SAMPLE_RATES', '')))
+        self.log_payload_max = int(os.getenv('LOG_PAYLOAD_MAX', '256'))
+        self._startup_phase("configure", self._created)
 
-    async def handle_request(self, msg_id: bytes, request_json: str, socket) -> None:
-        """Process a single client request."""
+    def _configure_compute(self) -> Optional[ComputeExecutor]:
+        """Apply compute settings and build the executor for heavy expressions."""
+        compute_settings = (
+            int(os.getenv('COMPUTE_CACHE_SIZE', '4096')),
+            CostEstimator(
+                max_nodes=int(os.getenv('COMPUTE_MAX_NODES', '10000')),
+                max_depth=int(os.getenv('COMPUTE_MAX_DEPTH', '200')),
+                max_result_bits=float(os.getenv('COMPUTE_MAX_RESULT_BITS', '0')) or None,
+                max_work=float(os.getenv('COMPUTE_MAX_WORK', '10000000'))
+            )
+        )
+        ComputeCommand.configure(*compute_settings)
+        compute_workers = int(os.getenv('COMPUTE_WORKERS', '2'))
+        if compute_workers <= 0:
+            return None
+        return ComputeExecutor(
+            max_workers=compute_workers,
+            task_timeout=float(os.getenv('COMPUTE_TASK_TIMEOUT', '10')),
+            max_tasks_per_child=int(os.getenv('COMPUTE_MAX_TASKS_PER_CHILD', '100')) or None,
+            inline_max_work=int(os.getenv('COMPUTE_INLINE_MAX_WORK', '100000')),
+            initializer=ComputeCommand.configure,
+            initargs=compute_settings
+        )
+
+    def _configure_os_commands(self) -> None:
+        """Apply subprocess limits, select in-process implementations and set up the result cache."""
+        native = set(filter(None, os.getenv('OS_NATIVE_COMMANDS', 'ls,cp').split(',')))
+        OSCommand.native_commands = {
+            name: implementation for name, implementation in NATIVE_COMMANDS.items() if name in native
+        }
+        OSCommand.scheduler = SubprocessScheduler(
+            default_limit=int(os.getenv('OS_COMMAND_CONCURRENCY', '8')),
+            limits=_parse_limits(os.getenv('OS_COMMAND_LIMITS', '')),
+            max_queue=int(os.getenv('OS_COMMAND_QUEUE', '64'))
+        )
+        OSCommand.result_cache = ResultCache(
+            ttl=float(os.getenv('OS_RESULT_CACHE_TTL', '0')),
+            max_bytes=int(os.getenv('OS_RESULT_CACHE_BYTES', '16777216'))
+        )
+
+    def _configure_fair_queue(self) -> None:
+        """Set up per-client fair queuing, rate limits and priority classes."""
+        self.fair_queue = FairScheduler(
+            max_queue_per_client=int(os.getenv('CLIENT_QUEUE_LIMIT', '256')),
+            rate=float(os.getenv('RATE_LIMIT_PER_CLIENT', '0')),
+            burst=float(os.getenv('RATE_LIMIT_BURST', '0')),
+            weights={
+                client.encode(): weight
+                for client, weight in _parse_limits(os.getenv('CLIENT_WEIGHTS', ''), float).items()
+            }
+        )
+        # Stop reading from the socket once this many requests wait to be scheduled
+        self.max_queued = int(os.getenv('MAX_QUEUED_REQUESTS', '4096'))
+        # In-flight slots bulk requests may take; the rest stay free for interactive ones
+        self.bulk_max_inflight = int(os.getenv('BULK_MAX_INFLIGHT', '0')) or max(1, self.max_inflight * 3 // 4)
+        self.interactive_commands = set(filter(None, os.getenv('INTERACTIVE_OS_COMMANDS', 'ls,dir').split(',')))
+
+    def _create_metrics(self) -> Metrics:
+        metrics = Metrics()
+        metrics.gauges.update({
+            "in_flight_requests": lambda: len(self.tasks),
+            "in_flight_bulk_requests": lambda: len(self.bulk_tasks),
+            "running_subprocesses": lambda: sum(OSCommand.scheduler.stats()["running"].values()),
+            "queued_subprocesses": lambda: sum(OSCommand.scheduler.stats()["waiting"].values()),
+            "dropped_log_records": dropped_records,
+        })
+        metrics.components.update({
+            "scheduler": lambda: OSCommand.scheduler.stats(),
+            "result_cache": lambda: OSCommand.result_cache.stats(),
+            "expression_cache": lambda: ComputeCommand.cache.stats(),
+            "estimator": lambda: ComputeCommand.estimator.stats(),
+            "executor": lambda: self.compute_executor.stats() if self.compute_executor else None,
+            "single_flight": self.single_flight.stats,
+            "fair_queue": self.fair_queue.stats,
+            "peers": self.peers.stats,
+            "startup": lambda: self.startup,
+        })
+        return metrics
+
+    async def handle_request(self, msg_id: bytes, request_data: Union[str, bytes], socket,
+                             codec: Optional[Codec] = None, received_at: Optional[float] = None,
+                             request: Any = None) -> None:
+        """Process a single client request.
+        
+        ``codec`` is the codec negotiated through a header frame. Without one the
+        request and its replies use the legacy framing: a bare JSON payload.
+        ``received_at`` is the event loop time the request arrived, from which
+        its timeout is measured; it defaults to now. ``request`` is the payload
+        if it was already decoded.
+        """
+        loop = asyncio.get_running_loop()
+        received_at = loop.time() if received_at is None else received_at
+        reply = Reply(socket, msg_id, codec)
+        labels = ("invalid", "-")
+        received = started = time.perf_counter()
+        timings: Dict[str, float] = {}
+        error: Optional[Exception] = None
+        self.metrics.bytes_in += len(request_data)
         try:
             # Parse and validate request
-            request = json.loads(request_json)
-            self.validator.validate(request)
+            try:
+                if request is None:
+                    request = (codec or JSON_CODEC).decode(request_data)
+            except DecodeError as e:
+                error = e
+                await reply.send({"error": f"Invalid {(codec or JSON_CODEC).label} format"})
+                return
+            if isinstance(request, dict):
+                reply.request_id = request.get("request_id")
+                labels = _metric_labels(request)
+            started = self._observe(labels, "parse", started, timings)
+            # Validates the request and builds its command in one pass
+            command = self.registry.parse(request)
+            started = self._observe(labels, "validate", started, timings)
             
-            command = self.command_factory.create_command(request)
-            response = await command.execute()
+            if request["command_type"] == "stats":
+                await reply.send(self.metrics.snapshot())
+                return
+            if request["command_type"] == "ping":
+                # Health check; the load figures let a balancer compare servers
+                await reply.send({"pong": True, "in_flight": len(self.tasks), "queued": len(self.fair_queue)})
+                return
+            deadline = self._deadline(request, received_at)
+            if deadline is not None and loop.time() >= deadline:
+                # Nobody is waiting for the answer any more; don't start the work
+                raise DeadlineExceededError("Deadline exceeded before the request could run", _command_text(request))
+            if request.get("stream"):
+                error = await self._send_stream(reply, command, deadline, received_at)
+                self._observe(labels, "execute", started, timings)
+                return
+            key = command.coalesce_key() if self.coalesce_requests else None
+            try:
+                async with asyncio.timeout_at(deadline):
+                    response = await self.single_flight.run(key, command.execute)
+            except TimeoutError:
+                if deadline is None:
+                    raise
+                raise DeadlineExceededError(
+                    f"Request timed out after {deadline - received_at:g}s", _command_text(request)
+                )
+            self._observe(labels, "execute", started, timings)
             
-            await socket.send_multipart([msg_id, json.dumps(response).encode()])
+            await reply.send(response)
             
-        except json.JSONDecodeError:
-            await socket.send_multipart([msg_id, json.dumps({"error": "Invalid JSON format"}).encode()])
         except CommandError as e:
-            await socket.send_multipart([
-                msg_id,
-                json.dumps({
-                    "error": str(e),
-                    "command": getattr(e, 'command', None)
-                }).encode()
-            ])
+            error = e
+            await reply.send({
+                "error": str(e),
+                "command": getattr(e, 'command', None)
+            })
+        except asyncio.CancelledError as e:
+            # Abandoned, e.g. because the client disconnected
+            error = e
+            raise
         except Exception as e:
+            error = e
             self.logger.error(f"Unexpected error: {str(e)}", exc_info=True)
-            await socket.send_multipart([
-                msg_id,
-                json.dumps({"error": "Internal server error"}).encode()
-            ])
+            await reply.send({"error": "Internal server error"})
+        finally:
+            if reply.unreachable:
+                self.peers.reclaim(self._client_id(msg_id), self.fair_queue)
+            if error is not None:
+                self.metrics.count_error(error)
+            self.metrics.count_request(labels)
+            self.metrics.bytes_out += reply.sent_bytes
+            self.metrics.replies_dropped += reply.dropped
+            self._log_request(reply, labels, request_data, error, time.perf_counter() - received, timings)
+    
+    def _deadline(self, request: Dict[str, Any], received_at: float) -> Optional[float]:
+        """Event loop time by which the request must finish, or None for no limit.
+        
+        ``timeout`` counts from arrival at the server and ``deadline`` is a Unix
+        time; the earlier applies. A timeout, the request's or the server's
+        default, is capped by the server's maximum.
+        """
+        loop = asyncio.get_running_loop()
+        timeout = request.get("timeout", self.default_timeout)
+        if timeout and self.max_timeout:
+            timeout = min(timeout, self.max_timeout)
+        deadline = received_at + timeout if timeout else None
+        if "deadline" in request:
+            absolute = loop.time() + request["deadline"] - time.time()
+            deadline = absolute if deadline is None else min(deadline, absolute)
+        return deadline
+    
+    def _observe(self, labels: Tuple[str, str], phase: str, started: float, timings: Dict[str, float]) -> float:
+        """Record the time since ``started`` for ``phase`` and return the current time."""
+        now = time.perf_counter()
+        timings[phase] = now - started
+        self.metrics.observe(labels, phase, now - started)
+        return now
+    
+    def _log_request(self, reply: Reply, labels: Tuple[str, str], request_data: Union[str, bytes],
+                     error: Optional[Exception], duration: float, timings: Dict[str, float]) -> None:
+        """Emit one structured record per request, subject to level and sampling."""
+        level = logging.INFO if error is None else logging.WARNING
+        if not self.request_logger.isEnabledFor(level) or not self.log_sampler.sample(level, labels[0]):
+            return
+        fields = {
+            "request_id": reply.request_id,
+            "client": self._client_id(reply.msg_id).decode("ascii", errors="backslashreplace"),
+            "command_type": labels[0],
+            "command": labels[1],
+            "status": "ok" if error is None else "error",
+            "duration_ms": round(duration * 1000, 3),
+            **{f"{phase}_ms": round(seconds * 1000, 3) for phase, seconds in timings.items()},
+            "bytes_in": len(request_data),
+            "bytes_out": reply.sent_bytes,
+            "payload": truncate(request_data, self.log_payload_max),
+        }
+        if error is not None:
+            fields["error"] = type(error).__name__
+        self.request_logger.log(
+            level, "%s/%s %s in %.2fms", labels[0], labels[1], fields["status"], duration * 1000, extra=fields
+        )
+
+    async def _send_stream(self, reply: Reply, command: OSCommand, deadline: Optional[float] = None,
+                           received_at: Optional[float] = None) -> Optional[Exception]:
+        """Send a command's output as numbered chunks followed by an end marker.
+        
+        Failures, including passing the deadline, are reported in the end marker;
+        the error is also returned.
+        """
+        decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        seq = 0
+        
+        async def send(message: Dict[str, Any]) -> None:
+            nonlocal seq
+            await reply.send({"seq": seq, **message})
+            seq += 1
+        
+        command_str = " ".join([command.command_name] + command.parameters)
+        try:
+            try:
+                async with asyncio.timeout_at(deadline), \
+                        contextlib.aclosing(command.stream(self.stream_chunk_size)) as chunks:
+                    async for chunk in chunks:
+                        text = decoder.decode(chunk)
+                        if text:
+                            await send({"chunk": text})
+                        if reply.dropped:
+                            # Nobody is reading; stop the command rather than drop the rest
+                            raise ReplyStalledError("Client stopped reading the stream", command_str)
+            except TimeoutError:
+                if deadline is None:
+                    raise
+                raise DeadlineExceededError(f"Request timed out after {deadline - received_at:g}s", command_str)
+            text = decoder.decode(b'', final=True)
+            if text:
+                await send({"chunk": text})
+            await send({"end": True, "given_os_command": command_str})
+        except CommandError as e:
+            await send({"end": True, "error": str(e), "command": getattr(e, 'command', None)})
+            return e
+        except Exception as e:
+            self.logger.error(f"Unexpected error: {str(e)}", exc_info=True)
+            await send({"end": True, "error": "Internal server error"})
+            return e
+        return None
 
     async def start(self) -> None:
         """Start the ZMQ server."""
         self.is_running = True
         self.logger.info(f"Server starting on {self.bind_address}")
+        ComputeCommand.executor = self.compute_executor
         
+        started = time.perf_counter()
         context = zmq.asyncio.Context()
-        socket = context.socket(zmq.ROUTER)
-        socket.bind(self.bind_address)
+        socket = await self._open_socket(context)
+        self._startup_phase("bind", started)
+        metrics_server = None
+        loops = []
         
         try:
-            self.logger.info("Server started successfully")
-            while self.is_running:
-                try:
-                    # Receive message frames [id, message]
-                    frames = await socket.recv_multipart()
-                    if len(frames) != 2:
-                        continue
-                        
-                    msg_id, message = frames
-                    self.logger.info(f"Received request from {msg_id}: {message.decode()}")
-                    
-                    # Create new task for each request
-                    task = asyncio.create_task(
-                        self.handle_request(msg_id, message.decode(), socket)
-                    )
-                    self.tasks.add(task)
-                    task.add_done_callback(self.tasks.discard)
-                    
-                except asyncio.CancelledError:
-                    self.logger.info("Server shutdown initiated")
-                    break
-                except Exception as e:
-                    self.logger.error(f"Error processing request: {str(e)}", exc_info=True)
+            if self.metrics_port:
+                metrics_server = await serve_prometheus(self.metrics, self.metrics_host, self.metrics_port)
+                self.logger.info(f"Serving metrics on http://{self.metrics_host}:{self.metrics_port}/metrics")
+            if self.warm_start:
+                # Requests arriving meanwhile wait in ZMQ's queues
+                await self._warm_up()
+            self._startup_phase("total", self._created)
+            self.logger.info(f"Server started successfully in {self.startup['total']:.1f}ms", extra={
+                f"{phase}_ms": duration for phase, duration in self.startup.items()
+            })
+            await self._signal_ready()
+            queued = asyncio.Event()
+            room = asyncio.Event()
+            loops = [
+                asyncio.create_task(self._receive_requests(socket, queued, room)),
+                asyncio.create_task(self._dispatch_requests(socket, queued, room)),
+            ]
+            if self.peers.interval:
+                loops.append(asyncio.create_task(self.peers.run(socket, self.fair_queue)))
+            await asyncio.gather(*loops)
+        except asyncio.CancelledError:
+            self.logger.info("Server shutdown initiated")
         finally:
-            # Wait for all tasks to complete
+            for loop in loops:
+                loop.cancel()
+            await asyncio.gather(*loops, return_exceptions=True)
+            # Let requests in progress finish, then cancel the rest (killing their subprocesses)
             if self.tasks:
-                await asyncio.gather(*self.tasks, return_exceptions=True)
+                _, pending = await asyncio.wait(set(self.tasks), timeout=self.shutdown_grace or None)
+                for task in pending:
+                    task.cancel()
+                await asyncio.gather(*pending, return_exceptions=True)
+            if metrics_server is not None:
+                metrics_server.close()
             socket.close()
             context.term()
+            if self.compute_executor is not None:
+                self.compute_executor.shutdown()
+                ComputeCommand.executor = None
+            if self.ready_file:
+                with contextlib.suppress(FileNotFoundError):
+                    os.remove(self.ready_file)
+            self._save_snapshot()
             self.logger.info("Server shut down")
+    
+    async def _warm_up(self) -> None:
+        """Pay up front the costs a cold server leaves to its first requests."""
+        started = time.perf_counter()
+        preload()
+        started = self._startup_phase("warm_imports", started)
+        cached = ComputeCommand.precompile(self._load_snapshot())
+        started = self._startup_phase("warm_cache", started)
+        if self.compute_executor is not None:
+            try:
+                await self.compute_executor.warm(preload)
+            except Exception as e:
+                # Heavy expressions will start the workers on demand instead
+                self.logger.warning(f"Could not start compute workers: {str(e)}")
+            started = self._startup_phase("warm_executor", started)
+        await OSCommand.warm()
+        self._startup_phase("warm_subprocess", started)
+        self.logger.info(f"Warmed up with {cached} precompiled expressions")
+    
+    async def _signal_ready(self) -> None:
+        """Announce that the server is ready for requests by writing the ready file."""
+        if self.ready_file:
+            write_atomically(self.ready_file, json.dumps({"pid": os.getpid(), "startup_ms": self.startup}))
+    
+    def _startup_phase(self, phase: str, started: float) -> float:
+        """Record the time since ``started`` as the duration of a startup phase and return the current time."""
+        now = time.perf_counter()
+        self.startup[phase] = round((now - started) * 1000, 3)
+        return now
+    
+    def _load_snapshot(self) -> List[str]:
+        """Expressions saved by a previous run, most recently used last."""
+        if not self.warm_snapshot:
+            return []
+        try:
+            with open(self.warm_snapshot, encoding='utf-8') as f:
+                snapshot = json.load(f)
+        except FileNotFoundError:
+            return []
+        except (OSError, ValueError) as e:
+            self.logger.warning(f"Ignoring unreadable warm-up snapshot {self.warm_snapshot}: {str(e)}")
+            return []
+        expressions = snapshot.get("expressions") if isinstance(snapshot, dict) else None
+        if not isinstance(expressions, list):
+            return []
+        return [expression for expression in expressions if isinstance(expression, str)]
+    
+    def _save_snapshot(self) -> None:
+        """Save the cached expressions for the next run to precompile."""
+        if not self.warm_snapshot or not len(ComputeCommand.cache):
+            return
+        try:
+            write_atomically(self.warm_snapshot, json.dumps({"expressions": ComputeCommand.cache.expressions()}))
+        except OSError as e:
+            self.logger.warning(f"Could not save warm-up snapshot {self.warm_snapshot}: {str(e)}")
 
+    async def _receive_requests(self, socket, queued: asyncio.Event, room: asyncio.Event) -> None:
+        """Read requests off the socket and queue them per client for the dispatcher."""
+        loop = asyncio.get_running_loop()
+        while self.is_running:
+            try:
+                # Leave further frames queued in ZMQ while the scheduler is full
+                while len(self.fair_queue) >= self.max_queued:
+                    room.clear()
+                    await room.wait()
+                
+                # Receive message frames [id, message] or [id, codec, message]
+                frames = await socket.recv_multipart()
+                received_at = loop.time()
+                if len(frames) == 2:
+                    msg_id, message = frames
+                    codec = None
+                elif len(frames) == 3:
+                    msg_id, header, message = frames
+                    codec = get_codec(header)
+                    if codec is None:
+                        await self._refuse(
+                            socket, msg_id, JSON_CODEC, {"request_id": read_request_id(message)},
+                            f"Unsupported codec: {header.decode('ascii', errors='replace')}"
+                        )
+                        continue
+                else:
+                    continue
+                
+                # Decoded here to pick the priority class; a bad payload is reported by handle_request
+                try:
+                    request = (codec or JSON_CODEC).decode(message)
+                except Exception:
+                    # Queued all the same, so that handle_request answers it
+                    request = None
+                if self.peers.interval:
+                    self.peers.seen(self._client_id(msg_id), codec, request)
+                priority = self._priority(request)
+                refusal = self.fair_queue.admit(
+                    self._client_id(msg_id), (msg_id, message, codec, received_at, request, priority), priority
+                )
+                if refusal is not None:
+                    await self._refuse(socket, msg_id, codec, request, refusal)
+                    continue
+                queued.set()
+                
+            except Exception as e:
+                self.logger.error(f"Error receiving request: {str(e)}", exc_info=True)
+    
+    async def _dispatch_requests(self, socket, queued: asyncio.Event, room: asyncio.Event) -> None:
+        """Start queued requests in scheduler order while in-flight capacity allows."""
+        while self.is_running:
+            request = None
+            if len(self.tasks) < self.max_inflight:
+                bulk_allowed = len(self.bulk_tasks) < self.bulk_max_inflight
+                request = self.fair_queue.pop(PRIORITY_CLASSES if bulk_allowed else PRIORITY_CLASSES[:1])
+            if request is None:
+                queued.clear()
+                await queued.wait()
+                continue
+            room.set()
+            
+            msg_id, message, codec, received_at, decoded, priority = request
+            task = asyncio.create_task(self.handle_request(msg_id, message, socket, codec, received_at, decoded))
+            self.tasks.add(task)
+            task.add_done_callback(self.tasks.discard)
+            self.peers.track(self._client_id(msg_id), task)
+            if priority == "bulk":
+                self.bulk_tasks.add(task)
+                task.add_done_callback(self.bulk_tasks.discard)
+            task.add_done_callback(lambda _: queued.set())
+    
+    def _priority(self, request: Any, nested: bool = False) -> str:
+        """Scheduling class of a request: slow OS commands and batch compute are ``bulk``.
+        
+        Runs before validation, so anything malformed is ``interactive``; it is
+        rejected as soon as it runs.
+        """
+        if not isinstance(request, dict):
+            return "interactive"
+        command_type = request.get("command_type")
+        if command_type == "os":
+            command_name = request.get("command_name")
+            if not isinstance(command_name, str):
+                return "interactive"
+            return "interactive" if command_name in self.interactive_commands else "bulk"
+        if command_type == "compute" and "variables" in request:
+            return "bulk"
+        if command_type == "batch" and not nested and isinstance(request.get("requests"), list):
+            # As urgent as its slowest command; batches cannot nest
+            return max(
+                (self._priority(item, nested=True) for item in request["requests"]),
+                key=PRIORITY_CLASSES.index, default="interactive"
+            )
+        return "interactive"
+    
+    def _client_id(self, msg_id: bytes) -> bytes:
+        """Identity of the client that sent a request, by which it is scheduled and logged."""
+        return msg_id
+    
+    async def _refuse(self, socket, msg_id: bytes, codec: Optional[Codec], request: Any, reason: str) -> None:
+        """Answer a request that is not admitted.
+        
+        Sent from the receive loop, so the answer is dropped rather than waited
+        for if the client's queue is full.
+        """
+        reply = Reply(socket, msg_id, codec, send_timeout=0)
+        message = {"error": reason}
+        if isinstance(request, dict):
+            reply.request_id = request.get("request_id")
+            if request.get("stream"):
+                message["end"] = True
+        await reply.send(message)
+        self.metrics.replies_dropped += reply.dropped
+    
     def stop(self) -> None:
         """Stop the server."""
         self.is_running = False
         self.logger.info("Server stop requested")
 
+    async def _open_socket(self, context: zmq.asyncio.Context) -> zmq.asyncio.Socket:
+        """Create the socket requests arrive on."""
+        socket = context.socket(zmq.ROUTER)
+        socket.rcvhwm = self.rcvhwm
+        socket.sndhwm = self.sndhwm
+        configure_heartbeat(socket, self.heartbeat_interval, self.heartbeat_timeout)
+        # Report clients that have gone, and full queues of slow ones, instead of
+        # silently dropping their replies
+        socket.router_mandatory = 1
+        socket.bind(self.bind_address)
+        return socket
+
+
+def _command_text(request: Dict[str, Any]) -> str:
+    """The command of a validated request, as error replies report it."""
+    if request["command_type"] == "os":
+        return " ".join([request["command_name"]] + request.get("parameters", []))
+    if request["command_type"] == "batch":
+        return f"batch of {len(request['requests'])} requests"
+    if request["command_type"] == "compute":
+        return request["expression"]
+    return request["command_type"]
+
+
+def _metric_labels(request: Dict[str, Any]) -> Tuple[str, str]:
+    """Metric labels for a request, limited to known values to bound their number."""
+    command_type = request.get("command_type")
+    if not isinstance(command_type, str):
+        return "invalid", "-"
+    if command_type == "os":
+        command_name = request.get("command_name")
+        if not isinstance(command_name, str):
+            return "invalid", "-"
+        return "os", command_name if command_name in OSCommand.SAFE_COMMANDS else "other"
+    if command_type == "compute":
+        return "compute", "batch" if "variables" in request else "expression"
+    if command_type in BUILDERS:
+        return command_type, "-"
+    return "invalid", "-"
+
+
+def _parse_limits(value: str, convert: Callable[[str], Any] = int) -> Dict[str, Any]:
+    """Parse ``name=limit`` pairs separated by commas, e.g. ``sleep=4,cp=2``."""
+    limits = {}
+    for item in filter(None, (part.strip() for part in value.split(','))):
+        name, limit = item.split('=', 1)
+        limits[name.strip()] = convert(limit)
+    return limits
+
+
+def read_request_id(payload: bytes) -> Any:
+    """The ``request_id`` of ``payload`` if it is a JSON request, for refusals of requests that cannot be read."""
+    try:
+        request = JSON_CODEC.decode(payload)
+    except DecodeError:
+        return None
+    return request.get("request_id") if isinstance(request, dict) else None
+
+
+def write_atomically(path: str, text: str) -> None:
+    """Replace the file at ``path`` with ``text`` so that readers never see it half written."""
+    fd, temporary = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), prefix='.graph-server-')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(text)
+        # mkstemp creates files readable by their owner only
+        os.chmod(temporary, 0o644)
+        os.replace(temporary, path)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.remove(temporary)
+        raise
+
+
+def run(server) -> None:
+    """Run a server until it is interrupted or sent SIGTERM, shutting it down cleanly either way."""
+    async def serve() -> None:
+        with contextlib.suppress(NotImplementedError):
+            # Container runtimes stop processes with SIGTERM
+            asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, asyncio.current_task().cancel)
+        await server.start()
+    
+    asyncio.run(serve())
+
 
 def main():
-    server = ZMQServer()
+    # Only needed when run as a program, so kept off the import path of library users
+    import argparse
+
+    from dotenv import load_dotenv
+    
+    load_dotenv()
+    parser = argparse.ArgumentParser(description='ZMQ Command Server')
+    parser.add_argument('--workers', type=int, default=int(os.getenv('SERVER_WORKERS', '0')),
+                        help='Worker processes behind a broker (default: serve from this process)')
+    args = parser.parse_args()
+    
+    if args.workers > 0:
+        from graph_server.broker import Broker
+        server = Broker(args.workers)
+    else:
+        server = ZMQServer()
     try:
-        asyncio.run(server.start())
+        run(server)
     except KeyboardInterrupt:
         print("Server stopped by user")
 
@@ -0,0 +1,66 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+
+class _Call:
+    """An execution shared by every caller that asked for the same key."""
+
+    def __init__(self, task: asyncio.Future):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """Runs at most one execution per key at a time and shares its outcome.
+
+    Callers that arrive while an execution for their key is in progress wait
+    for it instead of starting their own; they all receive its result or its
+    exception. The execution is cancelled once every caller has gone away.
+    """
+
+    def __init__(self):
+        self._calls: Dict[Hashable, _Call] = {}
+        self.executions = 0
+        self.coalesced = 0
+
+    async def run(self, key: Optional[Hashable], fn: Callable[[], Awaitable[Any]]) -> Any:
+        """Return ``await fn()``, sharing it with concurrent callers using the same key.
+
+        A key of None opts out of sharing.
+        """
+        if key is None:
+            return await fn()
+
+        call = self._calls.get(key)
+        if call is None:
+            call = _Call(asyncio.ensure_future(fn()))
+            self._calls[key] = call
+            call.task.add_done_callback(lambda task: self._finished(key, call))
+            self.executions += 1
+        else:
+            self.coalesced += 1
+
+        call.waiters += 1
+        try:
+            return await asyncio.shield(call.task)
+        finally:
+            call.waiters -= 1
+            if not call.waiters and not call.task.done():
+                # Nobody wants the result any more; don't let late arrivals join a cancelled run
+                self._finished(key, call)
+                call.task.cancel()
+
+    def stats(self) -> Dict[str, int]:
+        """Return a snapshot of the coalescing counters."""
+        return {
+            "in_flight": len(self._calls),
+            "executions": self.executions,
+            "coalesced": self.coalesced,
+        }
+
+    def _finished(self, key: Hashable, call: _Call) -> None:
+        if self._calls.get(key) is call:
+            del self._calls[key]
+        if call.task.done() and not call.task.cancelled():
+            # Mark the exception retrieved even if every waiter was cancelled
+            call.task.exception()
@@ -1,7 +1,7 @@
 from abc import ABC, abstractmethod
 from typing import Any, Dict
 
-from graph_server.exceptions import ValidationError
+from graph_server.registry import CommandRegistry
 
 
 class RequestValidator(ABC):
@@ -13,31 +13,18 @@ class RequestValidator(ABC):
         pass
 
 class JSONRequestValidator(RequestValidator):
-    """Validates JSON request format."""
+    """Validates JSON request format.
     
-    def validate(self, request: Dict[str, Any]) -> None:
-        if not isinstance(request, dict):
-            raise ValidationError("Request must be a JSON object")
-            
-        if "command_type" not in request:
-            raise ValidationError("Missing 'command_type' in request")
-            
-        command_type = request["command_type"]
-        
-        if command_type == "os":
-            self._validate_os_command(request)
-        elif command_type == "compute":
-            self._validate_compute_command(request)
-        else:
-            raise ValidationError(f"Invalid command_type: {command_type}")
+    Validation builds the request's command through the command registry and
+    discards it; the server uses ``CommandRegistry.parse`` to do both at once.
+    """
+    
+    def __init__(self, max_batch_size: int = 256):
+        self.registry = CommandRegistry(max_batch_size)
     
-    def _validate_os_command(self, request: Dict[str, Any]) -> None:
-        if "command_name" not in request:
-            raise ValidationError("Missing 'command_name' for OS command")
-            
-        if not isinstance(request.get("parameters", []), list):
-            raise ValidationError("'parameters' must be a list")
+    @property
+    def max_batch_size(self) -> int:
+        return self.registry.max_batch_size
     
-    def _validate_compute_command(self, request: Dict[str, Any]) -> None:
-        if "expression" not in request:
-            raise ValidationError("Missing 'expression' for compute command")
\ No newline at end of file
+    def validate(self, request: Dict[str, Any]) -> None:
+        self.registry.parse(request)
@@ -0,0 +1,135 @@
+import asyncio
+import socket
+import threading
+
+import pytest
+
+from graph_server.async_client import AsyncZMQClient, ThreadedZMQClient
+from graph_server.client import ZMQClient
+from graph_server.server import Reply, ZMQServer
+
+
+@pytest.fixture
+async def server_address():
+    """Run a live server on a free local port for the duration of a test."""
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+    address = f"tcp://127.0.0.1:{port}"
+    server = ZMQServer(log_level="ERROR", bind_address=address)
+    task = asyncio.create_task(server.start())
+    yield address
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+
+
+class TestAsyncZMQClient:
+    async def test_pipelined_requests_are_correlated(self, server_address):
+        client = AsyncZMQClient(server_address, timeout=10)
+        try:
+            responses = await asyncio.gather(*(
+                client.send_command({"command_type": "compute", "expression": f"{i} * 2"})
+                for i in range(50)
+            ))
+        finally:
+            await client.close()
+
+        assert [response["result"] for response in responses] == [str(i * 2) for i in range(50)]
+        assert client.in_flight == 0
+
+    async def test_slow_request_does_not_block_others(self, server_address):
+        client = AsyncZMQClient(server_address, timeout=10)
+        try:
+            slow = asyncio.create_task(client.send_command({
+                "command_type": "os", "command_name": "sleep", "parameters": ["1"]
+            }))
+            await asyncio.sleep(0.1)
+            fast = await client.send_command({"command_type": "compute", "expression": "3 + 4"})
+            assert fast["result"] == "7"
+            assert not slow.done()
+            assert "error" not in await slow
+        finally:
+            await client.close()
+
+    async def test_send_batch(self, server_address):
+        client = AsyncZMQClient(server_address, timeout=10)
+        try:
+            response = await client.send_batch(
+                [{"command_type": "compute", "expression": f"{i} + 1"} for i in range(30)],
+                concurrency=4
+            )
+        finally:
+            await client.close()
+
+        assert [result["result"] for result in response["results"]] == [str(i + 1) for i in range(30)]
+        assert response["failed"] == 0
+
+    async def test_compressed_replies(self, server_address, monkeypatch):
+        monkeypatch.setattr(Reply, "compress_min_size", 256)
+        client = AsyncZMQClient(server_address, timeout=10, compression="zlib")
+        try:
+            response = await client.send_command({"command_type": "os", "command_name": "ls", "parameters": ["/usr/bin"]})
+        finally:
+            await client.close()
+
+        assert "python3" in response["result"].split()
+
+    async def test_request_timeout(self, server_address):
+        client = AsyncZMQClient(server_address)
+        try:
+            response = await client.send_command(
+                {"command_type": "os", "command_name": "sleep", "parameters": ["1"]},
+                timeout=0.1
+            )
+            assert "timed out" in response["error"]
+            # The late reply is discarded rather than delivered to the next request
+            await asyncio.sleep(1.2)
+            response = await client.send_command({"command_type": "compute", "expression": "1 + 1"}, timeout=5)
+            assert response["result"] == "2"
+        finally:
+            await client.close()
+
+    async def test_sync_client_timeout_skips_late_reply(self, server_address):
+        client = ZMQClient(server_address)
+        try:
+            # The server stops the command; this client only waits for its error
+            response = await asyncio.to_thread(client.send_command, {
+                "command_type": "os", "command_name": "sleep", "parameters": ["5"]
+            }, 0.2)
+            assert response["error"] == "Request timed out after 0.2s"
+            response = await asyncio.to_thread(client.send_command, {"command_type": "compute", "expression": "1 + 1"})
+            assert response["result"] == "2"
+        finally:
+            client.close()
+
+
+def test_threaded_client_shared_between_threads():
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+    address = f"tcp://127.0.0.1:{port}"
+    loop = asyncio.new_event_loop()
+    server = ZMQServer(log_level="ERROR", bind_address=address)
+    server_thread = threading.Thread(target=loop.run_until_complete, args=(server.start(),))
+    server_thread.start()
+
+    client = ThreadedZMQClient(address, timeout=10)
+    results = {}
+
+    def worker(n: int) -> None:
+        results[n] = client.send_command({"command_type": "compute", "expression": f"{n} + 100"})
+
+    try:
+        threads = [threading.Thread(target=worker, args=(n,)) for n in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        client.close()
+        server.stop()
+        loop.call_soon_threadsafe(lambda: [task.cancel() for task in asyncio.all_tasks(loop)])
+        server_thread.join()
+        loop.close()
+
+    assert {n: response["result"] for n, response in results.items()} == {n: str(n + 100) for n in range(8)}
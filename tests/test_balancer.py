@@ -0,0 +1,136 @@
+import asyncio
+import socket
+
+import pytest
+
+from graph_server.balancer import BalancedZMQClient, _canonical, _retry_safe
+from graph_server.server import ZMQServer
+
+
+def free_address() -> str:
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        return f"tcp://127.0.0.1:{probe.getsockname()[1]}"
+
+
+class Servers:
+    """Live servers that a test can stop and restart on the same addresses."""
+
+    def __init__(self, count: int):
+        self.addresses = [free_address() for _ in range(count)]
+        self.servers = {}
+        self.tasks = {}
+
+    def start(self, address: str) -> None:
+        self.servers[address] = ZMQServer(log_level="ERROR", bind_address=address)
+        self.tasks[address] = asyncio.create_task(self.servers[address].start())
+
+    async def stop(self, address: str) -> None:
+        task = self.tasks.pop(address)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+
+@pytest.fixture
+async def servers(monkeypatch):
+    # Let a client give up on a dead server soon after its timeout
+    monkeypatch.setattr("graph_server.async_client.REPLY_GRACE", 0.1)
+    servers = Servers(3)
+    for address in servers.addresses:
+        servers.start(address)
+    yield servers
+    for address in list(servers.tasks):
+        await servers.stop(address)
+
+
+async def wait_until(condition, timeout: float = 5.0) -> None:
+    for _ in range(int(timeout / 0.05)):
+        if condition():
+            return
+        await asyncio.sleep(0.05)
+    raise AssertionError("condition not met in time")
+
+
+def test_retry_safe_requests():
+    assert _retry_safe({"command_type": "compute", "expression": "1"})
+    assert _retry_safe({"command_type": "os", "command_name": "ls"})
+    assert not _retry_safe({"command_type": "os", "command_name": "cp", "parameters": ["a", "b"]})
+    assert not _retry_safe({"command_type": "os", "command_name": "ls", "stream": True})
+    assert not _retry_safe({"command_type": "batch", "requests": [
+        {"command_type": "compute", "expression": "1"},
+        {"command_type": "os", "command_name": "sleep", "parameters": ["1"]},
+    ]})
+
+
+def test_canonical_body_ignores_per_attempt_fields():
+    request = {"command_type": "compute", "expression": "1 + 1"}
+    assert _canonical(dict(request, request_id=3, timeout=5)) == _canonical(request)
+
+
+async def test_least_outstanding_spreads_requests(servers):
+    client = BalancedZMQClient(servers.addresses, timeout=10, health_interval=0)
+    try:
+        responses = await asyncio.gather(*(
+            client.send_command({"command_type": "os", "command_name": "sleep", "parameters": ["0.2"]})
+            for _ in range(6)
+        ))
+    finally:
+        await client.close()
+
+    assert all("error" not in response for response in responses)
+    assert [node["dispatched"] for node in client.stats()["nodes"].values()] == [2, 2, 2]
+
+
+async def test_consistent_hashing_sends_repeats_to_one_server(servers):
+    client = BalancedZMQClient(servers.addresses, timeout=10, hash_requests=True, health_interval=0)
+    try:
+        for _ in range(5):
+            assert (await client.send_command({"command_type": "compute", "expression": "7 * 6"}))["result"] == "42"
+        for n in range(30):
+            await client.send_command({"command_type": "compute", "expression": f"{n} + 1"})
+    finally:
+        await client.close()
+
+    # One server took all the repeats, and the other requests were spread around
+    dispatched = sorted(node["dispatched"] for node in client.stats()["nodes"].values())
+    assert dispatched[-1] >= 5 and dispatched[0] > 0
+
+
+async def test_failover_ejection_and_readmission(servers):
+    client = BalancedZMQClient(
+        servers.addresses, timeout=5, hash_requests=True, health_interval=0.05, ping_timeout=0.2
+    )
+    request = {"command_type": "compute", "expression": "2 ** 10"}
+    try:
+        await client.send_command(request)
+        owner = next(address for address, node in client.stats()["nodes"].items() if node["dispatched"])
+        await servers.stop(owner)
+
+        # The request waits on its server until health checks eject it, then moves on
+        assert (await client.send_command(request))["result"] == "1024"
+        assert not client.stats()["nodes"][owner]["healthy"]
+        assert client.stats()["failovers"] == 1
+
+        servers.start(owner)
+        await wait_until(lambda: client.stats()["nodes"][owner]["healthy"])
+        assert client.stats()["nodes"][owner]["ejections"] == 1
+    finally:
+        await client.close()
+
+
+async def test_only_retry_safe_requests_are_resent(servers):
+    dead = free_address()
+    client = BalancedZMQClient([dead, servers.addresses[0]], health_interval=0, max_failures=1)
+    # Route the first attempt to the dead server
+    client.nodes[1].healthy = False
+    try:
+        response = await client.send_command({"command_type": "os", "command_name": "sleep", "parameters": ["0"]}, 0.2)
+        assert "not retried" in response["error"]
+        assert client.stats()["nodes"][servers.addresses[0]]["dispatched"] == 0
+
+        client.nodes[0].healthy = True
+        response = await client.send_command({"command_type": "compute", "expression": "1 + 1"}, 0.2)
+        assert response["result"] == "2"
+        assert client.stats()["failovers"] == 1
+    finally:
+        await client.close()
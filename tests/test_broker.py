@@ -0,0 +1,176 @@
+import asyncio
+import json
+import os
+import signal
+import socket
+
+import pytest
+import zmq
+import zmq.asyncio
+
+from graph_server.async_client import AsyncZMQClient
+from graph_server.broker import Broker
+
+
+@pytest.fixture
+async def broker():
+    """Run a broker with two workers on a free local port."""
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+    broker = Broker(2, log_level="ERROR", bind_address=f"tcp://127.0.0.1:{port}")
+    task = asyncio.create_task(broker.start())
+    for _ in range(200):
+        if broker.stats()["ready"] == 2:
+            break
+        await asyncio.sleep(0.05)
+    yield broker
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+
+
+async def wait_until(condition, timeout: float = 10.0) -> None:
+    for _ in range(int(timeout / 0.05)):
+        if condition():
+            return
+        await asyncio.sleep(0.05)
+    raise AssertionError("condition not reached")
+
+
+class TestBroker:
+    async def test_requests_routed_through_workers(self, broker):
+        client = AsyncZMQClient(broker.bind_address, timeout=10)
+        try:
+            slow = asyncio.create_task(client.send_command({
+                "command_type": "os", "command_name": "sleep", "parameters": ["0.5"]
+            }))
+            await wait_until(lambda: broker.stats()["in_flight"] == 1)
+            responses = await asyncio.gather(*(
+                client.send_command({"command_type": "compute", "expression": f"{i} + 1"})
+                for i in range(20)
+            ))
+            assert "error" not in await slow
+        finally:
+            await client.close()
+
+        assert [response["result"] for response in responses] == [str(i + 1) for i in range(20)]
+        assert broker.stats()["dispatched"] == 21
+        await wait_until(lambda: broker.stats()["in_flight"] == 0)
+
+    async def test_streaming_through_broker(self, broker):
+        client = AsyncZMQClient(broker.bind_address, timeout=10)
+        try:
+            # The async client resolves on the first reply; a stream's first chunk is enough here
+            response = await client.send_command({
+                "command_type": "os", "command_name": "ls", "parameters": ["/"], "stream": True
+            })
+        finally:
+            await client.close()
+
+        assert response["seq"] == 0
+
+    async def test_crashed_worker_is_replaced(self, broker):
+        client = AsyncZMQClient(broker.bind_address, timeout=10)
+        try:
+            pending = asyncio.create_task(client.send_command({
+                "command_type": "os", "command_name": "sleep", "parameters": ["5"]
+            }))
+            await wait_until(lambda: broker.stats()["in_flight"] == 1)
+            busy = next(worker for worker in broker.workers.values() if worker.in_flight)
+            os.kill(busy.process.pid, signal.SIGKILL)
+
+            response = await pending
+            assert "crashed" in response["error"]
+            assert response["request_id"] is not None
+
+            await wait_until(lambda: broker.stats()["ready"] == 2)
+            assert broker.stats()["restarts"] == 1
+            response = await client.send_command({"command_type": "compute", "expression": "6 * 7"})
+            assert response["result"] == "42"
+        finally:
+            await client.close()
+
+    async def test_crash_after_out_of_order_completion(self, broker):
+        context = zmq.asyncio.Context()
+        client = context.socket(zmq.DEALER)
+        client.connect(broker.bind_address)
+        try:
+            # Pin both requests to one worker
+            next(iter(broker.workers.values())).ready = False
+            for request_id, request in enumerate((
+                {"command_type": "os", "command_name": "sleep", "parameters": ["5"]},
+                {"command_type": "compute", "expression": "1 + 1"},
+            )):
+                await client.send_multipart([json.dumps(dict(request, request_id=request_id)).encode()])
+            fast = json.loads((await asyncio.wait_for(client.recv_multipart(), 10))[0])
+            assert fast["request_id"] == 1
+            await wait_until(lambda: broker.stats()["in_flight"] == 1)
+
+            busy = next(worker for worker in broker.workers.values() if worker.in_flight)
+            os.kill(busy.process.pid, signal.SIGKILL)
+
+            slow = json.loads((await asyncio.wait_for(client.recv_multipart(), 10))[0])
+            assert slow["request_id"] == 0 and "crashed" in slow["error"]
+            # No second answer goes to the request already answered
+            assert not await client.poll(300)
+        finally:
+            client.close(linger=0)
+            context.term()
+
+    async def test_unsupported_codec_refusal_echoes_request_id(self, broker):
+        context = zmq.asyncio.Context()
+        client = context.socket(zmq.DEALER)
+        client.connect(broker.bind_address)
+        try:
+            await client.send_multipart([b"xml", json.dumps({"command_type": "ping", "request_id": 3}).encode()])
+            header, payload = await asyncio.wait_for(client.recv_multipart(), 10)
+            assert json.loads(payload) == {"error": "Unsupported codec: xml", "request_id": 3}
+            assert broker.stats()["dispatched"] == 0
+        finally:
+            client.close(linger=0)
+            context.term()
+
+async def test_ready_file_written_once_workers_are_ready(monkeypatch, tmp_path):
+    ready = tmp_path / "ready"
+    monkeypatch.setenv("READY_FILE", str(ready))
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+    broker = Broker(1, log_level="ERROR", bind_address=f"tcp://127.0.0.1:{port}")
+    task = asyncio.create_task(broker.start())
+    try:
+        await wait_until(ready.exists)
+        assert broker.stats()["ready"] == 1
+    finally:
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+    assert not ready.exists()
+
+
+async def test_replies_to_slow_client_are_held_not_dropped():
+    broker = Broker(1, log_level="ERROR")
+    context = zmq.asyncio.Context()
+    frontend = context.socket(zmq.ROUTER)
+    frontend.sndhwm = 10
+    frontend.router_mandatory = 1
+    port = frontend.bind_to_random_port("tcp://127.0.0.1")
+    client = context.socket(zmq.DEALER)
+    client.rcvhwm = 10
+    client.connect(f"tcp://127.0.0.1:{port}")
+    flush = asyncio.create_task(broker._flush_backlog(frontend))
+    try:
+        await client.send(b"hello")
+        identity, _ = await frontend.recv_multipart()
+        for seq in range(2000):
+            await broker._forward(frontend, [identity, seq.to_bytes(4, "big") + bytes(1000)])
+        assert broker.stats()["backlogged"] > 0
+
+        received = [int.from_bytes((await client.recv())[:4], "big") for _ in range(2000)]
+        assert received == list(range(2000))
+        await wait_until(lambda: broker.stats()["backlogged"] == 0)
+    finally:
+        flush.cancel()
+        await asyncio.gather(flush, return_exceptions=True)
+        client.close(linger=0)
+        frontend.close(linger=0)
+        context.term()
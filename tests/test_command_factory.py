@@ -1,7 +1,7 @@
 import pytest
 
 from graph_server.command_factory import CommandFactory
-from graph_server.commands import ComputeCommand, OSCommand
+from graph_server.commands import BatchCommand, ComputeCommand, OSCommand
 
 
 class TestCommandFactory:
@@ -25,9 +25,39 @@ class TestCommandFactory:
         assert isinstance(command, ComputeCommand)
         assert command.expression == "2 + 2"
 
+    def test_create_batch_command(self):
+        request = {
+            "command_type": "batch",
+            "requests": [
+                {"command_type": "os", "command_name": "ls"},
+                {"command_type": "compute", "expression": "2 + 2"},
+            ],
+            "concurrency": 1
+        }
+        command = CommandFactory.create_command(request)
+        assert isinstance(command, BatchCommand)
+        assert [type(item) for item in command.commands] == [OSCommand, ComputeCommand]
+        assert command.concurrency == 1
+        assert command.ordered
+
+    def test_create_batch_compute_command(self):
+        request = {
+            "command_type": "compute",
+            "expression": "x + 1",
+            "variables": {"x": [1, 2]}
+        }
+        command = CommandFactory.create_command(request)
+        assert isinstance(command, ComputeCommand)
+        assert command.variables == {"x": [1, 2]}
+
     def test_invalid_command_type(self):
         request = {
             "command_type": "invalid"
         }
         with pytest.raises(ValueError, match="Unknown command type"):
-            CommandFactory.create_command(request)
\ No newline at end of file
+            CommandFactory.create_command(request)
+
+    @pytest.mark.parametrize("command_type", ["stats", "ping"])
+    def test_server_handled_command_type(self, command_type):
+        with pytest.raises(ValueError, match=f"Command type {command_type} is answered by the server"):
+            CommandFactory.create_command({"command_type": command_type})
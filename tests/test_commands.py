@@ -1,7 +1,18 @@
+import asyncio
+
 import pytest
 
-from graph_server.commands import ComputeCommand, OSCommand
+from graph_server import commands
+from graph_server.commands import BatchCommand, Command, ComputeCommand, OSCommand
 from graph_server.exceptions import CommandExecutionError
+from graph_server.expression_cache import ExpressionCache
+
+
+@pytest.fixture
+def expression_cache(monkeypatch):
+    cache = ExpressionCache(maxsize=16)
+    monkeypatch.setattr(ComputeCommand, "cache", cache)
+    return cache
 
 
 @pytest.mark.asyncio(loop_scope="module")
@@ -17,6 +28,32 @@ class TestOSCommand:
             command = OSCommand("rm", ["-rf", "/"])
             await command.execute()
 
+    async def test_stream_yields_bounded_chunks(self):
+        command = OSCommand("ls", ["-la", "/usr/bin"])
+        chunks = [chunk async for chunk in command.stream(128)]
+        assert len(chunks) > 1
+        assert all(len(chunk) <= 128 for chunk in chunks)
+        assert b"".join(chunks).decode().startswith("total ")
+
+    async def test_stream_reports_failure(self):
+        command = OSCommand("ls", ["/nonexistent"])
+        with pytest.raises(CommandExecutionError, match="Command failed"):
+            async for _ in command.stream(128):
+                pass
+
+    async def test_stream_stderr_is_capped(self):
+        reader = asyncio.StreamReader()
+        reader.feed_data(b"e" * 200_000)
+        reader.feed_eof()
+        assert await commands._read_capped(reader, 1000) == b"e" * 1000
+        assert reader.at_eof()
+
+    async def test_only_read_only_commands_coalesce(self):
+        assert OSCommand("ls", ["-l"]).coalesce_key() == OSCommand("ls", ["-l"]).coalesce_key()
+        assert OSCommand("ls", ["-l"]).coalesce_key() != OSCommand("ls", ["-a"]).coalesce_key()
+        assert OSCommand("cp", ["a", "b"]).coalesce_key() is None
+        assert OSCommand("sleep", ["1"]).coalesce_key() is None
+
     async def test_command_not_found(self):
         with pytest.raises(CommandExecutionError, match="Command 'nonexistent' not allowed"):
             command = OSCommand("nonexistent", [])
@@ -42,4 +79,119 @@ class TestComputeCommand:
     async def test_unsafe_expression(self):
         with pytest.raises(CommandExecutionError):
             command = ComputeCommand("__import__('os').system('ls')")
-            await command.execute()
\ No newline at end of file
+            await command.execute()
+
+    async def test_repeat_expression_hits_cache(self, expression_cache):
+        await ComputeCommand("3 * 7").execute()
+        result = await ComputeCommand("3 * 7").execute()
+        assert result["result"] == "21"
+        assert expression_cache.hits == 1
+        assert expression_cache.misses == 1
+
+    async def test_invalid_expression_not_cached(self, expression_cache):
+        with pytest.raises(CommandExecutionError, match="Unsupported expression type"):
+            await ComputeCommand("abs(1)").execute()
+        assert len(expression_cache) == 0
+
+    async def test_runtime_error_raised_on_every_evaluation(self, expression_cache):
+        for _ in range(2):
+            with pytest.raises(CommandExecutionError, match="division by zero"):
+                await ComputeCommand("1 / (2 - 2)").execute()
+
+    async def test_large_power_not_folded(self, expression_cache):
+        command = ComputeCommand("2 ** 10 + 9 ** 2999")
+        compiled = command._compile({})
+        assert compiled.code.co_consts.count(1024) == 1
+        assert 2999 in compiled.code.co_consts
+
+    async def test_cache_disabled_uses_tree_walk(self, monkeypatch):
+        monkeypatch.setattr(ComputeCommand, "cache", ExpressionCache(maxsize=0))
+        result = await ComputeCommand("(30 + 10) * 5 + 1").execute()
+        assert result["result"] == "201"
+
+
+@pytest.mark.asyncio(loop_scope="module")
+class TestComputeCommandBatch:
+    @pytest.fixture(params=["numpy", "python"])
+    def backend(self, request, monkeypatch):
+        if request.param == "python":
+            monkeypatch.setattr(commands, "numpy", None)
+        elif commands.numpy is None:
+            pytest.skip("NumPy not installed")
+        return request.param
+
+    async def test_evaluates_every_row(self, backend, expression_cache):
+        command = ComputeCommand("x * 2 + y", {"x": [1, 2, 3], "y": [0.5, 0, -1]})
+        result = await command.execute()
+        assert result["results"] == [2.5, 4.0, 5.0]
+
+    async def test_constant_expression_broadcast(self, backend, expression_cache):
+        result = await ComputeCommand("2 + 2", {"x": [1, 2]}).execute()
+        assert result["results"] == [4.0, 4.0]
+
+    async def test_unary_minus(self, backend, expression_cache):
+        result = await ComputeCommand("-x ** 2", {"x": [3]}).execute()
+        assert result["results"] == [-9.0]
+
+    async def test_unknown_variable(self, backend, expression_cache):
+        with pytest.raises(CommandExecutionError, match="Unknown variable: z"):
+            await ComputeCommand("x + z", {"x": [1]}).execute()
+
+    async def test_division_by_zero(self, backend, expression_cache):
+        with pytest.raises(CommandExecutionError, match="Expression evaluation failed"):
+            await ComputeCommand("1 / x", {"x": [1, 0]}).execute()
+
+    async def test_tree_walk_matches_compiled(self, backend, monkeypatch):
+        monkeypatch.setattr(ComputeCommand, "cache", ExpressionCache(maxsize=0))
+        result = await ComputeCommand("x * 2 + y", {"x": [1, 2, 3], "y": [0.5, 0, -1]}).execute()
+        assert result["results"] == [2.5, 4.0, 5.0]
+
+    async def test_variable_without_values(self, expression_cache):
+        with pytest.raises(CommandExecutionError, match="Unknown variable: x"):
+            await ComputeCommand("x + 1").execute()
+
+
+@pytest.mark.asyncio(loop_scope="module")
+class TestBatchCommand:
+    async def test_results_in_request_order_with_errors(self):
+        command = BatchCommand([
+            OSCommand("sleep", ["0.05"]),
+            ComputeCommand("1 / 0"),
+            ComputeCommand("6 * 7"),
+        ])
+        response = await command.execute()
+        assert [result["index"] for result in response["results"]] == [0, 1, 2]
+        assert "error" not in response["results"][0]
+        assert "division by zero" in response["results"][1]["error"]
+        assert response["results"][2]["result"] == "42"
+        assert response["failed"] == 1
+
+    async def test_unordered_results_in_completion_order(self):
+        command = BatchCommand([OSCommand("sleep", ["0.05"]), ComputeCommand("1 + 1")], ordered=False)
+        response = await command.execute()
+        assert [result["index"] for result in response["results"]] == [1, 0]
+
+    async def test_concurrency_limit(self, monkeypatch):
+        monkeypatch.setattr(BatchCommand, "max_concurrency", 0)
+        running = peak = 0
+
+        class Probe(Command):
+            async def execute(self):
+                nonlocal running, peak
+                running += 1
+                peak = max(peak, running)
+                await asyncio.sleep(0.01)
+                running -= 1
+                return {}
+
+        await BatchCommand([Probe() for _ in range(6)]).execute()
+        assert peak == 6
+        peak = 0
+        await BatchCommand([Probe() for _ in range(6)], concurrency=2).execute()
+        assert peak == 2
+
+    async def test_server_limit_caps_requested_concurrency(self, monkeypatch):
+        monkeypatch.setattr(BatchCommand, "max_concurrency", 3)
+        assert BatchCommand([]).concurrency == 3
+        assert BatchCommand([], concurrency=8).concurrency == 3
+        assert BatchCommand([], concurrency=2).concurrency == 2
@@ -0,0 +1,98 @@
+import ast
+import sys
+
+import pytest
+
+from graph_server.commands import ComputeCommand
+from graph_server.cost import CostEstimator
+from graph_server.exceptions import CommandExecutionError, ExpressionRejectedError
+
+
+def _estimate(expression: str):
+    return CostEstimator().estimate(ast.parse(expression, mode='eval').body)
+
+
+@pytest.fixture
+def estimator(monkeypatch):
+    estimator = CostEstimator()
+    monkeypatch.setattr(ComputeCommand, "estimator", estimator)
+    return estimator
+
+
+class TestCostEstimator:
+    def test_small_expression_is_cheap(self):
+        cost = _estimate("(30 + 10) * 5 + 1")
+        assert cost.nodes == 7
+        assert cost.depth == 4
+        assert cost.work < 20
+
+    def test_power_magnitude(self):
+        cost = _estimate("9 ** 999999")
+        assert cost.result_bits == pytest.approx(999999 * 3.17, rel=0.01)
+
+    def test_power_tower_unbounded(self):
+        cost = _estimate("9 ** 9 ** 9 ** 9")
+        assert cost.result_bits > 10 ** 9
+
+    def test_float_power_is_cheap(self):
+        cost = _estimate("2.5 ** 1000000")
+        assert cost.result_bits == 0
+        assert cost.work < 10
+
+    def test_negative_exponent_is_cheap(self):
+        assert _estimate("7 ** -999999").work < 10
+
+    def test_trivial_base_is_cheap(self):
+        assert _estimate("1 ** 99999999999").work < 10
+
+    def test_variables_are_floats(self):
+        assert _estimate("x ** 99999999").work < 10
+
+    def test_rejection_counted(self):
+        estimator = CostEstimator()
+        with pytest.raises(ExpressionRejectedError, match="exceeds limit"):
+            estimator.check(ast.parse("7 ** 99999999", mode='eval').body, "7 ** 99999999")
+        assert estimator.stats() == {"checked": 1, "rejected": 1}
+
+    @pytest.mark.parametrize("expression", ["2 ** 100000", "3 ** 4400000", "7 ** 2500000", "(3 ** 1000000) ** 3"])
+    def test_unprintable_results_rejected(self, expression):
+        with pytest.raises(ExpressionRejectedError, match="bits exceeds limit"):
+            CostEstimator().check(ast.parse(expression, mode='eval').body, expression)
+
+    def test_largest_printable_result_admitted(self):
+        digits = sys.get_int_max_str_digits()
+        expression = f"10 ** {digits - 1}"
+        CostEstimator().check(ast.parse(expression, mode='eval').body, expression)
+        assert len(str(10 ** (digits - 1))) == digits
+
+    def test_depth_limit(self):
+        estimator = CostEstimator(max_depth=10)
+        expression = "+".join(["1"] * 20)
+        with pytest.raises(ExpressionRejectedError, match="nesting depth"):
+            estimator.check(ast.parse(expression, mode='eval').body, expression)
+
+    def test_node_limit(self):
+        estimator = CostEstimator(max_nodes=10)
+        expression = "(1 + 2) * (3 + 4) * (5 + 6)"
+        with pytest.raises(ExpressionRejectedError, match="nodes exceeds limit"):
+            estimator.check(ast.parse(expression, mode='eval').body, expression)
+
+
+@pytest.mark.asyncio
+class TestComputeCommandAdmission:
+    async def test_pathological_power_rejected(self, estimator):
+        with pytest.raises(CommandExecutionError, match="Expression rejected") as excinfo:
+            await ComputeCommand("9 ** 9 ** 9").execute()
+        assert excinfo.value.command == "9 ** 9 ** 9"
+        assert estimator.rejected == 1
+
+    async def test_rejected_before_tree_walk(self, estimator, monkeypatch):
+        monkeypatch.setattr(ComputeCommand, "cache", type(ComputeCommand.cache)(maxsize=0))
+        with pytest.raises(ExpressionRejectedError):
+            await ComputeCommand("123 ** 456789012").execute()
+        assert estimator.rejected == 1
+
+    async def test_admitted_expression_evaluates(self, estimator):
+        result = await ComputeCommand("2 ** 100").execute()
+        assert result["result"] == str(2 ** 100)
+        assert estimator.rejected == 0
@@ -0,0 +1,97 @@
+import asyncio
+import math
+import time
+
+import pytest
+
+from graph_server.commands import ComputeCommand
+from graph_server.cost import CostEstimator
+from graph_server.exceptions import CommandExecutionError
+from graph_server.executor import ComputeExecutor
+
+
+@pytest.fixture
+def executor():
+    executor = ComputeExecutor(max_workers=1, task_timeout=2.0, inline_max_work=10)
+    yield executor
+    executor.shutdown()
+
+
+@pytest.mark.asyncio
+class TestComputeExecutor:
+    async def test_runs_in_worker_process(self, executor):
+        assert await executor.run(pow, 2, 10) == 1024
+        assert executor.submitted == 1
+
+    async def test_warm_starts_every_worker(self, executor):
+        executor.max_workers = 2
+        await executor.warm()
+        assert len(executor._pool._processes) == 2
+        assert executor.submitted == 0
+
+    async def test_timeout_recycles_pool(self, executor):
+        executor.task_timeout = 0.5
+        with pytest.raises(TimeoutError):
+            await executor.run(time.sleep, 30)
+        assert executor.timeouts == 1
+        assert executor.recycles == 1
+        assert await executor.run(pow, 3, 2) == 9
+
+    async def test_timeout_counts_from_start_of_task(self, executor):
+        executor.task_timeout = 1.0
+        tasks = [asyncio.create_task(executor.run(time.sleep, seconds)) for seconds in (3, 0.1, 0.1)]
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+        assert isinstance(results[0], TimeoutError)
+        assert results[1:] == [None, None]
+        assert executor.timeouts == 1
+
+    async def test_cancelled_task_finishes_in_background(self, executor):
+        task = asyncio.create_task(executor.run(time.sleep, 0.3))
+        await asyncio.sleep(0.1)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        # The worker is left to finish, then serves the next task
+        assert await executor.run(pow, 3, 2) == 9
+        assert executor.stats()["abandoned"] == 1
+        assert executor.recycles == 0
+
+    async def test_cancelled_runaway_task_is_still_killed(self, executor):
+        executor.task_timeout = 0.5
+        task = asyncio.create_task(executor.run(time.sleep, 30))
+        await asyncio.sleep(0.1)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        assert await executor.run(pow, 3, 2) == 9
+        assert executor.timeouts == 1
+        assert executor.recycles == 1
+
+    async def test_heavy_expression_offloaded(self, executor, monkeypatch):
+        monkeypatch.setattr(ComputeCommand, "executor", executor)
+        result = await ComputeCommand("x * 2 + 1", {"x": list(range(10))}).execute()
+        assert result["results"][-1] == 19.0
+        assert executor.submitted == 1
+
+    async def test_cheap_expression_stays_inline(self, executor, monkeypatch):
+        monkeypatch.setattr(ComputeCommand, "executor", executor)
+        result = await ComputeCommand("2 + 2").execute()
+        assert result["result"] == "4"
+        assert executor.submitted == 0
+
+    async def test_worker_error_keeps_command(self, executor, monkeypatch):
+        monkeypatch.setattr(ComputeCommand, "executor", executor)
+        with pytest.raises(CommandExecutionError, match="Expression evaluation failed") as excinfo:
+            await ComputeCommand("1 / x", {"x": list(range(100))}).execute()
+        assert excinfo.value.command == "1 / x"
+        assert executor.submitted == 1
+
+    async def test_offload_timeout_reported(self, monkeypatch):
+        unlimited = CostEstimator(max_result_bits=math.inf, max_work=math.inf)
+        executor = ComputeExecutor(max_workers=1, task_timeout=0.5,
+                                   initializer=ComputeCommand.configure, initargs=(16, unlimited))
+        monkeypatch.setattr(ComputeCommand, "executor", executor)
+        monkeypatch.setattr(ComputeCommand, "estimator", unlimited)
+        try:
+            with pytest.raises(CommandExecutionError, match="timed out"):
+                await ComputeCommand("7 ** 99999999").execute()
+        finally:
+            executor.shutdown()
@@ -0,0 +1,43 @@
+import pytest
+
+from graph_server.expression_cache import CompiledExpression, ExpressionCache
+
+
+def _compiled(expression: str) -> CompiledExpression:
+    return CompiledExpression(compile(expression, '<test>', 'eval'))
+
+
+class TestExpressionCache:
+    def test_hit_and_miss_counters(self):
+        cache = ExpressionCache(maxsize=2)
+        assert cache.get("1 + 1") is None
+        cache.put("1 + 1", _compiled("1 + 1"))
+        assert cache.get("1 + 1").evaluate() == 2
+        assert cache.stats() == {"size": 1, "maxsize": 2, "hits": 1, "misses": 1, "evictions": 0}
+
+    def test_evicts_least_recently_used(self):
+        cache = ExpressionCache(maxsize=2)
+        cache.put("1", _compiled("1"))
+        cache.put("2", _compiled("2"))
+        cache.get("1")
+        cache.put("3", _compiled("3"))
+        assert "1" in cache
+        assert "2" not in cache
+        assert cache.evictions == 1
+
+    def test_resize_evicts_overflow(self):
+        cache = ExpressionCache(maxsize=3)
+        for expression in ("1", "2", "3"):
+            cache.put(expression, _compiled(expression))
+        cache.resize(1)
+        assert len(cache) == 1
+        assert "3" in cache
+
+    def test_zero_size_stores_nothing(self):
+        cache = ExpressionCache(maxsize=0)
+        cache.put("1", _compiled("1"))
+        assert len(cache) == 0
+
+    def test_negative_size_rejected(self):
+        with pytest.raises(ValueError):
+            ExpressionCache(maxsize=-1)
@@ -0,0 +1,140 @@
+import asyncio
+import socket
+import time
+
+import pytest
+
+from graph_server.async_client import AsyncZMQClient
+from graph_server.fair_queue import FairScheduler, TokenBucket
+from graph_server.server import ZMQServer
+
+
+def drain(scheduler):
+    items = []
+    while (item := scheduler.pop()) is not None:
+        items.append(item)
+    return items
+
+
+class TestFairScheduler:
+    def test_flooding_client_does_not_delay_others(self):
+        scheduler = FairScheduler()
+        for n in range(100):
+            assert scheduler.admit(b"flood", ("flood", n)) is None
+        scheduler.pop()
+        assert scheduler.admit(b"quiet", ("quiet", 0)) is None
+
+        order = drain(scheduler)
+        assert order.index(("quiet", 0)) <= 1
+        assert [item for item in order if item[0] == "flood"] == [("flood", n) for n in range(1, 100)]
+
+    def test_clients_are_interleaved_by_weight(self):
+        scheduler = FairScheduler(weights={b"heavy": 2.0})
+        for n in range(6):
+            scheduler.admit(b"heavy", "heavy")
+            scheduler.admit(b"light", "light")
+
+        assert drain(scheduler)[:6] == ["heavy", "light", "heavy", "heavy", "light", "heavy"]
+
+    def test_interactive_runs_before_bulk(self):
+        scheduler = FairScheduler()
+        scheduler.admit(b"a", "copy", "bulk")
+        scheduler.admit(b"a", "compute", "interactive")
+
+        assert scheduler.queued("bulk") == 1
+        assert scheduler.pop(("interactive",)) == "compute"
+        assert scheduler.pop(("interactive",)) is None
+        assert scheduler.pop() == "copy"
+
+    def test_per_client_queue_limit(self):
+        scheduler = FairScheduler(max_queue_per_client=2)
+        assert scheduler.admit(b"a", 1) is None
+        assert scheduler.admit(b"a", 2) is None
+        assert scheduler.admit(b"a", 3) == "Server busy: too many queued requests from this client"
+        assert scheduler.admit(b"b", 4) is None
+
+        stats = scheduler.stats()
+        assert stats["queued"] == {"interactive": 3, "bulk": 0}
+        assert stats["queued_by_client"] == {"a": 2, "b": 1}
+        assert stats["rejected"] == 1
+        assert stats["throttled_by_client"] == {"a": 1}
+
+    def test_rate_limit(self):
+        scheduler = FairScheduler(rate=1.0, burst=2)
+        assert scheduler.admit(b"a", 1) is None
+        assert scheduler.admit(b"a", 2) is None
+        assert scheduler.admit(b"a", 3) == "Rate limit exceeded"
+        assert scheduler.admit(b"b", 4) is None
+        assert scheduler.stats()["throttled"] == 1
+
+    def test_drop_removes_one_clients_requests(self):
+        scheduler = FairScheduler()
+        scheduler.admit(b"gone", 1)
+        scheduler.admit(b"gone", 2, "bulk")
+        scheduler.admit(b"kept", 3)
+        assert sorted(scheduler.waiting_clients()) == [b"gone", b"kept"]
+
+        assert scheduler.drop(b"gone") == 2
+        assert scheduler.drop(b"unknown") == 0
+        assert scheduler.waiting_clients() == [b"kept"]
+        assert drain(scheduler) == [3]
+
+    def test_idle_clients_are_forgotten(self):
+        scheduler = FairScheduler()
+        scheduler.admit(b"a", 1)
+        scheduler.admit(b"b", 2)
+        drain(scheduler)
+        scheduler._prune(time.monotonic())
+        assert scheduler.stats()["clients"] == 0
+
+
+def test_token_bucket_refills():
+    bucket = TokenBucket(rate=10.0, burst=1)
+    now = time.monotonic()
+    assert bucket.take(now)
+    assert not bucket.take(now)
+    assert bucket.take(now + 0.2)
+
+
+@pytest.fixture
+async def fair_server(monkeypatch):
+    """Live server that runs one bulk request at a time and rate limits clients."""
+    monkeypatch.setenv("MAX_INFLIGHT_REQUESTS", "4")
+    monkeypatch.setenv("BULK_MAX_INFLIGHT", "1")
+    monkeypatch.setenv("RATE_LIMIT_PER_CLIENT", "5")
+    monkeypatch.setenv("RATE_LIMIT_BURST", "25")
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+    address = f"tcp://127.0.0.1:{port}"
+    server = ZMQServer(log_level="ERROR", bind_address=address)
+    task = asyncio.create_task(server.start())
+    yield address
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+
+
+async def test_flooding_client_does_not_starve_newcomer(fair_server):
+    sleep = {"command_type": "os", "command_name": "sleep", "parameters": ["0.05"]}
+    flooder = AsyncZMQClient(fair_server, timeout=10)
+    newcomer = AsyncZMQClient(fair_server, timeout=10)
+    try:
+        flood = [asyncio.create_task(flooder.send_command(sleep)) for _ in range(20)]
+        await asyncio.sleep(0.1)
+
+        started = time.monotonic()
+        response = await newcomer.send_command({"command_type": "compute", "expression": "6 * 7"})
+        assert response["result"] == "42"
+        assert time.monotonic() - started < 0.5
+        # Same class as the flood, yet served after at most a couple of the flooder's requests
+        assert "error" not in await newcomer.send_command(sleep)
+        assert sum(task.done() for task in flood) < 10
+
+        responses = await asyncio.gather(*flood)
+        assert all("error" not in response for response in responses)
+        # The burst is spent; further requests are refused straight away
+        refused = await asyncio.gather(*(flooder.send_command(sleep) for _ in range(30)))
+        assert any(response.get("error") == "Rate limit exceeded" for response in refused)
+    finally:
+        await flooder.close()
+        await newcomer.close()
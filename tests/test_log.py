@@ -0,0 +1,49 @@
+import json
+import logging
+import queue
+
+from graph_server.log import JSONFormatter, NonBlockingQueueHandler, Sampler, parse_rates, truncate
+
+
+def _record(**fields) -> logging.LogRecord:
+    record = logging.LogRecord("graph_server.requests", logging.INFO, __file__, 1, "%s done", ("compute",), None)
+    record.__dict__.update(fields)
+    return record
+
+
+class TestJSONFormatter:
+    def test_extra_fields_become_keys(self):
+        entry = json.loads(JSONFormatter().format(_record(request_id=7, duration_ms=0.5)))
+        assert entry["message"] == "compute done"
+        assert entry["level"] == "INFO"
+        assert entry["request_id"] == 7
+        assert entry["duration_ms"] == 0.5
+        assert "args" not in entry
+
+
+class TestNonBlockingQueueHandler:
+    def test_defers_formatting_and_drops_when_full(self):
+        handler = NonBlockingQueueHandler(queue.Queue(1))
+        first, second = _record(), _record()
+        handler.handle(first)
+        handler.handle(second)
+        queued = handler.queue.get_nowait()
+        assert queued is first
+        assert queued.args == ("compute",)
+        assert handler.dropped == 1
+
+
+class TestSampler:
+    def test_rates_by_level_and_command_type(self):
+        sampler = Sampler(parse_rates("INFO=0, compute=0.5, os=1"))
+        assert not any(sampler.sample(logging.INFO, "os") for _ in range(100))
+        assert all(sampler.sample(logging.WARNING, "os") for _ in range(100))
+        kept = sum(sampler.sample(logging.WARNING, "compute") for _ in range(2000))
+        assert 800 < kept < 1200
+
+
+def test_truncate():
+    assert truncate(b'{"a": 1}', 20) == '{"a": 1}'
+    assert truncate(b"x" * 1000, 10) == "xxxxxxxxxx... (1000 bytes)"
+    assert truncate("y" * 11, 10) == "yyyyyyyyyy... (11 characters)"
+    assert truncate("é" * 11, 10) == "éééééééééé... (11 characters)"
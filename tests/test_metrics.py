@@ -0,0 +1,89 @@
+import asyncio
+
+from graph_server.metrics import Histogram, Metrics, serve_prometheus
+
+
+class TestHistogram:
+    def test_quantiles_use_bucket_bounds(self):
+        histogram = Histogram(buckets=(0.001, 0.01, 0.1))
+        for value in [0.0005] * 90 + [0.05] * 9 + [1.0]:
+            histogram.observe(value)
+        assert histogram.count == 100
+        assert histogram.quantile(0.5) == 0.001
+        assert histogram.quantile(0.95) == 0.1
+        assert histogram.quantile(1.0) == 0.1
+        assert histogram.cumulative() == [("0.001", 90), ("0.01", 90), ("0.1", 99), ("+Inf", 100)]
+
+
+class TestMetrics:
+    def test_snapshot(self):
+        metrics = Metrics()
+        metrics.observe(("compute", "expression"), "execute", 0.002)
+        metrics.count_request(("compute", "expression"))
+        metrics.count_error(ValueError("boom"))
+        metrics.gauges["in_flight_requests"] = lambda: 3
+        metrics.components["cache"] = lambda: {"hits": 1}
+        metrics.components["absent"] = lambda: None
+
+        snapshot = metrics.snapshot()
+        assert snapshot["requests"] == {"compute/expression": 1}
+        assert snapshot["errors"] == {"ValueError": 1}
+        assert snapshot["latency"]["compute/expression"]["execute"]["count"] == 1
+        assert snapshot["latency"]["compute/expression"]["execute"]["p50_ms"] == 2.5
+        assert snapshot["in_flight_requests"] == 3
+        assert snapshot["cache"] == {"hits": 1}
+        assert "absent" not in snapshot
+
+    def test_prometheus_text(self):
+        metrics = Metrics()
+        metrics.observe(("os", "ls"), "parse", 0.00001)
+        metrics.count_request(("os", "ls"))
+        metrics.components["scheduler"] = lambda: {"started": 2, "running": {"ls": 1}, "limits": "x"}
+
+        text = metrics.prometheus()
+        assert 'graph_server_requests_total{command_type="os",command="ls"} 1' in text
+        assert 'graph_server_request_phase_seconds_bucket{command_type="os",command="ls",phase="parse",le="+Inf"} 1' in text
+        assert "graph_server_scheduler_started 2" in text
+        assert 'graph_server_scheduler_running{name="ls"} 1' in text
+        assert "# TYPE graph_server_scheduler_started gauge" in text
+        assert text.count("# TYPE graph_server_scheduler_running gauge") == 1
+
+    def test_prometheus_escapes_label_values(self):
+        metrics = Metrics()
+        metrics.count_request(("os", 'echo "a\\b"\nc'))
+        metrics.observe(("os", 'echo "a\\b"\nc'), "execute", 0.001)
+        metrics.components["scheduler"] = lambda: {"running": {'x"y': 1}}
+
+        text = metrics.prometheus()
+        assert 'graph_server_requests_total{command_type="os",command="echo \\"a\\\\b\\"\\nc"} 1' in text
+        assert 'graph_server_scheduler_running{name="x\\"y"} 1' in text
+        # The newline did not split a sample across lines
+        assert all(line.startswith(("# TYPE ", "graph_server_")) for line in text.splitlines())
+
+    def test_prometheus_omits_per_client_breakdowns(self):
+        metrics = Metrics()
+        metrics.components["fair_queue"] = lambda: {
+            "clients": 2, "queued_by_client": {"a": 3}, "throttled_by_client": {"b": 1},
+        }
+
+        text = metrics.prometheus()
+        assert "graph_server_fair_queue_clients 2" in text
+        assert "by_client" not in text
+        assert metrics.snapshot()["fair_queue"]["queued_by_client"] == {"a": 3}
+
+    async def test_http_endpoint(self):
+        metrics = Metrics()
+        metrics.bytes_in = 42
+        server = await serve_prometheus(metrics, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        try:
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.write(b"GET /metrics HTTP/1.1\r\nHost: localhost\r\n\r\n")
+            response = await reader.read()
+            writer.close()
+        finally:
+            server.close()
+            await server.wait_closed()
+
+        assert response.startswith(b"HTTP/1.1 200 OK")
+        assert b"graph_server_received_bytes_total 42" in response
@@ -0,0 +1,101 @@
+import os
+import shutil
+import subprocess
+
+import pytest
+
+from graph_server.commands import OSCommand
+from graph_server.exceptions import CommandExecutionError
+from graph_server.native import NativeCp, NativeLs
+
+pytestmark = pytest.mark.skipif(
+    not (shutil.which("ls") and shutil.which("cp")) or os.name != "posix",
+    reason="requires the ls and cp binaries"
+)
+
+
+def _binary_output(command):
+    return subprocess.run(command, capture_output=True, check=True).stdout.decode().strip()
+
+
+@pytest.fixture
+def tree(tmp_path, monkeypatch):
+    monkeypatch.setenv("LC_ALL", "C")
+    (tmp_path / "file.txt").write_text("hello\n")
+    (tmp_path / "Upper").write_text("x" * 5000)
+    (tmp_path / ".hidden").write_text("")
+    (tmp_path / "-dash").write_text("")
+    (tmp_path / "with space").write_text("")
+    (tmp_path / "subdir").mkdir()
+    (tmp_path / "subdir" / "inner").write_text("")
+    (tmp_path / "link").symlink_to("file.txt")
+    old = tmp_path / "old"
+    old.write_text("")
+    os.utime(old, (1577934240, 1577934240))
+    executable = tmp_path / "run.sh"
+    executable.write_text("#!/bin/sh\n")
+    executable.chmod(0o755)
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+class TestNativeLs:
+    @pytest.mark.parametrize("parameters", [
+        [], ["-1"], ["-a"], ["-A"], ["-l"], ["-la"], ["-l", "-A"], ["-aA"], ["-Aa"],
+        ["subdir"], ["-l", "subdir"], ["file.txt"], ["-l", "file.txt"], ["-la", "."],
+    ])
+    async def test_matches_binary(self, tree, parameters):
+        native = NativeLs()
+        assert native.supports(parameters)
+        output = await native.run(parameters)
+        assert output.strip() == _binary_output(["ls"] + parameters)
+
+    @pytest.mark.parametrize("parameters", [["-R"], ["--all"], ["-lh"], ["a", "b"]])
+    def test_unsupported_flags(self, tree, parameters):
+        assert not NativeLs().supports(parameters)
+
+    def test_non_c_locale_unsupported(self, tree, monkeypatch):
+        monkeypatch.setenv("LC_ALL", "en_US.UTF-8")
+        assert not NativeLs().supports([])
+
+    async def test_missing_path_falls_back(self, tree):
+        assert await NativeLs().run(["missing"]) is None
+
+    async def test_os_command_reports_binary_error(self, tree):
+        with pytest.raises(CommandExecutionError, match="No such file or directory"):
+            await OSCommand("ls", ["missing"]).execute()
+
+
+class TestNativeCp:
+    async def test_copies_file(self, tree):
+        assert await NativeCp().run(["Upper", "copy"]) == ""
+        _binary_output(["cp", "Upper", "expected"])
+        assert (tree / "copy").read_bytes() == (tree / "expected").read_bytes()
+        assert (tree / "copy").stat().st_mode == (tree / "expected").stat().st_mode
+
+    async def test_preserves_executable_bits(self, tree):
+        await NativeCp().run(["run.sh", "run-copy.sh"])
+        _binary_output(["cp", "run.sh", "run-expected.sh"])
+        assert (tree / "run-copy.sh").stat().st_mode == (tree / "run-expected.sh").stat().st_mode
+
+    async def test_copies_into_directory(self, tree):
+        await NativeCp().run(["file.txt", "subdir"])
+        assert (tree / "subdir" / "file.txt").read_text() == "hello\n"
+
+    async def test_overwrites_existing_file(self, tree):
+        await NativeCp().run(["file.txt", "Upper"])
+        assert (tree / "Upper").read_text() == "hello\n"
+
+    async def test_same_file_falls_back(self, tree):
+        assert await NativeCp().run(["file.txt", "file.txt"]) is None
+
+    def test_flags_unsupported(self):
+        assert not NativeCp().supports(["-r", "a", "b"])
+
+    async def test_os_command_uses_native_copy(self, tree, monkeypatch):
+        async def no_subprocess(*args, **kwargs):
+            raise AssertionError("cp should not fork")
+        monkeypatch.setattr("asyncio.create_subprocess_exec", no_subprocess)
+        result = await OSCommand("cp", ["file.txt", "copied"]).execute()
+        assert result == {"given_os_command": "cp file.txt copied", "result": ""}
+        assert (tree / "copied").read_text() == "hello\n"
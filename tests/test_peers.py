@@ -0,0 +1,113 @@
+import asyncio
+import json
+import socket
+
+import zmq
+import zmq.asyncio
+
+from graph_server.fair_queue import FairScheduler
+from graph_server.peers import PeerMonitor
+from graph_server.serialization import get_codec
+from graph_server.server import ZMQServer
+from tests.test_server import _running
+
+
+async def wait_until(condition, timeout: float = 5.0) -> None:
+    for _ in range(int(timeout / 0.05)):
+        if condition():
+            return
+        await asyncio.sleep(0.05)
+    raise AssertionError("condition not met in time")
+
+
+async def test_reclaim_drops_queued_and_cancels_running():
+    monitor = PeerMonitor()
+    scheduler = FairScheduler()
+    scheduler.admit(b"gone", "queued")
+    scheduler.admit(b"other", "kept")
+    task = asyncio.create_task(asyncio.sleep(10))
+    monitor.track(b"gone", task)
+
+    monitor.reclaim(b"gone", scheduler)
+    await asyncio.gather(task, return_exceptions=True)
+
+    assert task.cancelled()
+    assert scheduler.pop() == "kept" and scheduler.pop() is None
+    assert monitor.stats() == {"clients": 0, "departed": 1, "dropped_requests": 1, "cancelled_requests": 1}
+    monitor.reclaim(b"gone", scheduler)
+    assert monitor.departed == 1
+
+
+def free_address() -> str:
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        return f"tcp://127.0.0.1:{probe.getsockname()[1]}"
+
+
+def test_probe_uses_the_request_framing():
+    monitor = PeerMonitor()
+    monitor.seen(b"tagged", None, {"command_type": "ping", "request_id": 1})
+    monitor.seen(b"negotiated", get_codec(b"json"), {"command_type": "ping", "request_id": 1})
+    monitor.seen(b"legacy", None, {"command_type": "ping"})
+
+    assert monitor.probes == {
+        b"tagged": [b'{"heartbeat": true}'],
+        b"negotiated": [b"json", b'{"heartbeat": true}'],
+    }
+    monitor.seen(b"tagged", None, {"command_type": "ping"})
+    assert b"tagged" not in monitor.probes
+
+
+async def test_legacy_client_is_never_probed(monkeypatch):
+    monkeypatch.setenv("PEER_CHECK_INTERVAL", "0.1")
+    address = free_address()
+    server = ZMQServer(log_level="ERROR", bind_address=address)
+    task = asyncio.create_task(server.start())
+    context = zmq.asyncio.Context()
+    client = context.socket(zmq.DEALER)
+    client.connect(address)
+    try:
+        # A client predating request IDs takes the next message as its reply
+        await client.send_multipart([json.dumps({
+            "command_type": "os", "command_name": "sleep", "parameters": ["0.5"]
+        }).encode()])
+        reply = json.loads((await asyncio.wait_for(client.recv_multipart(), 5))[0])
+        assert reply == {"given_os_command": "sleep 0.5", "result": ""}
+    finally:
+        client.close(linger=0)
+        context.term()
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+
+async def test_work_of_disconnected_client_is_reclaimed(monkeypatch):
+    monkeypatch.setenv("PEER_CHECK_INTERVAL", "0.1")
+    monkeypatch.setenv("BULK_MAX_INFLIGHT", "1")
+    address = free_address()
+    server = ZMQServer(log_level="ERROR", bind_address=address)
+    task = asyncio.create_task(server.start())
+    context = zmq.asyncio.Context()
+    client = context.socket(zmq.DEALER)
+    client.connect(address)
+    try:
+        for request_id, seconds in enumerate(("31.7", "31.8")):
+            await client.send_multipart([json.dumps({
+                "command_type": "os", "command_name": "sleep", "parameters": [seconds], "request_id": request_id
+            }).encode()])
+        await wait_until(lambda: _running("sleep", "31.7"))
+        assert server.fair_queue.queued("bulk") == 1
+
+        client.close(linger=0)
+        await wait_until(lambda: server.peers.departed == 1)
+        # The cancelled request records its error once it has killed its subprocess
+        await wait_until(lambda: server.metrics.snapshot()["errors"])
+
+        assert server.peers.stats() == {"clients": 0, "departed": 1, "dropped_requests": 1, "cancelled_requests": 1}
+        assert server.fair_queue.queued() == 0
+        assert not _running("sleep", "31.7")
+        assert server.metrics.snapshot()["errors"] == {"CancelledError": 1}
+    finally:
+        client.close(linger=0)
+        context.term()
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
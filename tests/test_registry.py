@@ -0,0 +1,97 @@
+import json
+
+import pytest
+
+from graph_server.commands import BatchCommand, Command, ComputeCommand, OSCommand
+from graph_server.exceptions import ValidationError
+from graph_server.registry import BATCHABLE, BUILDERS, CommandRegistry, register
+
+
+class EchoCommand(Command):
+    def __init__(self, text: str):
+        self.text = text
+
+    async def execute(self):
+        return {"result": self.text}
+
+
+@pytest.fixture
+def echo_type():
+    """Register an ``echo`` command type for the duration of a test."""
+    builders, batchable = dict(BUILDERS), set(BATCHABLE)
+    built = []
+
+    @register("echo", batchable=True)
+    def build(request, registry):
+        if not isinstance(request.get("text"), str):
+            raise ValidationError("'text' must be a string")
+        built.append(request["text"])
+        return EchoCommand(request["text"])
+
+    yield built
+    BUILDERS.clear()
+    BUILDERS.update(builders)
+    BATCHABLE.clear()
+    BATCHABLE.update(batchable)
+
+
+class TestCommandRegistry:
+    def test_parse_builds_commands(self):
+        registry = CommandRegistry()
+        assert isinstance(registry.parse({"command_type": "os", "command_name": "ls"}), OSCommand)
+        assert isinstance(registry.parse({"command_type": "compute", "expression": "1"}), ComputeCommand)
+        assert registry.parse({"command_type": "ping"}) is None
+
+        batch = registry.parse({"command_type": "batch", "requests": [
+            {"command_type": "compute", "expression": "1"},
+            {"command_type": "os", "command_name": "ls"},
+        ]})
+        assert isinstance(batch, BatchCommand)
+        assert [type(command) for command in batch.commands] == [ComputeCommand, OSCommand]
+
+    def test_unknown_type_is_rejected_before_other_fields(self):
+        with pytest.raises(ValidationError, match="Invalid command_type: nope"):
+            CommandRegistry().parse({"command_type": "nope", "timeout": "soon"})
+
+    @pytest.mark.parametrize("field", ["timeout", "deadline"])
+    @pytest.mark.parametrize("value", ["NaN", "Infinity", "-Infinity"])
+    def test_non_finite_time_fields_are_rejected(self, field, value):
+        request = json.loads(f'{{"command_type": "compute", "expression": "1", "{field}": {value}}}')
+        with pytest.raises(ValidationError, match=f"'{field}' must be a positive number of seconds"):
+            CommandRegistry().parse(request)
+
+    @pytest.mark.parametrize("request_, error", [
+        ({"command_type": ["os"]}, "Invalid command_type"),
+        ({"command_type": {}}, "Invalid command_type"),
+        ({"command_type": "os", "command_name": ["ls"]}, "'command_name' must be a string"),
+        ({"command_type": "os", "command_name": "ls", "parameters": [["-l"]]}, "only strings"),
+        ({"command_type": "compute", "expression": ["1"]}, "'expression' must be a string"),
+        ({"command_type": "batch", "requests": [{"command_type": ["os"]}]}, "Invalid batch request 0"),
+    ])
+    def test_unhashable_fields_are_rejected(self, request_, error):
+        with pytest.raises(ValidationError, match=error):
+            CommandRegistry().parse(request_)
+
+    def test_batch_stops_at_first_malformed_request(self, echo_type):
+        with pytest.raises(ValidationError, match="Invalid batch request 1: 'text' must be a string"):
+            CommandRegistry().parse({"command_type": "batch", "requests": [
+                {"command_type": "echo", "text": "a"},
+                {"command_type": "echo", "text": 1},
+                {"command_type": "echo", "text": "c"},
+            ]})
+        assert echo_type == ["a"]
+
+    def test_only_batchable_types_in_batches(self):
+        with pytest.raises(ValidationError, match="Invalid batch request 0: Invalid command_type: ping"):
+            CommandRegistry().parse({"command_type": "batch", "requests": [{"command_type": "ping"}]})
+
+
+@pytest.mark.asyncio
+async def test_server_runs_registered_type(server, mock_socket, echo_type):
+    request = {"command_type": "batch", "requests": [{"command_type": "echo", "text": "hi"}]}
+    await server.handle_request(b"a", json.dumps({"command_type": "echo", "text": "hello"}), mock_socket)
+    await server.handle_request(b"a", json.dumps(request), mock_socket)
+
+    replies = [json.loads(call[0][0][1]) for call in mock_socket.send_multipart.call_args_list]
+    assert replies == [{"result": "hello"}, {"results": [{"index": 0, "result": "hi"}], "failed": 0}]
+    assert "echo/-" in server.metrics.snapshot()["requests"]
@@ -0,0 +1,99 @@
+import os
+import time
+
+import pytest
+
+from graph_server.commands import OSCommand
+from graph_server.result_cache import ResultCache
+
+
+@pytest.fixture
+def listed_dir(tmp_path):
+    """A directory whose mtime is old enough to be cached."""
+    (tmp_path / "a.txt").write_text("a")
+    for path in (tmp_path / "a.txt", tmp_path):
+        os.utime(path, (time.time() - 60, time.time() - 60))
+    return tmp_path
+
+
+def _put(cache: ResultCache, parameters, result: str = "a.txt") -> None:
+    cache.put("ls", parameters, result, cache.snapshot(parameters))
+
+
+class TestResultCache:
+    def test_disabled_by_default(self):
+        assert not ResultCache().cacheable("ls")
+        assert ResultCache(ttl=1).cacheable("ls")
+        assert not ResultCache(ttl=1).cacheable("cp")
+
+    def test_hit_until_expiry(self, listed_dir, monkeypatch):
+        cache = ResultCache(ttl=5)
+        _put(cache, [str(listed_dir)])
+        assert cache.get("ls", [str(listed_dir)]) == "a.txt"
+        assert cache.get("ls", ["-a", str(listed_dir)]) is None
+
+        expired = time.monotonic() + 10
+        monkeypatch.setattr(time, "monotonic", lambda: expired)
+        assert cache.get("ls", [str(listed_dir)]) is None
+        stats = cache.stats()
+        assert (stats["hits"], stats["misses"], stats["expirations"]) == (1, 2, 1)
+        assert stats["hit_ratio"] == pytest.approx(1 / 3)
+        assert stats["size"] == stats["bytes"] == 0
+
+    def test_mtime_change_invalidates(self, listed_dir):
+        cache = ResultCache(ttl=60)
+        _put(cache, [str(listed_dir)])
+        (listed_dir / "b.txt").write_text("b")
+        assert cache.get("ls", [str(listed_dir)]) is None
+        assert cache.invalidations == 1
+
+    def test_recently_modified_path_not_cached(self, tmp_path):
+        cache = ResultCache(ttl=60)
+        _put(cache, [str(tmp_path)])
+        assert len(cache) == 0
+
+    def test_copy_invalidates_destination(self, listed_dir):
+        cache = ResultCache(ttl=60)
+        _put(cache, ["-l", str(listed_dir)])
+        _put(cache, ["-l", str(listed_dir / "a.txt")])
+        cache.invalidate_copy(["/etc/hostname", str(listed_dir / "a.txt")])
+        assert len(cache) == 0
+        assert cache.invalidations == 2
+
+    def test_evicts_least_recently_used_by_size(self, listed_dir):
+        cache = ResultCache(ttl=60, max_bytes=300)
+        _put(cache, [str(listed_dir)], "x" * 100)
+        _put(cache, ["-a", str(listed_dir)], "y" * 100)
+        cache.get("ls", [str(listed_dir)])
+        _put(cache, ["-A", str(listed_dir)], "z" * 100)
+        assert cache.get("ls", ["-a", str(listed_dir)]) is None
+        assert cache.get("ls", [str(listed_dir)]) == "x" * 100
+        assert cache.evictions == 1
+        assert cache.bytes <= 300
+
+
+class TestOSCommandResultCache:
+    @pytest.fixture
+    def result_cache(self, monkeypatch):
+        cache = ResultCache(ttl=60)
+        monkeypatch.setattr(OSCommand, "result_cache", cache)
+        return cache
+
+    async def test_repeated_ls_served_from_cache(self, result_cache, listed_dir):
+        first = await OSCommand("ls", [str(listed_dir)]).execute()
+        second = await OSCommand("ls", [str(listed_dir)]).execute()
+        assert first == second
+        assert first["result"] == "a.txt"
+        assert result_cache.hits == 1
+
+    async def test_cp_over_listed_file_invalidates(self, result_cache, listed_dir):
+        target = listed_dir / "a.txt"
+        source = listed_dir.parent / "source.txt"
+        source.write_text("longer contents")
+        await OSCommand("ls", ["-l", str(target)]).execute()
+        assert len(result_cache) == 1
+
+        await OSCommand("cp", [str(source), str(target)]).execute()
+        assert len(result_cache) == 0
+        result = await OSCommand("ls", ["-l", str(target)]).execute()
+        assert " 15 " in result["result"]
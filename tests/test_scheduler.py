@@ -0,0 +1,65 @@
+import asyncio
+
+import pytest
+
+from graph_server.commands import OSCommand
+from graph_server.exceptions import ServerBusyError
+from graph_server.scheduler import SubprocessScheduler
+
+
+@pytest.mark.asyncio
+class TestSubprocessScheduler:
+    async def test_runs_up_to_limit(self):
+        scheduler = SubprocessScheduler(default_limit=2)
+        await scheduler.acquire("sleep")
+        await scheduler.acquire("sleep")
+        assert scheduler.stats()["running"] == {"sleep": 2}
+
+    async def test_limits_are_per_command(self):
+        scheduler = SubprocessScheduler(default_limit=1, limits={"ls": 2})
+        await scheduler.acquire("ls")
+        await scheduler.acquire("ls")
+        await scheduler.acquire("sleep")
+        assert scheduler.stats()["running"] == {"ls": 2, "sleep": 1}
+
+    async def test_waiter_gets_released_slot(self):
+        scheduler = SubprocessScheduler(default_limit=1)
+        await scheduler.acquire("cp")
+        waiter = asyncio.create_task(scheduler.acquire("cp"))
+        await asyncio.sleep(0)
+        assert scheduler.stats()["waiting"] == {"cp": 1}
+        scheduler.release("cp")
+        await waiter
+        stats = scheduler.stats()
+        assert stats["running"] == {"cp": 1}
+        assert stats["queued"] == 1
+
+    async def test_rejects_when_queue_full(self):
+        scheduler = SubprocessScheduler(default_limit=1, max_queue=1)
+        await scheduler.acquire("sleep")
+        waiter = asyncio.create_task(scheduler.acquire("sleep"))
+        await asyncio.sleep(0)
+        with pytest.raises(ServerBusyError, match="Server busy"):
+            await scheduler.acquire("sleep")
+        assert scheduler.rejected == 1
+        waiter.cancel()
+
+    async def test_cancelled_waiter_leaves_queue(self):
+        scheduler = SubprocessScheduler(default_limit=1)
+        await scheduler.acquire("sleep")
+        waiter = asyncio.create_task(scheduler.acquire("sleep"))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        assert scheduler.stats()["waiting"] == {}
+        scheduler.release("sleep")
+        assert scheduler.stats()["running"] == {}
+
+    async def test_os_command_rejected_when_busy(self, monkeypatch):
+        monkeypatch.setattr(OSCommand, "scheduler", SubprocessScheduler(default_limit=1, max_queue=0))
+        running = asyncio.create_task(OSCommand("sleep", ["0.2"]).execute())
+        await asyncio.sleep(0.05)
+        with pytest.raises(ServerBusyError):
+            await OSCommand("sleep", ["0"]).execute()
+        await running
@@ -0,0 +1,84 @@
+import zlib
+
+import pytest
+import zmq
+
+from graph_server.exceptions import DecodeError
+from graph_server.serialization import CODECS, JSON_CODEC, NegotiatedCodec, ZlibCompressor, decode_reply, get_codec
+
+MESSAGE = {
+    "command_type": "compute",
+    "expression": "x * 2",
+    "variables": {"x": [1.5, 2, -3]},
+    "stream": False,
+    "command": None,
+}
+
+
+@pytest.fixture(params=sorted(CODECS))
+def codec(request):
+    return CODECS[request.param]
+
+
+class TestCodecs:
+    def test_round_trip(self, codec):
+        assert codec.decode(codec.encode(MESSAGE)) == MESSAGE
+
+    def test_malformed_payload(self, codec):
+        with pytest.raises(DecodeError):
+            codec.decode(b"\xc1\xff{")
+
+    def test_header_selects_codec(self, codec):
+        assert get_codec(codec.header) is codec
+
+    def test_unknown_header(self):
+        assert get_codec(b"xml") is None
+
+    def test_json_accepts_text(self):
+        assert JSON_CODEC.decode('{"a": 1}') == {"a": 1}
+
+    def test_msgpack_is_smaller(self):
+        if "msgpack" not in CODECS:
+            pytest.skip("msgpack not installed")
+        response = {"given_math_expression": "x", "results": [i / 7 for i in range(1000)]}
+        assert len(CODECS["msgpack"].encode(response)) < len(JSON_CODEC.encode(response))
+
+
+class TestCompression:
+    def test_header_names_compression(self, codec):
+        negotiated = get_codec(codec.header + b"+zlib;zlib")
+        assert isinstance(negotiated, NegotiatedCodec)
+        assert negotiated.header == codec.header + b"+zlib;zlib"
+        assert negotiated.decode(negotiated.encode(MESSAGE)) == MESSAGE
+        assert get_codec(codec.header + b";zlib").compression is None
+
+    def test_unknown_compression(self):
+        assert get_codec(b"json;brotli") is None
+        assert get_codec(b"json+brotli") is None
+
+    def test_large_replies_compressed_when_accepted(self, codec):
+        negotiated = get_codec(codec.header + b";zlib")
+        small = {"result": "x"}
+        large = {"result": "file.txt\n" * 10000}
+
+        assert negotiated.encode_reply(small, 1024) == (codec.header, codec.encode(small))
+        header, payload = negotiated.encode_reply(large, 1024)
+        assert header == codec.header + b"+zlib"
+        assert len(payload) < len(codec.encode(large)) / 10
+        assert get_codec(header).decode(payload) == large
+        assert negotiated.encode_reply(large, 0)[0] == codec.header
+
+    def test_decompression_limits_size(self):
+        compressor = ZlibCompressor(max_size=1000)
+        assert compressor.decompress(compressor.compress(b"a" * 1000)) == b"a" * 1000
+        with pytest.raises(DecodeError, match="exceeds 1000 bytes"):
+            compressor.decompress(compressor.compress(b"a" * 1001))
+        with pytest.raises(DecodeError):
+            compressor.decompress(b"not zlib")
+
+    def test_decode_reply_from_frames(self):
+        payload = zlib.compress(JSON_CODEC.encode(MESSAGE))
+        assert decode_reply([zmq.Frame(b"json+zlib"), zmq.Frame(payload)]) == MESSAGE
+        assert decode_reply([zmq.Frame(JSON_CODEC.encode(MESSAGE))]) == MESSAGE
+        with pytest.raises(DecodeError, match="Unsupported codec: xml"):
+            decode_reply([zmq.Frame(b"xml"), zmq.Frame(b"")])
@@ -1,6 +1,19 @@
+import asyncio
 import json
+import logging
+import os
+import socket
+import time
+import types
 
 import pytest
+import zmq
+import zmq.asyncio
+
+from graph_server.client import ZMQClient
+from graph_server.log import Sampler
+from graph_server.serialization import CODECS, get_codec
+from graph_server.server import ZMQServer, _metric_labels
 
 
 @pytest.mark.asyncio
@@ -37,6 +50,20 @@ class TestZMQServer:
         response_dict = json.loads(call_args[1].decode())
         assert response_dict["result"] == "4"
 
+    async def test_handle_batch_compute_request(self, server, mock_socket):
+        client_id = b'test_client'
+        request = {
+            "command_type": "compute",
+            "expression": "x * x",
+            "variables": {"x": [1, 2, 3]}
+        }
+
+        await server.handle_request(client_id, json.dumps(request), mock_socket)
+
+        call_args = mock_socket.send_multipart.call_args[0][0]
+        response_dict = json.loads(call_args[1].decode())
+        assert response_dict["results"] == [1.0, 4.0, 9.0]
+
     async def test_handle_invalid_json(self, server, mock_socket):
         client_id = b'test_client'
         request = "invalid json"
@@ -50,6 +77,28 @@ class TestZMQServer:
         assert "error" in response_dict
         assert "Invalid JSON format" in response_dict["error"]
 
+    async def test_handle_json_nested_too_deeply(self, server, mock_socket):
+        await server.handle_request(b'a', "[" * 100_000 + "]" * 100_000, mock_socket)
+
+        response = json.loads(mock_socket.send_multipart.call_args[0][0][1].decode())
+        assert "Invalid JSON format" in response["error"]
+
+    async def test_handle_unhashable_command_type(self, server, mock_socket):
+        await server.handle_request(b'a', json.dumps({"command_type": ["os"]}), mock_socket)
+
+        response = json.loads(mock_socket.send_multipart.call_args[0][0][1].decode())
+        assert response["error"] == "Invalid command_type: ['os']"
+        assert _metric_labels({"command_type": ["os"]}) == ("invalid", "-")
+        assert _metric_labels({"command_type": "os", "command_name": ["ls"]}) == ("invalid", "-")
+
+    async def test_priority_of_malformed_request(self, server):
+        assert server._priority({"command_type": "os", "command_name": ["ls"]}) == "interactive"
+        assert server._priority({"command_type": ["os"]}) == "interactive"
+        batch = {"command_type": "batch", "requests": [{"command_type": "os", "command_name": {}}, 1]}
+        assert server._priority(batch) == "interactive"
+        batch["requests"].append({"command_type": "batch", "requests": [batch]})
+        assert server._priority(batch) == "interactive"
+
     async def test_handle_invalid_command_type(self, server, mock_socket):
         client_id = b'test_client'
         request = {
@@ -63,3 +112,382 @@ class TestZMQServer:
         assert call_args[0] == client_id
         response_dict = json.loads(call_args[1].decode())
         assert "error" in response_dict
+
+    async def test_handle_streaming_os_request(self, server, mock_socket):
+        server.stream_chunk_size = 256
+        client_id = b'test_client'
+        request = {
+            "command_type": "os",
+            "command_name": "ls",
+            "parameters": ["-la", "/usr/bin"],
+            "stream": True
+        }
+
+        await server.handle_request(client_id, json.dumps(request), mock_socket)
+
+        messages = [json.loads(call[0][0][1].decode()) for call in mock_socket.send_multipart.call_args_list]
+        assert len(messages) > 2
+        assert [message["seq"] for message in messages] == list(range(len(messages)))
+        assert messages[-1] == {"seq": len(messages) - 1, "end": True, "given_os_command": "ls -la /usr/bin"}
+        output = "".join(message["chunk"] for message in messages[:-1])
+        assert output.startswith("total ")
+        assert "python" in output
+
+    async def test_handle_streaming_error(self, server, mock_socket):
+        client_id = b'test_client'
+        request = {
+            "command_type": "os",
+            "command_name": "ls",
+            "parameters": ["/nonexistent"],
+            "stream": True
+        }
+
+        await server.handle_request(client_id, json.dumps(request), mock_socket)
+
+        message = json.loads(mock_socket.send_multipart.call_args[0][0][1].decode())
+        assert message["end"] is True
+        assert "No such file or directory" in message["error"]
+
+    async def test_handle_request_with_negotiated_codec(self, server, mock_socket):
+        codec = CODECS.get("msgpack")
+        if codec is None:
+            pytest.skip("msgpack not installed")
+        client_id = b'test_client'
+        request = {
+            "command_type": "compute",
+            "expression": "2 + 2"
+        }
+
+        await server.handle_request(client_id, codec.encode(request), mock_socket, codec)
+
+        call_args = mock_socket.send_multipart.call_args[0][0]
+        assert call_args[:2] == [client_id, b"msgpack"]
+        assert codec.decode(call_args[2])["result"] == "4"
+
+    async def test_handle_malformed_payload_with_codec(self, server, mock_socket):
+        codec = CODECS.get("msgpack")
+        if codec is None:
+            pytest.skip("msgpack not installed")
+
+        await server.handle_request(b'test_client', b"\xc1", mock_socket, codec)
+
+        call_args = mock_socket.send_multipart.call_args[0][0]
+        assert codec.decode(call_args[2]) == {"error": "Invalid MessagePack format"}
+
+    async def test_large_reply_compressed_when_accepted(self, mock_socket, monkeypatch):
+        monkeypatch.setenv("COMPRESS_MIN_SIZE", "256")
+        server = ZMQServer(log_level="ERROR")
+        codec = get_codec(b"json;zlib")
+        request = {"command_type": "os", "command_name": "ls", "parameters": ["/usr/bin"]}
+
+        await server.handle_request(b'a', json.dumps(request).encode(), mock_socket, codec)
+
+        call_args = mock_socket.send_multipart.call_args
+        client_id, header, payload = call_args[0][0]
+        assert header == b"json+zlib"
+        assert call_args[1]["copy"] is False
+        response = get_codec(header).decode(payload)
+        assert "python3" in response["result"]
+        assert server.metrics.bytes_out == len(payload) < len(response["result"])
+
+    async def test_handle_request_echoes_request_id(self, server, mock_socket):
+        client_id = b'test_client'
+        requests = [
+            {"command_type": "compute", "expression": "1 + 1", "request_id": 7},
+            {"command_type": "invalid", "request_id": 8},
+            {"command_type": "compute", "expression": "1 / 0", "request_id": 9},
+        ]
+
+        for request in requests:
+            await server.handle_request(client_id, json.dumps(request), mock_socket)
+
+        replies = [json.loads(call[0][0][1].decode()) for call in mock_socket.send_multipart.call_args_list]
+        assert [reply["request_id"] for reply in replies] == [7, 8, 9]
+        assert replies[0]["result"] == "2"
+        assert "error" in replies[1] and "error" in replies[2]
+
+    async def test_handle_streaming_request_echoes_request_id(self, server, mock_socket):
+        request = {
+            "command_type": "os",
+            "command_name": "ls",
+            "parameters": ["/usr/bin"],
+            "stream": True,
+            "request_id": "abc"
+        }
+
+        await server.handle_request(b'test_client', json.dumps(request), mock_socket)
+
+        replies = [json.loads(call[0][0][1].decode()) for call in mock_socket.send_multipart.call_args_list]
+        assert replies[-1]["end"] is True
+        assert all(reply["request_id"] == "abc" for reply in replies)
+
+    async def test_identical_concurrent_requests_are_coalesced(self, server, mock_socket):
+        request = json.dumps({"command_type": "os", "command_name": "ls", "parameters": ["-l", "/usr/bin"]})
+
+        await asyncio.gather(*(
+            server.handle_request(f"client-{n}".encode(), request, mock_socket) for n in range(3)
+        ))
+
+        calls = mock_socket.send_multipart.call_args_list
+        assert sorted(call[0][0][0] for call in calls) == [b"client-0", b"client-1", b"client-2"]
+        assert len({call[0][0][1] for call in calls}) == 1
+        assert server.single_flight.stats() == {"in_flight": 0, "executions": 1, "coalesced": 2}
+
+    async def test_batch_request(self, server, mock_socket):
+        request = {
+            "command_type": "batch",
+            "request_id": 9,
+            "requests": [
+                {"command_type": "compute", "expression": "2 * 3"},
+                {"command_type": "compute", "expression": "1 / 0"},
+                {"command_type": "os", "command_name": "ls", "parameters": ["/"]},
+            ]
+        }
+
+        await server.handle_request(b'a', json.dumps(request), mock_socket)
+
+        mock_socket.send_multipart.assert_called_once()
+        response = json.loads(mock_socket.send_multipart.call_args[0][0][1].decode())
+        assert response["request_id"] == 9
+        assert response["failed"] == 1
+        assert response["results"][0] == {"index": 0, "given_math_expression": "2 * 3", "result": "6"}
+        assert response["results"][1]["command"] == "1 / 0"
+        assert "usr" in response["results"][2]["result"]
+        assert server._priority(request) == "interactive"
+        request["requests"].append({"command_type": "os", "command_name": "sleep", "parameters": ["1"]})
+        assert server._priority(request) == "bulk"
+
+    async def test_batch_timeout_covers_whole_batch(self, server, mock_socket):
+        request = {
+            "command_type": "batch",
+            "timeout": 0.1,
+            "requests": [{"command_type": "os", "command_name": "sleep", "parameters": ["5"]}] * 2
+        }
+
+        started = time.monotonic()
+        await server.handle_request(b'a', json.dumps(request), mock_socket)
+
+        assert time.monotonic() - started < 1
+        response = json.loads(mock_socket.send_multipart.call_args[0][0][1].decode())
+        assert response == {"error": "Request timed out after 0.1s", "command": "batch of 2 requests"}
+
+    async def test_stats_command(self, server, mock_socket):
+        await server.handle_request(b'a', json.dumps({"command_type": "compute", "expression": "1 + 2"}), mock_socket)
+        await server.handle_request(b'a', json.dumps({"command_type": "compute", "expression": "1 / 0"}), mock_socket)
+        await server.handle_request(b'a', "{not json", mock_socket)
+
+        await server.handle_request(b'a', json.dumps({"command_type": "stats", "request_id": 1}), mock_socket)
+
+        stats = json.loads(mock_socket.send_multipart.call_args[0][0][1].decode())
+        assert stats["request_id"] == 1
+        assert stats["requests"] == {"compute/expression": 2, "invalid/-": 1}
+        assert stats["errors"] == {"CommandExecutionError": 1, "DecodeError": 1}
+        assert set(stats["latency"]["compute/expression"]) == {"parse", "validate", "execute"}
+        assert stats["in_flight_requests"] == 0
+        assert stats["bytes_in"] > 0 and stats["bytes_out"] > 0
+        assert "expression_cache" in stats and "scheduler" in stats
+
+    async def test_ping_command(self, server, mock_socket):
+        await server.handle_request(b'a', json.dumps({"command_type": "ping", "request_id": 4}), mock_socket)
+
+        response = json.loads(mock_socket.send_multipart.call_args[0][0][1].decode())
+        assert response == {"pong": True, "in_flight": 0, "queued": 0, "request_id": 4}
+
+    async def test_request_log_is_structured_and_truncated(self, server, mock_socket, caplog):
+        server.log_payload_max = 16
+        request = {"command_type": "compute", "expression": "1 + " * 50 + "1", "request_id": 3}
+
+        with caplog.at_level(logging.INFO, logger="graph_server.requests"):
+            await server.handle_request(b'\x01', json.dumps(request), mock_socket)
+
+        record, = [record for record in caplog.records if record.name == "graph_server.requests"]
+        assert record.request_id == 3
+        assert record.status == "ok"
+        assert record.command_type == "compute"
+        assert {"parse_ms", "validate_ms", "execute_ms", "duration_ms"} <= set(vars(record))
+        assert record.payload.startswith('{"command_type":') and record.payload.endswith("characters)")
+
+    async def test_request_log_sampling(self, server, mock_socket, caplog):
+        server.log_sampler = Sampler({"compute": 0})
+
+        with caplog.at_level(logging.INFO, logger="graph_server.requests"):
+            await server.handle_request(b'a', json.dumps({"command_type": "compute", "expression": "1"}), mock_socket)
+            await server.handle_request(b'a', json.dumps({"command_type": "os", "command_name": "ls"}), mock_socket)
+
+        assert [record.command_type for record in caplog.records if record.name == "graph_server.requests"] == ["os"]
+
+    async def test_timeout_kills_subprocess(self, server, mock_socket):
+        request = {"command_type": "os", "command_name": "sleep", "parameters": ["31.5"], "timeout": 0.2}
+
+        await asyncio.wait_for(server.handle_request(b'a', json.dumps(request), mock_socket), 5)
+
+        message = json.loads(mock_socket.send_multipart.call_args[0][0][1].decode())
+        assert message == {"error": "Request timed out after 0.2s", "command": "sleep 31.5"}
+        assert not _running("sleep", "31.5")
+
+    async def test_expired_deadline_is_not_run(self, server, mock_socket, tmp_path):
+        source = tmp_path / "source.txt"
+        source.write_text("data")
+        request = {
+            "command_type": "os",
+            "command_name": "cp",
+            "parameters": [str(source), str(tmp_path / "copy.txt")],
+            "deadline": time.time() - 1
+        }
+
+        await server.handle_request(b'a', json.dumps(request), mock_socket)
+
+        message = json.loads(mock_socket.send_multipart.call_args[0][0][1].decode())
+        assert message["error"] == "Deadline exceeded before the request could run"
+        assert not (tmp_path / "copy.txt").exists()
+
+    async def test_timeout_capped_by_server_maximum(self, server, mock_socket):
+        server.max_timeout = 0.2
+        request = {"command_type": "os", "command_name": "sleep", "parameters": ["5"], "timeout": 100}
+
+        await asyncio.wait_for(server.handle_request(b'a', json.dumps(request), mock_socket), 5)
+
+        message = json.loads(mock_socket.send_multipart.call_args[0][0][1].decode())
+        assert message["error"] == "Request timed out after 0.2s"
+
+    async def test_zero_default_timeout_is_unlimited(self, server):
+        server.default_timeout = 0
+        assert server._deadline({}, 0.0) is None
+        assert server._deadline({"timeout": 1000}, 0.0) == server.max_timeout
+
+    async def test_stream_stops_when_client_stops_reading(self, mock_socket, monkeypatch):
+        monkeypatch.setenv("REPLY_SEND_TIMEOUT", "0.05")
+        monkeypatch.setenv("STREAM_CHUNK_SIZE", "64")
+        server = ZMQServer(log_level="ERROR")
+
+        async def queue_full(*args, **kwargs):
+            raise zmq.Again()
+
+        mock_socket.send_multipart.side_effect = queue_full
+        request = {"command_type": "os", "command_name": "ls", "parameters": ["-la", "/usr/bin"], "stream": True}
+
+        await asyncio.wait_for(server.handle_request(b'a', json.dumps(request), mock_socket), 5)
+
+        assert server.metrics.snapshot()["errors"] == {"ReplyStalledError": 1}
+        # The first chunk and the end marker; the command stopped after the first
+        assert server.metrics.replies_dropped == 2
+
+    async def test_streaming_timeout_ends_stream(self, server, mock_socket):
+        request = {"command_type": "os", "command_name": "sleep", "parameters": ["5"], "stream": True, "timeout": 0.2}
+
+        await asyncio.wait_for(server.handle_request(b'a', json.dumps(request), mock_socket), 5)
+
+        message = json.loads(mock_socket.send_multipart.call_args[0][0][1].decode())
+        assert message == {"seq": 0, "end": True, "error": "Request timed out after 0.2s", "command": "sleep 5"}
+
+
+async def test_stream_to_slow_reader_loses_no_chunks(monkeypatch):
+    monkeypatch.setenv("ZMQ_SNDHWM", "2")
+    monkeypatch.setenv("STREAM_CHUNK_SIZE", "64")
+    monkeypatch.setenv("PEER_CHECK_INTERVAL", "0")
+    context = zmq.asyncio.Context()
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        address = f"tcp://127.0.0.1:{probe.getsockname()[1]}"
+    server = ZMQServer(log_level="ERROR", bind_address=address)
+    task = asyncio.create_task(server.start())
+    client = context.socket(zmq.DEALER)
+    client.rcvhwm = 2
+    client.connect(address)
+    try:
+        request = {"command_type": "os", "command_name": "ls", "parameters": ["-la", "/usr/bin"], "stream": True}
+        await client.send(json.dumps(request).encode())
+        await asyncio.sleep(0.5)
+
+        messages = []
+        while not messages or not messages[-1].get("end"):
+            messages.append(json.loads(await asyncio.wait_for(client.recv(), 5)))
+        assert [message["seq"] for message in messages] == list(range(len(messages)))
+        assert "error" not in messages[-1]
+        assert "".join(message.get("chunk", "") for message in messages).startswith("total ")
+    finally:
+        client.close(linger=0)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        context.term()
+
+
+async def test_client_that_never_reads_does_not_hold_up_others(monkeypatch):
+    monkeypatch.setenv("ZMQ_SNDHWM", "2")
+    monkeypatch.setenv("MAX_INFLIGHT_REQUESTS", "4")
+    monkeypatch.setenv("REPLY_SEND_TIMEOUT", "0.2")
+    monkeypatch.setenv("PEER_CHECK_INTERVAL", "0")
+    monkeypatch.setenv("COALESCE_REQUESTS", "0")
+    context = zmq.asyncio.Context()
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        address = f"tcp://127.0.0.1:{probe.getsockname()[1]}"
+    server = ZMQServer(log_level="ERROR", bind_address=address)
+    task = asyncio.create_task(server.start())
+    stuck, client = context.socket(zmq.DEALER), context.socket(zmq.DEALER)
+    stuck.rcvhwm = 1
+    for peer in (stuck, client):
+        peer.connect(address)
+    try:
+        request = {"command_type": "os", "command_name": "ls", "parameters": ["-la", "/usr/bin"]}
+        for _ in range(300):
+            await stuck.send(json.dumps(request).encode())
+        for _ in range(100):
+            if server.metrics.replies_dropped:
+                break
+            await asyncio.sleep(0.05)
+
+        started = time.monotonic()
+        await client.send(json.dumps({"command_type": "compute", "expression": "1 + 1"}).encode())
+        assert server.metrics.replies_dropped > 0
+        assert json.loads(await asyncio.wait_for(client.recv(), 5))["result"] == "2"
+        assert time.monotonic() - started < 2
+    finally:
+        for peer in (stuck, client):
+            peer.close(linger=0)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        context.term()
+
+
+async def test_unsupported_codec_refusal_reaches_client(monkeypatch):
+    monkeypatch.setenv("PEER_CHECK_INTERVAL", "0")
+    context = zmq.asyncio.Context()
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        address = f"tcp://127.0.0.1:{probe.getsockname()[1]}"
+    server = ZMQServer(log_level="ERROR", bind_address=address)
+    task = asyncio.create_task(server.start())
+    peer = context.socket(zmq.DEALER)
+    peer.connect(address)
+    client = ZMQClient(address, timeout=5)
+    try:
+        # A JSON payload still gives the refusal its request_id
+        await peer.send_multipart([b"xml", json.dumps({"command_type": "ping", "request_id": 7}).encode()])
+        header, payload = await asyncio.wait_for(peer.recv_multipart(), 5)
+        assert get_codec(header).decode(payload) == {"error": "Unsupported codec: xml", "request_id": 7}
+
+        # Otherwise the client takes the reply without one as its answer rather than waiting out the timeout
+        client.codec = types.SimpleNamespace(header=b"xml", encode=lambda request: b"<ping/>")
+        started = time.monotonic()
+        response = await asyncio.to_thread(client.send_command, {"command_type": "ping"})
+        assert response == {"error": "Unsupported codec: xml"}
+        assert time.monotonic() - started < 2
+    finally:
+        client.close()
+        peer.close(linger=0)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        context.term()
+
+
+def _running(*argv: str) -> bool:
+    """Whether a process with exactly this command line exists."""
+    for pid in filter(str.isdigit, os.listdir("/proc")):
+        try:
+            with open(f"/proc/{pid}/cmdline", "rb") as f:
+                if f.read().split(b"\0")[:-1] == [arg.encode() for arg in argv]:
+                    return True
+        except OSError:
+            continue
+    return False
@@ -0,0 +1,107 @@
+import asyncio
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+
+from graph_server.async_client import AsyncZMQClient
+from graph_server.commands import ComputeCommand
+from graph_server.server import ZMQServer, write_atomically
+
+
+def free_port() -> int:
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        return probe.getsockname()[1]
+
+
+async def wait_for_file(path, timeout: float = 10.0) -> None:
+    for _ in range(int(timeout / 0.05)):
+        if path.exists():
+            return
+        await asyncio.sleep(0.05)
+    raise AssertionError(f"{path} was not created")
+
+
+async def test_warm_start_signals_ready_once_warm(monkeypatch, tmp_path):
+    snapshot, ready = tmp_path / "snapshot.json", tmp_path / "ready"
+    snapshot.write_text(json.dumps({"expressions": ["7 ** 7", "x * 3", "not valid (", 5]}))
+    monkeypatch.setenv("WARM_START", "1")
+    monkeypatch.setenv("WARM_SNAPSHOT", str(snapshot))
+    monkeypatch.setenv("READY_FILE", str(ready))
+    monkeypatch.setenv("COMPUTE_WORKERS", "1")
+    ComputeCommand.cache.clear()
+    server = ZMQServer(log_level="ERROR", bind_address=f"tcp://127.0.0.1:{free_port()}")
+    task = asyncio.create_task(server.start())
+    try:
+        await wait_for_file(ready)
+        assert json.loads(ready.read_text())["startup_ms"] == server.startup
+        assert set(server.startup) == {
+            "configure", "bind", "warm_imports", "warm_cache", "warm_executor", "warm_subprocess", "total"
+        }
+        assert "7 ** 7" in ComputeCommand.cache and "x * 3" in ComputeCommand.cache
+        assert len(server.compute_executor._pool._processes) == 1
+
+        client = AsyncZMQClient(server.bind_address, timeout=5)
+        try:
+            assert (await client.send_command({"command_type": "compute", "expression": "2 + 2"}))["result"] == "4"
+        finally:
+            await client.close()
+        assert server.metrics.snapshot()["startup"] == server.startup
+    finally:
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+    assert not ready.exists()
+    assert json.loads(snapshot.read_text())["expressions"] == ["7 ** 7", "x * 3", "2 + 2"]
+
+
+def test_sigterm_shuts_down_cleanly(tmp_path):
+    snapshot, ready = tmp_path / "snapshot.json", tmp_path / "ready"
+    env = dict(
+        os.environ, ZMQ_SERVER_PORT=str(free_port()), WARM_START="1", WARM_SNAPSHOT=str(snapshot),
+        READY_FILE=str(ready), COMPUTE_WORKERS="0", LOG_SAMPLE_RATES="INFO=0",
+        PYTHONPATH=os.pathsep.join(filter(None, ["src", os.environ.get("PYTHONPATH")]))
+    )
+    server = subprocess.Popen([sys.executable, "-m", "graph_server.server"], env=env, stderr=subprocess.DEVNULL)
+    try:
+        asyncio.run(wait_for_file(ready))
+
+        async def compute():
+            client = AsyncZMQClient(f"tcp://127.0.0.1:{env['ZMQ_SERVER_PORT']}", timeout=5)
+            try:
+                return await client.send_command({"command_type": "compute", "expression": "6 * 7"})
+            finally:
+                await client.close()
+
+        assert asyncio.run(compute())["result"] == "42"
+
+        server.send_signal(signal.SIGTERM)
+        assert server.wait(10) == 0
+    finally:
+        server.kill()
+        server.wait()
+
+    assert not ready.exists()
+    assert json.loads(snapshot.read_text()) == {"expressions": ["6 * 7"]}
+
+
+def test_optional_subsystems_are_not_imported():
+    script = (
+        "import sys, graph_server.server; "
+        "print(sorted(m for m in ('argparse', 'dotenv', 'numpy', 'multiprocessing', 'graph_server.broker') "
+        "if m in sys.modules))"
+    )
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, ["src", os.environ.get("PYTHONPATH")])))
+    output = subprocess.run([sys.executable, "-c", script], env=env, capture_output=True, text=True, check=True)
+    assert output.stdout.strip() == "[]"
+
+
+def test_files_are_written_world_readable(tmp_path):
+    path = tmp_path / "ready"
+    write_atomically(str(path), "{}")
+    assert path.read_text() == "{}"
+    assert path.stat().st_mode & 0o777 == 0o644
+    assert os.listdir(tmp_path) == ["ready"]
@@ -14,6 +14,94 @@ class TestJSONRequestValidator:
         }
         validator.validate(request)  # Should not raise
 
+    def test_valid_batch_compute_request(self):
+        """Test compute request carrying variable columns"""
+        validator = JSONRequestValidator()
+        request = {
+            "command_type": "compute",
+            "expression": "x + y",
+            "variables": {"x": [1, 2], "y": [0.5, 1.5]}
+        }
+        validator.validate(request)  # Should not raise
+
+    @pytest.mark.parametrize("variables, message", [
+        ([1, 2], "'variables' must be a non-empty object"),
+        ({}, "'variables' must be a non-empty object"),
+        ({"1x": [1]}, "Invalid variable name: 1x"),
+        ({"lambda": [1]}, "Invalid variable name: lambda"),
+        ({"None": [1]}, "Invalid variable name: None"),
+        ({1: [1]}, "Invalid variable name: 1"),
+        ({"x": []}, "Variable 'x' must be a non-empty list"),
+        ({"x": [1, 2], "y": [1]}, "All variables must have the same number of values"),
+        ({"x": [1, "2"]}, "Variable 'x' must contain only numbers"),
+    ])
+    def test_invalid_variables(self, variables, message):
+        """Test malformed variable columns"""
+        validator = JSONRequestValidator()
+        request = {
+            "command_type": "compute",
+            "expression": "x",
+            "variables": variables
+        }
+        with pytest.raises(ValidationError, match=message):
+            validator.validate(request)
+
+    def test_stream_only_for_os_commands(self):
+        """Test streaming flag validation"""
+        validator = JSONRequestValidator()
+        validator.validate({"command_type": "os", "command_name": "ls", "stream": True})
+        with pytest.raises(ValidationError, match="'stream' must be a boolean"):
+            validator.validate({"command_type": "os", "command_name": "ls", "stream": "yes"})
+        with pytest.raises(ValidationError, match="only supported for OS commands"):
+            validator.validate({"command_type": "compute", "expression": "1", "stream": True})
+
+    @pytest.mark.parametrize("field", ["timeout", "deadline"])
+    def test_timeout_fields(self, field):
+        """Test timeout and deadline validation"""
+        validator = JSONRequestValidator()
+        validator.validate({"command_type": "compute", "expression": "1", field: 2.5})
+        for value in (0, -1, "5", True):
+            with pytest.raises(ValidationError, match=f"'{field}' must be a positive number"):
+                validator.validate({"command_type": "compute", "expression": "1", field: value})
+
+    def test_request_id(self):
+        """Test request_id validation"""
+        validator = JSONRequestValidator()
+        for value in ("abc", 7):
+            validator.validate({"command_type": "compute", "expression": "1", "request_id": value})
+        for value in (True, False, 1.5, None, [1]):
+            with pytest.raises(ValidationError, match="'request_id' must be a string or an integer"):
+                validator.validate({"command_type": "compute", "expression": "1", "request_id": value})
+
+    def test_valid_batch_request(self):
+        """Test batch request holding OS and compute requests"""
+        validator = JSONRequestValidator()
+        validator.validate({
+            "command_type": "batch",
+            "requests": [
+                {"command_type": "os", "command_name": "ls"},
+                {"command_type": "compute", "expression": "x", "variables": {"x": [1]}},
+            ],
+            "concurrency": 4,
+            "ordered": False
+        })  # Should not raise
+
+    @pytest.mark.parametrize("batch, message", [
+        ({"requests": []}, "'requests' must be a non-empty list"),
+        ({"requests": [{"command_type": "compute", "expression": "1"}] * 3}, "at most 2 requests"),
+        ({"requests": [{"command_type": "compute", "expression": "1"}], "concurrency": 0}, "'concurrency' must be"),
+        ({"requests": [{"command_type": "compute", "expression": "1"}], "ordered": "no"}, "'ordered' must be"),
+        ({"requests": [{"command_type": "compute", "expression": "1"}, {"command_type": "compute"}]},
+         "Invalid batch request 1: Missing 'expression'"),
+        ({"requests": [{"command_type": "stats"}]}, "Invalid batch request 0: Invalid command_type: stats"),
+        ({"requests": [{"command_type": "os", "command_name": "ls", "stream": True}]}, "not supported in a batch"),
+    ])
+    def test_invalid_batch_request(self, batch, message):
+        """Test malformed batch requests"""
+        validator = JSONRequestValidator(max_batch_size=2)
+        with pytest.raises(ValidationError, match=message):
+            validator.validate({"command_type": "batch", **batch})
+
     def test_invalid_command_type(self):
         """Test invalid command type"""
         validator = JSONRequestValidator()